@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark da camada de dados (DatabaseManager) sobre dados sintéticos
+"""
+
+import argparse
+import json
+import math
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Módulos da aplicação
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+import config
+from database import DatabaseManager, listing_key
+from export import export_diligencias_csv
+from synthetic import REFERENCE_DATE, YEARS, populate, synthetic_diligencias
+from utils import backup_database
+
+# Versão do formato do JSON (muda se os campos mudarem)
+RESULT_FORMAT = 1
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+PAGES_SCROLLED = 20
+SINGLE_INSERTS = 200
+RECORD_FETCHES = 500
+
+
+def _percentile(values, fraction):
+    """Percentil por posição (valores já ordenados)"""
+    return values[min(len(values) - 1, math.ceil(fraction * len(values)) - 1)]
+
+
+class Benchmark:
+    """Mede operações e acumula os resultados de uma execução"""
+    
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = []
+    
+    def measure(self, name, rows, operation, repeat=None, items=None):
+        """Executa operation repeat vezes (recebe o índice) e registra os tempos"""
+        timings = []
+        for index in range(repeat or self.repeat):
+            start = time.perf_counter()
+            operation(index)
+            timings.append(time.perf_counter() - start)
+        
+        timings.sort()
+        total = sum(timings)
+        result = {
+            'benchmark': name,
+            'linhas': rows,
+            'operacoes': len(timings),
+            'segundos': round(total, 6),
+            'ops_por_segundo': round(len(timings) / total, 2) if total else None,
+            'p50_ms': round(_percentile(timings, 0.50) * 1000, 3),
+            'p95_ms': round(_percentile(timings, 0.95) * 1000, 3),
+            'max_ms': round(timings[-1] * 1000, 3),
+        }
+        if items:
+            result['linhas_por_segundo'] = round(items * len(timings) / total, 1) if total else None
+        self.results.append(result)
+        print(f"  {name:<28} p50 {result['p50_ms']:>10.3f} ms  "
+              f"p95 {result['p95_ms']:>10.3f} ms  ({len(timings)}x)", file=sys.stderr)
+        return result
+
+
+def run_size(bench, rows, seed, work_dir):
+    """Executa todos os benchmarks numa base de rows diligências"""
+    print(f"Base com {rows} diligências", file=sys.stderr)
+    db_path = work_dir / f'benchmark_{rows}.db'
+    db = DatabaseManager(db_path, auto_backup=False)
+    rng = random.Random(seed)
+    
+    try:
+        # A inserção em lote inclui a geração dos dados, medida à parte
+        bench.measure('geracao_dados', rows, lambda _: list(synthetic_diligencias(rows, seed)),
+                      repeat=1, items=rows)
+        bench.measure('insercao_lote', rows, lambda _: populate(db, rows, seed), repeat=1, items=rows)
+        
+        extra = list(synthetic_diligencias(SINGLE_INSERTS, seed + 1))
+        bench.measure('insercao_unitaria', rows,
+                      lambda i: db.insert_diligencia(extra[i]), repeat=SINGLE_INSERTS)
+        total = db.count_diligencias()
+        
+        bench.measure('listagem_primeira_pagina', rows, lambda _: db.get_diligencias_page())
+        
+        def scroll(_):
+            after = None
+            for _ in range(PAGES_SCROLLED):
+                page = db.get_diligencias_page(after=after)
+                if not page:
+                    return
+                after = listing_key(page[-1])
+        bench.measure('listagem_rolagem', rows, scroll, items=PAGES_SCROLLED * config.PAGE_SIZE)
+        
+        recent = (REFERENCE_DATE - timedelta(days=90)).isoformat()
+        filters = {'status': 'Pendente', 'data_inicio': recent}
+        bench.measure('listagem_filtrada', rows, lambda _: db.get_diligencias_page(filters=filters))
+        bench.measure('pesquisa', rows, lambda _: db.search('silva fórum'))
+        
+        ids = [rng.randint(1, total) for _ in range(RECORD_FETCHES)]
+        
+        def cold(i):
+            db.cache.clear()
+            db.get_diligencia(ids[i])
+        bench.measure('registro_sem_cache', rows, cold, repeat=RECORD_FETCHES)
+        bench.measure('registro_em_cache', rows, lambda i: db.get_diligencia(ids[i]),
+                      repeat=RECORD_FETCHES)
+        
+        bench.measure('estatisticas', rows, lambda _: db.get_statistics())
+        bench.measure('estatisticas_recalculo', rows, lambda _: db.rebuild_statistics(), repeat=1)
+        
+        first = REFERENCE_DATE.replace(year=REFERENCE_DATE.year - YEARS + 1, month=1, day=1)
+        today = REFERENCE_DATE + timedelta(days=1)
+        
+        def report(_):
+            db.period_report('MENSAL', first, REFERENCE_DATE, today=today)
+        # A primeira chamada grava o rollup dos meses encerrados; as demais o leem
+        bench.measure('relatorio_mensal_inicial', rows, report, repeat=1)
+        bench.measure('relatorio_mensal', rows, report)
+        
+        export_path = work_dir / f'benchmark_{rows}.csv'
+        bench.measure('exportacao_csv', rows,
+                      lambda _: export_diligencias_csv(db, export_path), repeat=1, items=total)
+        
+        backups_dir = work_dir / 'backups'
+        backups_dir.mkdir(exist_ok=True)
+        config.BACKUPS_DIR = backups_dir  # fora da pasta de backups do usuário
+        bench.measure('backup', rows, lambda _: backup_database(str(db_path)), repeat=1, items=total)
+    finally:
+        db.close()
+
+
+def compare(results, previous_path):
+    """Mostra a razão entre as medianas desta execução e as de uma anterior"""
+    with open(previous_path, encoding='utf-8') as file:
+        previous = {
+            (r['benchmark'], r['linhas']): r for r in json.load(file)['resultados']
+        }
+    
+    print(f"\nComparação com {previous_path} (p50 atual / anterior):", file=sys.stderr)
+    for result in results:
+        before = previous.get((result['benchmark'], result['linhas']))
+        if not before or not before['p50_ms']:
+            continue
+        ratio = result['p50_ms'] / before['p50_ms']
+        flag = '  <- mais lento' if ratio > 1.2 else ''
+        print(f"  {result['benchmark']:<28} {result['linhas']:>9} {ratio:6.2f}x{flag}",
+              file=sys.stderr)
+
+
+def main(argv=None):
+    """Executa o benchmark e escreve o JSON (saída padrão ou --saida)"""
+    parser = argparse.ArgumentParser(description="Benchmark da camada de dados")
+    parser.add_argument('--linhas', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help="tamanhos das bases (de 1000 a 1000000)")
+    parser.add_argument('--semente', type=int, default=0, help="semente dos dados sintéticos")
+    parser.add_argument('--repeticoes', type=int, default=20, help="repetições das consultas")
+    parser.add_argument('--saida', type=Path, help="arquivo JSON de resultados")
+    parser.add_argument('--comparar', type=Path, help="JSON de uma execução anterior")
+    args = parser.parse_args(argv)
+    
+    bench = Benchmark(args.repeticoes)
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.linhas:
+            run_size(bench, rows, args.semente, Path(tmp))
+    
+    document = {
+        'formato': RESULT_FORMAT,
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'versao': config.VERSION,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'plataforma': platform.platform(),
+        'semente': args.semente,
+        'repeticoes': args.repeticoes,
+        'resultados': bench.results,
+    }
+    
+    text = json.dumps(document, ensure_ascii=False, indent=2)
+    if args.saida:
+        args.saida.write_text(text + '\n', encoding='utf-8')
+    else:
+        print(text)
+    
+    if args.comparar:
+        compare(bench.results, args.comparar)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
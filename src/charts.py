@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gráficos da aba Relatórios, renderizados fora da interface e guardados em cache
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+from datetime import date, timedelta
+
+from config import CHARTS_DIR, CHART_MONTHS, CHART_SIZE, CHART_DPI, CHART_CACHE_MAX_FILES
+from reports import period_start, next_period, period_label
+from utils import atomic_write
+
+
+# Gráficos exibidos, na ordem da tela: nome -> título
+CHARTS = {
+    'faturamento': 'Faturamento por mês',
+    'status': 'Diligências por status',
+    'a_receber': 'A receber por mês',
+}
+
+# Versão do desenho: mudá-la descarta os PNGs gerados com o desenho anterior
+CHART_STYLE_VERSION = 1
+
+# matplotlib não garante renderizações simultâneas em threads diferentes
+_render_lock = threading.Lock()
+
+
+def chart_data(db, months=CHART_MONTHS, today=None):
+    """Dados de cada gráfico de CHARTS nos últimos months meses (um relatório mensal)"""
+    today = today or date.today()
+    first = period_start('MENSAL', today)
+    for _ in range(months - 1):
+        first = period_start('MENSAL', first - timedelta(days=1))
+    last = next_period('MENSAL', period_start('MENSAL', today)) - timedelta(days=1)
+    
+    periods = db.period_report('MENSAL', first, last, today=today)
+    labels = [period_label('MENSAL', period['inicio']) for period in periods]
+    
+    status = {}
+    for period in periods:
+        for name, count in period['por_status'].items():
+            status[name] = status.get(name, 0) + count
+    
+    receivable, total = [], 0.0
+    for period in periods:
+        total += period['a_receber']
+        receivable.append(total)
+    
+    return {
+        'faturamento': {
+            'meses': labels,
+            'faturamento': [period['faturamento'] for period in periods],
+            'recebido': [period['recebido'] for period in periods],
+        },
+        'status': {
+            'status': sorted(status),
+            'quantidades': [status[name] for name in sorted(status)],
+        },
+        'a_receber': {
+            'meses': labels,
+            'a_receber': [period['a_receber'] for period in periods],
+            'acumulado': receivable,
+        },
+    }
+
+
+def chart_key(name, data, size=CHART_SIZE, dpi=CHART_DPI):
+    """Chave do PNG: muda com os dados, os parâmetros ou o desenho do gráfico"""
+    payload = json.dumps(
+        [CHART_STYLE_VERSION, name, data, list(size), dpi], sort_keys=True
+    )
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:20]
+
+
+def _draw_faturamento(ax, data):
+    positions = range(len(data['meses']))
+    ax.bar(positions, data['faturamento'], color='#2E86AB', label='Faturamento')
+    ax.bar(positions, data['recebido'], width=0.5, color='#28A745', label='Recebido')
+    ax.set_xticks(list(positions))
+    ax.set_xticklabels(data['meses'], rotation=45, ha='right', fontsize=7)
+    ax.legend(fontsize=7)
+
+
+def _draw_status(ax, data):
+    if not any(data['quantidades']):
+        ax.text(0.5, 0.5, 'Sem diligências no período', ha='center', va='center')
+        ax.set_axis_off()
+        return
+    ax.pie(data['quantidades'], labels=data['status'], autopct='%1.0f%%',
+           textprops={'fontsize': 7})
+    ax.set_aspect('equal')
+
+
+def _draw_a_receber(ax, data):
+    positions = range(len(data['meses']))
+    ax.plot(positions, data['a_receber'], marker='o', color='#DC3545', label='No mês')
+    ax.plot(positions, data['acumulado'], linestyle='--', color='#A23B72', label='Acumulado')
+    ax.set_xticks(list(positions))
+    ax.set_xticklabels(data['meses'], rotation=45, ha='right', fontsize=7)
+    ax.legend(fontsize=7)
+
+
+_DRAW = {
+    'faturamento': _draw_faturamento,
+    'status': _draw_status,
+    'a_receber': _draw_a_receber,
+}
+
+
+def render_chart(name, data, size=CHART_SIZE, dpi=CHART_DPI):
+    """Desenha o gráfico name com o backend Agg e retorna o PNG (bytes)"""
+    # matplotlib só é carregado quando um gráfico precisa ser desenhado;
+    # Figure + FigureCanvasAgg não usam pyplot nem o loop do Tk
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    
+    with _render_lock:
+        figure = Figure(figsize=size, dpi=dpi)
+        FigureCanvasAgg(figure)
+        ax = figure.add_subplot()
+        _DRAW[name](ax, data)
+        ax.set_title(CHARTS[name], fontsize=9)
+        ax.tick_params(labelsize=7)
+        figure.tight_layout()
+        
+        buffer = io.BytesIO()
+        figure.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+
+def prune_charts(cache_dir, max_files):
+    """Remove os PNGs usados há mais tempo além de max_files"""
+    try:
+        paths = [
+            os.path.join(str(cache_dir), name) for name in os.listdir(str(cache_dir))
+            if name.endswith('.png')
+        ]
+        paths.sort(key=os.path.getmtime)
+    except OSError as e:
+        logging.warning(f"Erro ao listar o cache de gráficos: {e}")
+        return
+    
+    for path in paths[:max(0, len(paths) - max_files)]:
+        try:
+            os.remove(path)
+        except OSError as e:
+            logging.warning(f"Erro ao remover gráfico em cache {path}: {e}")
+
+
+def load_chart(name, data, cache_dir=CHARTS_DIR, size=CHART_SIZE, dpi=CHART_DPI):
+    """PNG do gráfico: lido do cache se nada mudou, senão renderizado e gravado"""
+    path = os.path.join(str(cache_dir), f"{name}-{chart_key(name, data, size, dpi)}.png")
+    try:
+        with open(path, 'rb') as f:
+            png = f.read()
+        os.utime(path)  # mais recente para prune_charts
+        return png
+    except FileNotFoundError:
+        pass
+    
+    png = render_chart(name, data, size, dpi)
+    
+    with atomic_write(path) as partial_path, open(partial_path, 'wb') as f:
+        f.write(png)
+    
+    prune_charts(cache_dir, CHART_CACHE_MAX_FILES)
+    return png
+
+
+def load_charts(db, months=CHART_MONTHS, today=None, cache_dir=CHARTS_DIR):
+    """PNGs de todos os gráficos de CHARTS ({nome: bytes}), para a thread do worker"""
+    data = chart_data(db, months, today)
+    return {name: load_chart(name, data[name], cache_dir) for name in CHARTS}
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Linha de comando para operações em lote, sem interface gráfica
+"""
+
+import argparse
+import json
+import logging
+import sqlite3
+import sys
+from datetime import date, datetime
+from pathlib import Path
+
+from config import REPORT_TYPES, SERVER_HOST, SERVER_PORT, SERVER_URL
+from database import DatabaseManager
+from utils import setup_logging, backup_database, format_currency
+
+
+def _date_arg(value):
+    """Data da linha de comando: dd/mm/aaaa ou aaaa-mm-dd"""
+    for date_format in ('%d/%m/%Y', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"data inválida: {value} (use dd/mm/aaaa)")
+
+
+def _print_json(data):
+    """Escreve data em JSON na saída padrão (datas em ISO)"""
+    json.dump(data, sys.stdout, ensure_ascii=False, indent=2, default=str)
+    sys.stdout.write('\n')
+
+
+def cmd_import(open_db, args):
+    """Importa diligências de um .csv ou .xlsx"""
+    from importer import import_diligencias
+    
+    count = import_diligencias(open_db(), args.arquivo)
+    print(f"{count} diligências importadas de {args.arquivo}")
+    return 0
+
+
+def cmd_export(open_db, args):
+    """Exporta as diligências para .csv ou .xlsx"""
+    suffix = Path(args.arquivo).suffix.lower()
+    if suffix == '.csv':
+        from export import export_diligencias_csv as export
+    elif suffix == '.xlsx':
+        from export import export_diligencias_excel as export
+    else:
+        raise ValueError(f"Formato não suportado: {suffix or args.arquivo} (use .csv ou .xlsx)")
+    
+    count = export(open_db(), args.arquivo)
+    print(f"{count} diligências exportadas para {args.arquivo}")
+    return 0
+
+
+def cmd_stats(open_db, args):
+    """Mostra as estatísticas do banco (resumo mantido por triggers)"""
+    stats = open_db().get_statistics()
+    if not stats:
+        raise RuntimeError("Estatísticas indisponíveis")
+    
+    if args.json:
+        _print_json(stats)
+        return 0
+    
+    for table, values in stats.items():
+        print(f"{table}:")
+        for name, value in values.items():
+            shown = value if isinstance(value, int) else format_currency(value)
+            print(f"  {name}: {shown}")
+    return 0
+
+
+def cmd_backup(open_db, args):
+    """Cria um backup online do banco"""
+    from config import BACKUPS_DIR
+    
+    db = open_db()
+    if not backup_database(str(db.db_path), backups_dir=db.backups_dir):
+        raise RuntimeError("Falha ao criar backup (detalhes no log)")
+    print(f"Backup criado em {db.backups_dir or BACKUPS_DIR}")
+    return 0
+
+
+def cmd_vacuum(open_db, args):
+    """Compacta o banco e atualiza as estatísticas do planejador"""
+    before, after = open_db().vacuum()
+    print(f"Banco compactado: {before / 1024:.0f} KB -> {after / 1024:.0f} KB")
+    return 0
+
+
+def cmd_report(open_db, args):
+    """Relatório por período (mesmos dados da aba Relatórios)"""
+    from reports import period_report, period_label
+    
+    today = date.today()
+    first = args.de or today.replace(month=1, day=1)
+    last = args.ate or today
+    periods = period_report(open_db(), args.tipo, first, last)
+    
+    if args.json:
+        _print_json(periods)
+        return 0
+    
+    print(f"{'Período':<24} {'Qtd':>6} {'Faturamento':>16} {'Recebido':>16} "
+          f"{'Custos':>16} {'Margem':>16}")
+    for period in periods:
+        print(f"{period_label(args.tipo, period['inicio']):<24} {period['total']:>6} "
+              + ' '.join(f"{format_currency(period[column]):>16}"
+                         for column in ('faturamento', 'recebido', 'custos', 'margem')))
+    return 0
+
+
+def cmd_diagnostics(open_db, args):
+    """Tempos por consulta e métricas do banco (deste processo ou de um servidor)"""
+    if args.servidor:
+        from client import RemoteDatabase, RemoteError
+        
+        source = RemoteDatabase(args.servidor)
+        try:
+            report = source.diagnostics()
+        except RemoteError as e:
+            raise RuntimeError(str(e)) from None
+        finally:
+            source.close()
+    else:
+        report = open_db().diagnostics()
+    
+    if args.json:
+        _print_json(report)
+        return 0
+    
+    banco, escritas = report['banco'], report['escritas']
+    print(f"Banco: {banco['arquivo']} ({banco['tamanho_bytes'] / 1024:.0f} KB, "
+          f"WAL {banco['wal_bytes'] / 1024:.0f} KB, SQLite {banco['sqlite']})")
+    print(f"Escritas: {escritas['escritas']}, espera média pelo lock "
+          f"{escritas['espera_media_ms']:.1f} ms (máx. {escritas['espera_max_ms']:.1f} ms), "
+          f"{escritas['novas_tentativas']} novas tentativas, {escritas['falhas']} falhas")
+    print(f"\n{'Execuções':>9} {'Total ms':>10} {'p50':>8} {'p95':>8} {'p99':>8} "
+          f"{'Máx.':>8} {'Linhas':>7} {'Lentas':>6}  Consulta")
+    for row in report['consultas'][:args.limite]:
+        print(f"{row['execucoes']:>9} {row['total_ms']:>10.1f} {row['p50_ms']:>8.2f} "
+              f"{row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['max_ms']:>8.2f} "
+              f"{row['linhas_media']:>7.1f} {row['lentas']:>6}  {row['consulta'][:100]}")
+        for step in row['plano'] or ():
+            print(f"{'':>71}  | {step}")
+    return 0
+
+
+def cmd_serve(open_db, args):
+    """Atende as estações pela API HTTP/JSON até Ctrl+C"""
+    from server import ApiServer
+    
+    server = ApiServer(open_db(), args.host, args.port)  # recusa a rede sem token
+    print(f"Servidor em http://{args.host}:{args.port} (Ctrl+C encerra)")
+    server.run()
+    return 0
+
+
+def build_parser():
+    """Parser dos comandos (um subparser por comando, com func = cmd_*)"""
+    parser = argparse.ArgumentParser(
+        prog='sistema-diligencias',
+        description="Operações em lote do Sistema de Diligências (sem interface gráfica)"
+    )
+    parser.add_argument('--banco', type=Path, help="arquivo do banco (padrão: o da aplicação)")
+    parser.add_argument('-v', '--verbose', action='store_true', help="mostra o log no terminal")
+    commands = parser.add_subparsers(dest='comando', metavar='comando', required=True)
+    
+    command = commands.add_parser('import', help="importa diligências de .csv ou .xlsx")
+    command.add_argument('arquivo', type=Path)
+    command.set_defaults(func=cmd_import)
+    
+    command = commands.add_parser('export', help="exporta as diligências para .csv ou .xlsx")
+    command.add_argument('arquivo', type=Path)
+    command.set_defaults(func=cmd_export)
+    
+    command = commands.add_parser('stats', help="mostra as estatísticas")
+    command.add_argument('--json', action='store_true', help="saída em JSON")
+    command.set_defaults(func=cmd_stats)
+    
+    command = commands.add_parser('backup', help="cria um backup online do banco")
+    command.set_defaults(func=cmd_backup)
+    
+    command = commands.add_parser('vacuum', help="compacta o banco (VACUUM + PRAGMA optimize)")
+    command.set_defaults(func=cmd_vacuum)
+    
+    command = commands.add_parser('report', help="relatório por período")
+    command.add_argument('--tipo', type=str.upper, choices=list(REPORT_TYPES), default='MENSAL')
+    command.add_argument('--de', type=_date_arg, help="data inicial (padrão: 1º de janeiro)")
+    command.add_argument('--ate', type=_date_arg, help="data final (padrão: hoje)")
+    command.add_argument('--json', action='store_true', help="saída em JSON")
+    command.set_defaults(func=cmd_report)
+    
+    command = commands.add_parser('diagnostics', help="tempos por consulta e métricas do banco")
+    command.add_argument('--servidor', default=SERVER_URL,
+                         help="URL de um servidor em execução (padrão: SISTEMA_DILIGENCIAS_SERVIDOR)")
+    command.add_argument('--limite', type=int, default=20, help="consultas listadas (padrão: 20)")
+    command.add_argument('--json', action='store_true', help="saída em JSON")
+    command.set_defaults(func=cmd_diagnostics)
+    
+    command = commands.add_parser('serve', help="servidor local para as estações (API HTTP/JSON)")
+    command.add_argument('--host', default=SERVER_HOST,
+                         help=f"endereço (padrão: {SERVER_HOST}; 0.0.0.0 atende a rede)")
+    command.add_argument('--port', type=int, default=SERVER_PORT, help=f"porta (padrão: {SERVER_PORT})")
+    command.set_defaults(func=cmd_serve)
+    
+    return parser
+
+
+def main(argv=None):
+    """Executa um comando e retorna o código de saída (0 = sucesso)"""
+    args = build_parser().parse_args(argv)
+    
+    # O log vai para o arquivo; no terminal (stderr), só avisos e erros
+    setup_logging(console=sys.stderr,
+                  console_level=logging.INFO if args.verbose else logging.WARNING)
+    logger = logging.getLogger(__name__)
+    
+    opened = []
+    
+    def open_db():
+        """Abre o banco local no primeiro uso: comandos remotos não o criam"""
+        if not opened:
+            try:
+                # Backup periódico em thread seria interrompido ao fim do processo
+                opened.append(DatabaseManager(args.banco, auto_backup=False))
+            except (OSError, sqlite3.Error) as e:
+                raise RuntimeError(f"Erro ao abrir o banco: {e}") from None
+        return opened[0]
+    
+    try:
+        return args.func(open_db, args)
+    except (OSError, ValueError, RuntimeError, ImportError, sqlite3.Error) as e:
+        logger.error(f"Comando {args.comando} falhou: {e}")
+        return 1
+    finally:
+        for db in opened:
+            db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cliente da API do servidor local: substitui o DatabaseManager nas estações
+"""
+
+import http.client
+import json
+import logging
+import select
+import threading
+from datetime import date
+from urllib.parse import urlsplit, urlencode
+
+from config import CLIENT_TIMEOUT, SERVER_TOKEN, PAGE_SIZE, BULK_CHUNK_SIZE
+from database import DEFAULT_SORT, listing_key
+from records import record_type
+
+
+# Repetir estes não duplica registros se a resposta se perdeu após a gravação
+IDEMPOTENT_METHODS = frozenset({'GET', 'PUT', 'DELETE'})
+
+
+class RemoteError(Exception):
+    """Erro devolvido pelo servidor (status HTTP e mensagem)"""
+    
+    def __init__(self, status, message):
+        super().__init__(f"{message} (HTTP {status})")
+        self.status = status
+
+
+def _records(rows, name):
+    """Converte dicts da resposta em records, como os do DatabaseManager"""
+    if not rows:
+        return []
+    cls = record_type(name, rows[0].keys())
+    return [cls(row.values()) for row in rows]
+
+
+def _record(row, name):
+    return _records([row], name)[0] if row else None
+
+
+def _dropped(sock):
+    """Conexão ociosa fechada pelo outro lado (legível sem requisição pendente)"""
+    try:
+        return bool(select.select([sock], [], [], 0)[0])
+    except (OSError, ValueError):
+        return True
+
+
+def _json(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+class RemoteDatabase:
+    """Mesma interface do DatabaseManager via HTTP/JSON (uma conexão por thread)"""
+    
+    def __init__(self, url, token=SERVER_TOKEN, timeout=CLIENT_TIMEOUT):
+        parts = urlsplit(url)
+        if parts.scheme != 'http' or not parts.hostname:
+            raise ValueError(f"URL do servidor inválida: {url} (ex.: http://servidor:8765)")
+        self.url = url
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.logger = logging.getLogger(__name__)
+        
+        self._headers = {'Content-Type': 'application/json'}
+        if token:
+            self._headers['Authorization'] = f'Bearer {token}'
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+    
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and conn.sock is not None and _dropped(conn.sock):
+            conn.close()  # fechada pelo servidor enquanto ociosa; reabre ao enviar
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    def _request(self, method, path, params=None, body=None):
+        """Executa uma requisição e retorna o JSON da resposta"""
+        params = {name: value for name, value in (params or {}).items() if value is not None}
+        target = f"{path}?{urlencode(params)}" if params else path
+        payload = _json(body).encode('utf-8') if body is not None else None
+        
+        for attempt in (1, 2):
+            conn = self._connection()
+            reused = conn.sock is not None
+            sent = False
+            try:
+                conn.request(method, target, body=payload, headers=self._headers)
+                sent = True
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # Uma nova tentativa, só numa conexão reaproveitada; depois do
+                # envio, só se repetir não gravar de novo o que já foi gravado
+                conn.close()
+                if not reused or attempt == 2 or (sent and method not in IDEMPOTENT_METHODS):
+                    raise
+        
+        result = json.loads(data) if data else None
+        if response.status >= 400:
+            message = result.get('erro') if isinstance(result, dict) else response.reason
+            raise RemoteError(response.status, message)
+        return result
+    
+    def close(self):
+        """Fecha as conexões HTTP de todas as threads"""
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+    
+    # Diligências
+    
+    def get_diligencias_page(self, limit=PAGE_SIZE, after=None, before=None,
+                             filters=None, sort=DEFAULT_SORT, descending=True):
+        rows = self._request('GET', '/diligencias', {
+            'limit': limit,
+            'after': _json(after) if after is not None else None,
+            'before': _json(before) if before is not None else None,
+            'filters': _json(filters) if filters else None,
+            'sort': sort,
+            'descending': 'true' if descending else 'false',
+        })
+        return _records(rows, 'Diligencia')
+    
+    def search(self, text, limit=PAGE_SIZE, offset=0, filters=None):
+        rows = self._request('GET', '/diligencias/pesquisa', {
+            'text': text, 'limit': limit, 'offset': offset,
+            'filters': _json(filters) if filters else None,
+        })
+        return _records(rows, 'Diligencia')
+    
+    def count_diligencias(self):
+        return self._request('GET', '/diligencias/total')
+    
+    def get_diligencias_changes(self, watermark=None):
+        result = self._request('GET', '/diligencias/alteracoes', {
+            'watermark': _json(watermark) if watermark is not None else None,
+        })
+        result['changed'] = _records(result['changed'], 'Diligencia')
+        result['watermark'] = tuple(result['watermark'])
+        return result
+    
+    def iter_diligencias(self, chunk_size=BULK_CHUNK_SIZE):
+        """Percorre todas as diligências em blocos (paginação por chave)"""
+        after = None
+        while True:
+            rows = self._request('GET', '/diligencias/blocos', {
+                'limit': chunk_size,
+                'after': _json(after) if after is not None else None,
+            })
+            if not rows:
+                return
+            chunk = _records(rows, 'Diligencia')
+            yield chunk
+            after = listing_key(chunk[-1])
+    
+    def get_diligencia(self, diligencia_id):
+        try:
+            return _record(self._request('GET', f'/diligencias/{int(diligencia_id)}'), 'Diligencia')
+        except RemoteError as e:
+            if e.status == 404:
+                return None
+            raise
+    
+    def insert_diligencia(self, data):
+        return self._request('POST', '/diligencias', body=data)['id']
+    
+    def update_diligencia(self, diligencia_id, data):
+        self._request('PUT', f'/diligencias/{int(diligencia_id)}', body=data)
+    
+    def delete_diligencia(self, diligencia_id):
+        self._request('DELETE', f'/diligencias/{int(diligencia_id)}')
+    
+    # Correspondentes
+    
+    def get_correspondentes_page(self, limit=PAGE_SIZE, after=None, diligencia_id=None):
+        rows = self._request('GET', '/correspondentes', {
+            'limit': limit, 'after': after, 'diligencia_id': diligencia_id,
+        })
+        return _records(rows, 'Correspondente')
+    
+    def get_correspondente(self, correspondente_id):
+        try:
+            return _record(
+                self._request('GET', f'/correspondentes/{int(correspondente_id)}'), 'Correspondente'
+            )
+        except RemoteError as e:
+            if e.status == 404:
+                return None
+            raise
+    
+    def insert_correspondente(self, data):
+        return self._request('POST', '/correspondentes', body=data)['id']
+    
+    def update_correspondente(self, correspondente_id, data):
+        self._request('PUT', f'/correspondentes/{int(correspondente_id)}', body=data)
+    
+    def delete_correspondente(self, correspondente_id):
+        self._request('DELETE', f'/correspondentes/{int(correspondente_id)}')
+    
+    def get_margins_page(self, limit=PAGE_SIZE, after=None):
+        rows = self._request('GET', '/margens', {
+            'limit': limit, 'after': _json(after) if after is not None else None,
+        })
+        return _records(rows, 'Margem')
+    
+    # Estatísticas, relatórios e manutenção
+    
+    def get_statistics(self):
+        try:
+            return self._request('GET', '/estatisticas')
+        except (OSError, RemoteError) as e:
+            self.logger.error(f"Erro ao obter estatísticas: {e}")
+            return {}
+    
+    def rebuild_statistics(self):
+        return self._request('POST', '/estatisticas/recalcular')
+    
+    def period_report(self, kind, first, last, today=None):
+        periods = self._request('GET', f'/relatorios/{kind}', {
+            'first': first.isoformat(), 'last': last.isoformat(),
+            'today': today.isoformat() if today else None,
+        })
+        for period in periods:
+            period['inicio'] = date.fromisoformat(period['inicio'])
+            period['fim'] = date.fromisoformat(period['fim'])
+        return periods
+    
+    def diagnostics(self):
+        """Diagnóstico do servidor (os tempos são os das consultas dele)"""
+        return self._request('GET', '/diagnostico')
+    
+    def reset_diagnostics(self):
+        self._request('POST', '/diagnostico/zerar')
+    
+    def backup_async(self, progress=None, callback=None):
+        """Backup feito pelo servidor (sem progresso parcial)"""
+        def run():
+            try:
+                success = self._request('POST', '/backup')
+            except (OSError, RemoteError) as e:
+                self.logger.error(f"Erro ao criar backup no servidor: {e}")
+                success = False
+            if callback:
+                callback(success)
+        
+        thread = threading.Thread(target=run, name='backup', daemon=True)
+        thread.start()
+        return thread
@@ -34,18 +34,55 @@ DATABASE_DIR = APP_DATA_DIR / "data"
 LOGS_DIR = APP_DATA_DIR / "logs"
 BACKUPS_DIR = APP_DATA_DIR / "backups"
 EXPORTS_DIR = APP_DATA_DIR / "exports"
+CHARTS_DIR = APP_DATA_DIR / "charts"
 
 # Criar diretórios se não existirem
-for directory in [DATABASE_DIR, LOGS_DIR, BACKUPS_DIR, EXPORTS_DIR]:
+for directory in [DATABASE_DIR, LOGS_DIR, BACKUPS_DIR, EXPORTS_DIR, CHARTS_DIR]:
     directory.mkdir(exist_ok=True)
 
 # Banco de dados
 DATABASE_PATH = DATABASE_DIR / "diligencias.db"
 
+# Conexões SQLite (um escritor persistente + pool de leitores)
+DB_READER_POOL_SIZE = 4
+DB_CACHE_SIZE_KB = 64 * 1024  # 64MB por conexão
+DB_MMAP_SIZE = 256 * 1024 * 1024  # 256MB
+BULK_CHUNK_SIZE = 1000  # linhas por executemany nas operações em lote
+DB_WORKER_THREADS = DB_READER_POOL_SIZE  # threads que executam consultas da interface
+WORKER_POLL_MS = 16  # intervalo de entrega dos resultados ao Tk (~60 fps)
+RECORD_CACHE_SIZE = 2048  # diligências completas mantidas em memória (LRU)
+
+# Escritas com várias instâncias no mesmo arquivo (outros processos ou estações)
+DB_BUSY_TIMEOUT_MS = 2000  # espera do SQLite por um lock antes de SQLITE_BUSY
+DB_WRITE_RETRIES = 5  # novas tentativas de BEGIN IMMEDIATE após SQLITE_BUSY
+DB_RETRY_BASE_DELAY = 0.02  # s; o teto dobra a cada tentativa (com jitter)
+DB_RETRY_MAX_DELAY = 1.0  # s
+DB_LOCK_WAIT_WARN_MS = 500  # esperas pelo lock acima disso vão ao log como aviso
+
+# Diagnóstico de consultas (tempos por consulta; ver querystats.py)
+SLOW_QUERY_MS = 200  # consultas acima disso vão ao log, com o plano na primeira vez
+
+# Servidor local (modo multiestação): as estações usam a API em vez do arquivo
+SERVER_HOST = "127.0.0.1"  # use 0.0.0.0 para atender outras estações da rede
+SERVER_PORT = 8765
+SERVER_URL = os.environ.get("SISTEMA_DILIGENCIAS_SERVIDOR")  # ex.: http://servidor:8765
+SERVER_TOKEN = os.environ.get("SISTEMA_DILIGENCIAS_TOKEN")  # exigido no header Authorization
+SERVER_MAX_BODY = 1024 * 1024  # bytes aceitos no corpo de uma requisição
+SERVER_IDLE_TIMEOUT = 30  # s sem requisições antes de fechar a conexão keep-alive
+SERVER_MAX_HEADERS = 100  # cabeçalhos aceitos numa requisição
+SERVER_MAX_LIMIT = 5000  # linhas no máximo por resposta (páginas, pesquisa e blocos)
+CLIENT_TIMEOUT = 30  # s de espera do cliente por uma resposta
+
 # Interface
 WINDOW_TITLE = f"{APP_NAME} v{VERSION}"
 WINDOW_SIZE = "1200x800"
 WINDOW_MIN_SIZE = "800x600"
+STARTUP_BUDGET_MS = 2000  # tempo máximo da inicialização até o primeiro frame
+
+# Grade com rolagem virtual
+PAGE_SIZE = 200  # linhas buscadas por página
+GRID_MAX_ROWS = 1000  # máximo de linhas materializadas na Treeview
+SEARCH_DEBOUNCE_MS = 300  # espera após a digitação antes de pesquisar
 
 # Cores da interface
 COLORS = {
@@ -83,14 +120,28 @@ STATUS_OPTIONS = [
     'Cancelada'
 ]
 
+# Gráficos da aba Relatórios (PNG em cache por conteúdo)
+CHART_MONTHS = 12  # meses exibidos nos gráficos
+CHART_SIZE = (3.9, 2.6)  # polegadas (três lado a lado na janela padrão)
+CHART_DPI = 100
+CHART_CACHE_MAX_FILES = 60  # PNGs mantidos em CHARTS_DIR
+
 # Configurações de backup
 BACKUP_FREQUENCY_DAYS = 7
 MAX_BACKUPS = 30
+BACKUP_PAGES_PER_STEP = 1024  # páginas copiadas por passo do backup online
+BACKUP_STEP_DELAY = 0.01  # pausa (s) entre passos para não disputar o disco
 
 # Configurações de log
 LOG_LEVEL = "INFO"
+LOG_FILE_NAME = "diligencias.log"
 LOG_MAX_SIZE = 10 * 1024 * 1024  # 10MB
 LOG_BACKUP_COUNT = 5
+LOG_COMPRESS = True  # arquivos rotacionados em .gz
+# Nível por módulo (logger); SISTEMA_DILIGENCIAS_LOG acrescenta ou substitui,
+# ex.: "database=DEBUG,server=WARNING" (um nível sem nome vale para o raiz)
+LOG_MODULE_LEVELS = {'matplotlib': 'WARNING', 'PIL': 'WARNING'}
+LOG_LEVELS_ENV = os.environ.get("SISTEMA_DILIGENCIAS_LOG")
 
 # Configurações de exportação
 EXCEL_DATE_FORMAT = "DD/MM/YYYY"
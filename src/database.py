@@ -6,133 +6,919 @@ Gerenciamento do banco de dados SQLite
 
 import sqlite3
 import logging
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
-from config import DATABASE_PATH
-from utils import backup_database
+from itertools import islice
+from config import (
+    DATABASE_PATH, DB_READER_POOL_SIZE, DB_CACHE_SIZE_KB, DB_MMAP_SIZE,
+    BULK_CHUNK_SIZE, PAGE_SIZE, BACKUP_FREQUENCY_DAYS, RECORD_CACHE_SIZE,
+    DB_BUSY_TIMEOUT_MS, DB_WRITE_RETRIES, DB_RETRY_BASE_DELAY, DB_RETRY_MAX_DELAY,
+    DB_LOCK_WAIT_WARN_MS, SLOW_QUERY_MS
+)
+from utils import backup_database, backup_database_async, backup_is_due, parse_currency
+from querystats import QueryStats
+from records import RecordCache, record_type, records_from_cursor
+
+
+# Colunas editáveis de diligências, na ordem usada por INSERT/UPDATE
+DILIGENCIA_COLUMNS = (
+    'data_solicitacao', 'solicitante', 'telefone_contato', 'tipo_demanda',
+    'numero_processo', 'data_demanda', 'status', 'horario',
+    'local_realizacao', 'valor_receber', 'observacoes'
+)
+
+INSERT_DEFAULTS = {'status': 'Pendente', 'valor_receber': 0}
+UPDATE_DEFAULTS = {'valor_receber': 0}
+
+INSERT_DILIGENCIA = '''
+    INSERT INTO diligencias 
+    (data_solicitacao, solicitante, telefone_contato, tipo_demanda, 
+     numero_processo, data_demanda, status, horario, local_realizacao, 
+     valor_receber, observacoes)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+UPDATE_DILIGENCIA = '''
+    UPDATE diligencias 
+    SET data_solicitacao=?, solicitante=?, telefone_contato=?, 
+        tipo_demanda=?, numero_processo=?, data_demanda=?, 
+        status=?, horario=?, local_realizacao=?, valor_receber=?, 
+        observacoes=?
+    WHERE id=?
+'''
+
+# Colunas editáveis de correspondentes, na ordem usada por INSERT/UPDATE
+CORRESPONDENTE_COLUMNS = (
+    'nome_contratado', 'telefone', 'email', 'endereco', 'valor_cobrado',
+    'prazo_pagamento', 'pago', 'diligencia_id', 'observacoes'
+)
+
+CORRESPONDENTE_DEFAULTS = {'valor_cobrado': 0, 'pago': 0}
+
+INSERT_CORRESPONDENTE = '''
+    INSERT INTO correspondentes 
+    (nome_contratado, telefone, email, endereco, valor_cobrado, 
+     prazo_pagamento, pago, diligencia_id, observacoes)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+UPDATE_CORRESPONDENTE = '''
+    UPDATE correspondentes 
+    SET nome_contratado=?, telefone=?, email=?, endereco=?, 
+        valor_cobrado=?, prazo_pagamento=?, pago=?, diligencia_id=?, 
+        observacoes=?
+    WHERE id=?
+'''
+
+
+# Colunas exibidas na grade de diligências
+LISTING_COLUMNS = (
+    'id', 'data_solicitacao', 'solicitante', 'tipo_demanda', 'status', 'valor_receber'
+)
+
+# Colunas indexadas pela pesquisa textual
+SEARCH_COLUMNS = ('numero_processo', 'solicitante', 'local_realizacao', 'observacoes')
+
+
+# Ordenações da grade: coluna -> colunas da chave de paginação. Empates
+# seguem a data e o id, e cada chave tem um índice com as mesmas colunas.
+SORT_KEYS = {
+    'id': ('id',),
+    'data_solicitacao': ('data_solicitacao', 'id'),
+    'solicitante': ('solicitante', 'data_solicitacao', 'id'),
+    'tipo_demanda': ('tipo_demanda', 'data_solicitacao', 'id'),
+    'status': ('status', 'data_solicitacao', 'id'),
+    'valor_receber': ('valor_receber', 'data_solicitacao', 'id'),
+}
+DEFAULT_SORT = 'data_solicitacao'
+
+# Colunas anuláveis das chaves: NULL quebraria a comparação de tuplas, então
+# a ordenação (e o índice) usa a expressão e listing_key o mesmo valor padrão
+SORT_EXPRESSIONS = {'valor_receber': 'IFNULL(valor_receber, 0)'}
+
+# Filtros da grade: nome -> condição com um parâmetro
+LISTING_FILTERS = {
+    'status': 'status = ?',
+    'tipo_demanda': 'tipo_demanda = ?',
+    'data_inicio': 'data_solicitacao >= ?',
+    'data_fim': 'data_solicitacao <= ?',
+    'pago': 'pago = ?',
+    'valor_min': 'IFNULL(valor_receber, 0) >= ?',
+    'valor_max': 'IFNULL(valor_receber, 0) <= ?',
+}
+
+
+def _filter_conditions(filters):
+    """Condições e parâmetros dos filtros informados (vazios são ignorados)"""
+    conditions, params = [], []
+    for name, value in (filters or {}).items():
+        if value is None or value == '':
+            continue
+        try:
+            conditions.append(LISTING_FILTERS[name])
+        except KeyError:
+            raise ValueError(f"Filtro desconhecido: {name}") from None
+        params.append(value)
+    return conditions, params
+
+
+def listing_query(filters=None, sort=DEFAULT_SORT, descending=True, after=None):
+    """Monta (SQL, parâmetros sem o LIMIT) de uma página da listagem após a chave after"""
+    try:
+        key = [SORT_EXPRESSIONS.get(col, col) for col in SORT_KEYS[sort]]
+    except KeyError:
+        raise ValueError(f"Ordenação desconhecida: {sort}") from None
+    
+    conditions, params = _filter_conditions(filters)
+    if after is not None:
+        operator = '<' if descending else '>'
+        placeholders = ', '.join('?' * len(key))
+        conditions.append(f"({', '.join(key)}) {operator} ({placeholders})")
+        params.extend(after)
+    
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    direction = 'DESC' if descending else 'ASC'
+    query = f'''
+        SELECT {', '.join(LISTING_COLUMNS)} FROM diligencias
+        {where}
+        ORDER BY {', '.join(f'{expr} {direction}' for expr in key)}
+        LIMIT ?
+    '''
+    return query, params
+
+
+def search_query(filters=None):
+    """Monta (SQL, parâmetros dos filtros) da pesquisa: MATCH, filtros, LIMIT e OFFSET"""
+    # As colunas dos filtros não existem no índice FTS: dispensam prefixo
+    conditions, params = _filter_conditions(filters)
+    where = ''.join(f' AND {condition}' for condition in conditions)
+    query = f'''
+        SELECT {', '.join(f'd.{col}' for col in LISTING_COLUMNS)} FROM diligencias_fts
+        JOIN diligencias d ON d.id = diligencias_fts.rowid
+        WHERE diligencias_fts MATCH ?{where}
+        ORDER BY diligencias_fts.rank
+        LIMIT ? OFFSET ?
+    '''
+    return query, params
+
+
+def correspondentes_query(diligencia_id=None, after=None):
+    """Monta (SQL, parâmetros sem o LIMIT) de uma página de correspondentes, do mais novo"""
+    conditions, params = [], []
+    if diligencia_id is not None:
+        conditions.append('c.diligencia_id = ?')
+        params.append(diligencia_id)
+    if after is not None:
+        conditions.append('c.id < ?')
+        params.append(after)
+    
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    query = f'''
+        SELECT c.id, c.nome_contratado, c.telefone, c.valor_cobrado,
+               c.prazo_pagamento, c.pago, c.diligencia_id, d.solicitante
+        FROM correspondentes c
+        LEFT JOIN diligencias d ON d.id = c.diligencia_id
+        {where}
+        ORDER BY c.id DESC
+        LIMIT ?
+    '''
+    return query, params
+
+
+def margin_query(after=None):
+    """Monta (SQL, parâmetros sem o LIMIT) de uma página da rentabilidade por diligência"""
+    where, params = '', []
+    if after is not None:
+        where = 'WHERE (d.data_solicitacao, d.id) < (?, ?)'
+        params.extend(after)
+    
+    query = f'''
+        SELECT d.id, d.data_solicitacao, d.solicitante, d.status,
+               IFNULL(d.valor_receber, 0) AS valor_receber,
+               COUNT(c.id) AS correspondentes,
+               TOTAL(c.valor_cobrado) AS custos,
+               IFNULL(d.valor_receber, 0) - TOTAL(c.valor_cobrado) AS margem
+        FROM diligencias d
+        LEFT JOIN correspondentes c ON c.diligencia_id = d.id
+        {where}
+        GROUP BY d.data_solicitacao, d.id
+        ORDER BY d.data_solicitacao DESC, d.id DESC
+        LIMIT ?
+    '''
+    return query, params
+
+
+def listing_key(row, sort=DEFAULT_SORT):
+    """Chave de paginação de uma linha da listagem na ordenação sort"""
+    # A única coluna anulável das chaves (valor_receber) vale 0 quando NULL
+    return tuple(0 if row[col] is None else row[col] for col in SORT_KEYS[sort])
+
+
+_LISTING = ', '.join(LISTING_COLUMNS)
+
+# Consultas frequentes, por nome. tests/test_query_plans.py confere com
+# EXPLAIN QUERY PLAN que nenhuma percorre uma tabela inteira sem índice nem
+# ordena em B-tree temporária: toda consulta nova de uso frequente deve ser
+# registrada aqui. (A pesquisa por LIKE, usada só sem FTS5, fica de fora; as
+# combinações de filtros e ordenações de listing_query são testadas à parte.)
+QUERIES = {
+    'listagem': listing_query()[0],
+    'listagem_apos': listing_query(after=(None, None))[0],
+    'listagem_antes': listing_query(descending=False, after=(None, None))[0],
+    'diligencias': '''
+        SELECT * FROM diligencias
+        ORDER BY data_solicitacao DESC, id DESC
+    ''',
+    'diligencias_bloco': '''
+        SELECT * FROM diligencias
+        ORDER BY data_solicitacao DESC, id DESC
+        LIMIT ?
+    ''',
+    'diligencias_bloco_apos': '''
+        SELECT * FROM diligencias
+        WHERE (data_solicitacao, id) < (?, ?)
+        ORDER BY data_solicitacao DESC, id DESC
+        LIMIT ?
+    ''',
+    'diligencia': 'SELECT * FROM diligencias WHERE id = ?',
+    'pesquisa': search_query()[0],
+    'alteradas': f'SELECT {_LISTING} FROM diligencias WHERE updated_at >= ?',
+    'excluidas': 'SELECT diligencia_id FROM diligencias_excluidas WHERE seq > ?',
+    'ultima_alteracao': 'SELECT MAX(updated_at) FROM diligencias',
+    'ultima_exclusao': 'SELECT MAX(seq) FROM diligencias_excluidas',
+    'estatisticas': 'SELECT * FROM estatisticas_resumo WHERE id = 1',
+    'total_diligencias': 'SELECT dilig_total FROM estatisticas_resumo WHERE id = 1',
+    'correspondente': 'SELECT * FROM correspondentes WHERE id = ?',
+    # A primeira página de correspondentes percorre o rowid do fim, parando
+    # no LIMIT; EXPLAIN a mostra como SCAN, por isso só as seguintes entram
+    'correspondentes_apos': correspondentes_query(after=0)[0],
+    'correspondentes_diligencia': correspondentes_query(diligencia_id=0, after=0)[0],
+    'margens': margin_query()[0],
+    'margens_apos': margin_query(after=(None, None))[0],
+    'limpeza_diligencias': '''
+        DELETE FROM diligencias
+        WHERE status = 'Cancelada' AND created_at < date('now', ?)
+    ''',
+    'limpeza_excluidas': "DELETE FROM diligencias_excluidas WHERE deleted_at < date('now', ?)",
+    'relatorio_fechados': '''
+        SELECT inicio FROM relatorio_fechados
+        WHERE tipo_periodo = ? AND inicio >= ? AND inicio < ?
+    ''',
+    'relatorio_periodos': '''
+        SELECT inicio, status, tipo_demanda,
+               quantidade, faturamento, recebido, custos, custos_pagos
+        FROM relatorio_periodos
+        WHERE tipo_periodo = ? AND inicio >= ? AND inicio < ?
+    ''',
+}
+
+
+# Agregados do resumo de estatísticas: coluna -> valor de uma linha ({r} = NEW/OLD)
+DILIGENCIA_STATS = {
+    'total': '1',
+    'pendentes': "{r}.status IS 'Pendente'",
+    'cumpridas': "{r}.status IS 'Cumprida'",
+    'canceladas': "{r}.status IS 'Cancelada'",
+    'faturamento_total': 'COALESCE({r}.valor_receber, 0)',
+    'recebido': 'CASE WHEN {r}.pago = 1 THEN COALESCE({r}.valor_receber, 0) ELSE 0 END',
+    'a_receber': 'CASE WHEN {r}.pago = 0 THEN COALESCE({r}.valor_receber, 0) ELSE 0 END',
+}
+
+CORRESPONDENTE_STATS = {
+    'total': '1',
+    'custos_total': 'COALESCE({r}.valor_cobrado, 0)',
+    'pago': 'CASE WHEN {r}.pago = 1 THEN COALESCE({r}.valor_cobrado, 0) ELSE 0 END',
+    'a_pagar': 'CASE WHEN {r}.pago = 0 THEN COALESCE({r}.valor_cobrado, 0) ELSE 0 END',
+}
+
+# (tabela, prefixo no resumo, agregados, colunas que alteram o resumo)
+STATS_SOURCES = (
+    ('diligencias', 'dilig_', DILIGENCIA_STATS, 'status, valor_receber, pago'),
+    ('correspondentes', 'corresp_', CORRESPONDENTE_STATS, 'valor_cobrado, pago'),
+)
+
+# Contagens guardadas como REAL no resumo, devolvidas como int
+STATS_COUNTS = ('total', 'pendentes', 'cumpridas', 'canceladas')
+
+
+# Início do período que contém a data {d}, por tipo de relatório (REPORT_TYPES)
+REPORT_PERIODS = {
+    'DIARIO': 'date({d})',
+    'SEMANAL': "date({d}, '-6 days', 'weekday 1')",
+    'MENSAL': "date({d}, 'start of month')",
+    'ANUAL': "date({d}, 'start of year')",
+}
+
+# Tabelas de rollup dos relatórios: linhas agregadas e períodos já gravados
+REPORT_ROLLUP_TABLES = ('relatorio_periodos', 'relatorio_fechados')
+
+
+def _report_invalidation(date_expr):
+    """Comandos que descartam os rollups dos períodos que contêm date_expr"""
+    periods = ', '.join(
+        f"('{kind}', {expr.format(d=date_expr)})" for kind, expr in REPORT_PERIODS.items()
+    )
+    return '\n'.join(
+        f'DELETE FROM {table} WHERE (tipo_periodo, inicio) IN (VALUES {periods});'
+        for table in REPORT_ROLLUP_TABLES
+    )
+
+
+def _stats_delta(prefix, stats, ref, sign):
+    """Cláusula SET que soma (ou subtrai) a contribuição de uma linha ao resumo"""
+    return ', '.join(
+        f'{prefix}{col} = {prefix}{col} {sign} ({expr.format(r=ref)})'
+        for col, expr in stats.items()
+    )
+
+
+def _fts_query(text):
+    """Monta uma expressão MATCH com prefixo em cada termo digitado"""
+    # Termos entre aspas: pontuação (ex.: número CNJ) não vira sintaxe FTS
+    return ' '.join(f'"{term}"*' for term in re.findall(r'\w+', text))
+
+
+def _diligencia_params(data, defaults):
+    """Converte um dict (ou tupla já ordenada) nos parâmetros de DILIGENCIA_COLUMNS"""
+    return _row_params(data, DILIGENCIA_COLUMNS, defaults)
+
+
+def _row_params(data, columns, defaults):
+    """Converte um dict (ou tupla já ordenada) nos parâmetros de columns"""
+    if isinstance(data, dict):
+        return tuple(data.get(col, defaults.get(col)) for col in columns)
+    
+    params = tuple(data)
+    if len(params) != len(columns):
+        raise ValueError(
+            f"Esperadas {len(columns)} colunas, recebidas {len(params)}"
+        )
+    return params
+
+
+def _is_busy(error):
+    """Se o erro é de lock ocupado (SQLITE_BUSY/SQLITE_LOCKED)"""
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def _retry_delay(attempt):
+    """Pausa antes da nova tentativa: backoff exponencial com jitter completo"""
+    return random.uniform(0, min(DB_RETRY_MAX_DELAY, DB_RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def _chunked(iterable, size):
+    """Divide um iterável em listas de até size elementos"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, max(1, size)))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ConnectionPool:
+    """Pool de conexões SQLite: um escritor persistente e leitores reutilizáveis"""
+    
+    def __init__(self, db_path, max_readers=DB_READER_POOL_SIZE):
+        self.db_path = str(db_path)
+        self.max_readers = max(1, max_readers)
+        self.logger = logging.getLogger(__name__)
+        
+        self._writer_lock = threading.RLock()
+        self._readers = queue.LifoQueue()
+        self._readers_lock = threading.Lock()
+        self._reader_count = 0
+        self._all_connections = []
+        
+        # O escritor é aberto primeiro para ativar o WAL antes dos leitores
+        self._writer = self._connect()
+        self._writer.execute('PRAGMA journal_mode=WAL')
+    
+    def _connect(self):
+        """Abre uma conexão com os pragmas de desempenho aplicados"""
+        # isolation_level=None: autocommit, transações explícitas via BEGIN
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        # Lock de outro processo: o SQLite espera até o timeout antes de BUSY
+        conn.execute(f'PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT_MS)}')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA cache_size=-{int(DB_CACHE_SIZE_KB)}')
+        conn.execute(f'PRAGMA mmap_size={int(DB_MMAP_SIZE)}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        self._all_connections.append(conn)
+        return conn
+    
+    @contextmanager
+    def writer(self):
+        """Empresta a conexão de escrita (exclusiva entre threads)"""
+        with self._writer_lock:
+            yield self._writer
+    
+    @contextmanager
+    def reader(self):
+        """Empresta uma conexão de leitura do pool"""
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+    
+    def _acquire_reader(self):
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self._readers_lock:
+            if self._reader_count < self.max_readers:
+                self._reader_count += 1
+                return self._connect()
+        
+        # Pool esgotado: aguardar devolução de um leitor
+        return self._readers.get()
+    
+    def data_version(self):
+        """PRAGMA data_version do escritor (muda com gravações de outro processo) ou None"""
+        if not self._writer_lock.acquire(blocking=False):
+            return None
+        try:
+            return self._writer.execute('PRAGMA data_version').fetchone()[0]
+        finally:
+            self._writer_lock.release()
+    
+    def close(self):
+        """Fecha todas as conexões do pool"""
+        with self._writer_lock, self._readers_lock:
+            for conn in self._all_connections:
+                try:
+                    conn.close()
+                except sqlite3.Error as e:
+                    self.logger.warning(f"Erro ao fechar conexão: {e}")
+            self._all_connections.clear()
+            self._reader_count = 0
+            self._readers = queue.LifoQueue()
 
 
 class DatabaseManager:
     """Gerenciador do banco de dados"""
     
-    def __init__(self, db_path=None):
-        self.db_path = db_path or DATABASE_PATH
+    def __init__(self, db_path=None, auto_backup=True, backups_dir=None):
+        self.db_path = Path(db_path) if db_path else DATABASE_PATH
+        
+        # Diretório dos backups (e da poda); None usa config.BACKUPS_DIR
+        self.backups_dir = backups_dir
         self.logger = logging.getLogger(__name__)
+        
+        # Backup periódico em segundo plano ao abrir (a interface); processos
+        # curtos como a linha de comando o desligam e chamam backup_database
+        self.auto_backup = auto_backup
+        
+        # Cache de diligências completas por id (ver get_diligencia)
+        self.cache = RecordCache(RECORD_CACHE_SIZE)
+        self._data_version = None
+        
+        # Espera pelo lock de escrita (ver transaction e lock_metrics)
+        self._lock_stats = {'escritas': 0, 'novas_tentativas': 0, 'falhas': 0,
+                            'espera_total': 0.0, 'espera_max': 0.0}
+        self._lock_stats_lock = threading.Lock()
+        
+        # Tempo por consulta (ver _record_query e diagnostics)
+        self.query_stats = QueryStats(SLOW_QUERY_MS)
+        self.slow_log = logging.getLogger(f'{__name__}.lentas')
+        
         self.init_database()
     
     def init_database(self):
-        """Inicializa o banco de dados e cria as tabelas"""
+        """Abre o banco de dados e aplica as migrações pendentes"""
         try:
-            # Criar backup se database já existe
-            if self.db_path.exists():
-                backup_database(str(self.db_path))
+            existing = self.db_path.exists()
+            self.pool = ConnectionPool(self.db_path)
             
-            with sqlite3.connect(str(self.db_path)) as conn:
-                cursor = conn.cursor()
-                
-                # Tabela de diligências
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS diligencias (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        data_solicitacao DATE NOT NULL,
-                        solicitante TEXT NOT NULL,
-                        telefone_contato TEXT,
-                        tipo_demanda TEXT NOT NULL,
-                        numero_processo TEXT,
-                        data_demanda DATE,
-                        status TEXT NOT NULL DEFAULT 'Pendente',
-                        horario TEXT,
-                        local_realizacao TEXT,
-                        valor_receber REAL DEFAULT 0,
-                        data_pagamento DATE,
-                        pago BOOLEAN DEFAULT 0,
-                        observacoes TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                # Tabela de correspondentes
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS correspondentes (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        nome_contratado TEXT NOT NULL,
-                        telefone TEXT,
-                        email TEXT,
-                        endereco TEXT,
-                        valor_cobrado REAL DEFAULT 0,
-                        prazo_pagamento DATE,
-                        pago BOOLEAN DEFAULT 0,
-                        diligencia_id INTEGER,
-                        observacoes TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (diligencia_id) REFERENCES diligencias (id)
-                    )
-                ''')
-                
-                # Índices para performance
-                cursor.execute('''
-                    CREATE INDEX IF NOT EXISTS idx_diligencias_data 
-                    ON diligencias (data_solicitacao)
-                ''')
-                
-                cursor.execute('''
-                    CREATE INDEX IF NOT EXISTS idx_diligencias_status 
-                    ON diligencias (status)
-                ''')
-                
-                cursor.execute('''
-                    CREATE INDEX IF NOT EXISTS idx_correspondentes_diligencia 
-                    ON correspondentes (diligencia_id)
-                ''')
-                
-                # Triggers para atualizar timestamp
-                cursor.execute('''
-                    CREATE TRIGGER IF NOT EXISTS update_diligencias_timestamp 
-                    AFTER UPDATE ON diligencias
-                    BEGIN
-                        UPDATE diligencias SET updated_at = CURRENT_TIMESTAMP 
-                        WHERE id = NEW.id;
-                    END
-                ''')
-                
-                cursor.execute('''
-                    CREATE TRIGGER IF NOT EXISTS update_correspondentes_timestamp 
-                    AFTER UPDATE ON correspondentes
-                    BEGIN
-                        UPDATE correspondentes SET updated_at = CURRENT_TIMESTAMP 
-                        WHERE id = NEW.id;
-                    END
-                ''')
-                
-                conn.commit()
-                self.logger.info("Banco de dados inicializado com sucesso")
-                
+            with self.pool.reader() as conn:
+                version = conn.execute('PRAGMA user_version').fetchone()[0]
+            
+            if existing:
+                if version < len(self._migrations()):
+                    # Cópia síncrona antes de alterar o esquema
+                    backup_database(str(self.db_path), backups_dir=self.backups_dir)
+                elif self.auto_backup and backup_is_due(BACKUP_FREQUENCY_DAYS, self.backups_dir):
+                    backup_database_async(str(self.db_path), backups_dir=self.backups_dir)
+            
+            self._migrate(version)
+            
+            with self.pool.reader() as conn:
+                self.fts_available = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'diligencias_fts'"
+                ).fetchone() is not None
+            
+            self.logger.info("Banco de dados inicializado com sucesso")
+        
         except Exception as e:
             self.logger.error(f"Erro ao inicializar banco de dados: {e}")
             raise
     
+    def _migrations(self):
+        """Migrações do esquema, em ordem: a posição é a versão (novas só no fim)"""
+        return (
+            self._create_schema,
+            self._create_change_log,
+            self._init_search_index,
+            self._init_statistics,
+            self._create_plan_indexes,
+            self._create_listing_indexes,
+            self._create_report_rollups,
+            self._normalize_valores,
+        )
+    
+    def _migrate(self, current_version):
+        """Aplica as migrações posteriores a current_version (PRAGMA user_version)"""
+        for version, migration in enumerate(self._migrations(), start=1):
+            if version <= current_version:
+                continue
+            
+            # Cada migração e o novo user_version são gravados juntos
+            with self.transaction(f'migração {version}') as conn:
+                # Outra instância pode ter migrado enquanto se esperava o lock
+                if conn.execute('PRAGMA user_version').fetchone()[0] >= version:
+                    continue
+                migration(conn.cursor())
+                conn.execute(f'PRAGMA user_version = {version}')
+            
+            self.logger.info(f"Migração {version} aplicada ({migration.__name__})")
+    
+    def _create_schema(self, cursor):
+        """Migração 1: tabelas, índices e triggers de timestamp"""
+        # Tabela de diligências
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS diligencias (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                data_solicitacao DATE NOT NULL,
+                solicitante TEXT NOT NULL,
+                telefone_contato TEXT,
+                tipo_demanda TEXT NOT NULL,
+                numero_processo TEXT,
+                data_demanda DATE,
+                status TEXT NOT NULL DEFAULT 'Pendente',
+                horario TEXT,
+                local_realizacao TEXT,
+                valor_receber REAL DEFAULT 0,
+                data_pagamento DATE,
+                pago BOOLEAN DEFAULT 0,
+                observacoes TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Tabela de correspondentes
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS correspondentes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nome_contratado TEXT NOT NULL,
+                telefone TEXT,
+                email TEXT,
+                endereco TEXT,
+                valor_cobrado REAL DEFAULT 0,
+                prazo_pagamento DATE,
+                pago BOOLEAN DEFAULT 0,
+                diligencia_id INTEGER,
+                observacoes TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (diligencia_id) REFERENCES diligencias (id)
+            )
+        ''')
+        
+        # Índices para performance
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_diligencias_data 
+            ON diligencias (data_solicitacao)
+        ''')
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_diligencias_status 
+            ON diligencias (status)
+        ''')
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_correspondentes_diligencia 
+            ON correspondentes (diligencia_id)
+        ''')
+        
+        # Triggers para atualizar timestamp
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS update_diligencias_timestamp 
+            AFTER UPDATE ON diligencias
+            BEGIN
+                UPDATE diligencias SET updated_at = CURRENT_TIMESTAMP 
+                WHERE id = NEW.id;
+            END
+        ''')
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS update_correspondentes_timestamp 
+            AFTER UPDATE ON correspondentes
+            BEGIN
+                UPDATE correspondentes SET updated_at = CURRENT_TIMESTAMP 
+                WHERE id = NEW.id;
+            END
+        ''')
+    
+    def _create_change_log(self, cursor):
+        """Migração 2: índice de updated_at e registro de exclusões da grade"""
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_diligencias_updated 
+            ON diligencias (updated_at)
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS diligencias_excluidas (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                diligencia_id INTEGER NOT NULL,
+                deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS diligencias_tombstone 
+            AFTER DELETE ON diligencias
+            BEGIN
+                INSERT INTO diligencias_excluidas (diligencia_id) VALUES (OLD.id);
+            END
+        ''')
+    
+    def _init_search_index(self, cursor):
+        """Migração 3: índice FTS5 e triggers (sem FTS5, a pesquisa usa LIKE)"""
+        columns = ', '.join(SEARCH_COLUMNS)
+        new_values = ', '.join(f'NEW.{col}' for col in SEARCH_COLUMNS)
+        old_values = ', '.join(f'OLD.{col}' for col in SEARCH_COLUMNS)
+        
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'diligencias_fts'"
+        ).fetchone()
+        
+        try:
+            # Índice de conteúdo externo: o texto fica só em diligencias
+            cursor.execute(f'''
+                CREATE VIRTUAL TABLE IF NOT EXISTS diligencias_fts USING fts5(
+                    {columns},
+                    content='diligencias', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2',
+                    prefix='2 3'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            self.logger.warning(f"FTS5 indisponível, pesquisa sem índice: {e}")
+            return
+        
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS diligencias_fts_insert 
+            AFTER INSERT ON diligencias
+            BEGIN
+                INSERT INTO diligencias_fts (rowid, {columns})
+                VALUES (NEW.id, {new_values});
+            END
+        ''')
+        
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS diligencias_fts_delete 
+            AFTER DELETE ON diligencias
+            BEGIN
+                INSERT INTO diligencias_fts (diligencias_fts, rowid, {columns})
+                VALUES ('delete', OLD.id, {old_values});
+            END
+        ''')
+        
+        # Restrito às colunas indexadas: o trigger de updated_at não reindexa
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS diligencias_fts_update 
+            AFTER UPDATE OF {columns} ON diligencias
+            BEGIN
+                INSERT INTO diligencias_fts (diligencias_fts, rowid, {columns})
+                VALUES ('delete', OLD.id, {old_values});
+                INSERT INTO diligencias_fts (rowid, {columns})
+                VALUES (NEW.id, {new_values});
+            END
+        ''')
+        
+        if not exists:
+            # Banco anterior ao índice: indexar as linhas existentes
+            cursor.execute("INSERT INTO diligencias_fts (diligencias_fts) VALUES ('rebuild')")
+    
+    def _init_statistics(self, cursor):
+        """Migração 4: resumo de estatísticas mantido por triggers"""
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'estatisticas_resumo'"
+        ).fetchone()
+        
+        columns = ', '.join(
+            f'{prefix}{col} REAL NOT NULL DEFAULT 0'
+            for _, prefix, stats, _ in STATS_SOURCES for col in stats
+        )
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS estatisticas_resumo (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                {columns}
+            )
+        ''')
+        
+        for table, prefix, stats, watched in STATS_SOURCES:
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_stats_insert
+                AFTER INSERT ON {table}
+                BEGIN
+                    UPDATE estatisticas_resumo SET {_stats_delta(prefix, stats, 'NEW', '+')};
+                END
+            ''')
+            
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_stats_delete
+                AFTER DELETE ON {table}
+                BEGIN
+                    UPDATE estatisticas_resumo SET {_stats_delta(prefix, stats, 'OLD', '-')};
+                END
+            ''')
+            
+            # Só colunas que afetam o resumo (o trigger de updated_at não dispara)
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_stats_update
+                AFTER UPDATE OF {watched} ON {table}
+                BEGIN
+                    UPDATE estatisticas_resumo SET {_stats_delta(prefix, stats, 'OLD', '-')};
+                    UPDATE estatisticas_resumo SET {_stats_delta(prefix, stats, 'NEW', '+')};
+                END
+            ''')
+        
+        if not exists:
+            # Banco anterior ao resumo: calcular a partir das tabelas
+            cursor.execute('INSERT INTO estatisticas_resumo (id) VALUES (1)')
+            self._rebuild_statistics(cursor)
+    
+    def _create_plan_indexes(self, cursor):
+        """Migração 5: índices exigidos pelos planos das consultas de QUERIES"""
+        # (status, created_at) substitui o índice só de status: a limpeza
+        # passa a buscar uma faixa em vez de filtrar todas as canceladas
+        cursor.execute('DROP INDEX IF EXISTS idx_diligencias_status')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_diligencias_status_criacao 
+            ON diligencias (status, created_at)
+        ''')
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_diligencias_excluidas_data 
+            ON diligencias_excluidas (deleted_at)
+        ''')
+    
+    def _create_listing_indexes(self, cursor):
+        """Migração 6: índices das ordenações da grade (SORT_KEYS)"""
+        for name, columns in (
+            ('solicitante', 'solicitante, data_solicitacao'),
+            ('tipo', 'tipo_demanda, data_solicitacao'),
+            ('status', 'status, data_solicitacao'),
+            ('valor', 'IFNULL(valor_receber, 0), data_solicitacao'),
+        ):
+            cursor.execute(f'''
+                CREATE INDEX IF NOT EXISTS idx_diligencias_ordem_{name} 
+                ON diligencias ({columns})
+            ''')
+    
+    def _create_report_rollups(self, cursor):
+        """Migração 7: rollups dos relatórios por período (ver reports.py)"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS relatorio_periodos (
+                tipo_periodo TEXT NOT NULL,
+                inicio DATE NOT NULL,
+                status TEXT NOT NULL,
+                tipo_demanda TEXT NOT NULL,
+                quantidade INTEGER NOT NULL,
+                faturamento REAL NOT NULL,
+                recebido REAL NOT NULL,
+                custos REAL NOT NULL,
+                custos_pagos REAL NOT NULL,
+                PRIMARY KEY (tipo_periodo, inicio, status, tipo_demanda)
+            ) WITHOUT ROWID
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS relatorio_fechados (
+                tipo_periodo TEXT NOT NULL,
+                inicio DATE NOT NULL,
+                PRIMARY KEY (tipo_periodo, inicio)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Diligências: a data define o período; as demais colunas, os valores
+        own_date = {ref: f'{ref}.data_solicitacao' for ref in ('NEW', 'OLD')}
+        # Correspondentes: o período é o da diligência vinculada
+        linked_date = {
+            ref: f'(SELECT data_solicitacao FROM diligencias WHERE id = {ref}.diligencia_id)'
+            for ref in ('NEW', 'OLD')
+        }
+        
+        for table, dates, watched in (
+            ('diligencias', own_date, 'data_solicitacao, status, tipo_demanda, valor_receber, pago'),
+            ('correspondentes', linked_date, 'valor_cobrado, pago, diligencia_id'),
+        ):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_relatorio_insert
+                AFTER INSERT ON {table}
+                BEGIN
+                    {_report_invalidation(dates['NEW'])}
+                END
+            ''')
+            
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_relatorio_delete
+                AFTER DELETE ON {table}
+                BEGIN
+                    {_report_invalidation(dates['OLD'])}
+                END
+            ''')
+            
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_relatorio_update
+                AFTER UPDATE OF {watched} ON {table}
+                BEGIN
+                    {_report_invalidation(dates['OLD'])}
+                    {_report_invalidation(dates['NEW'])}
+                END
+            ''')
+    
+    def _normalize_valores(self, cursor):
+        """Migração 8: valor_receber gravado como texto ('150,00') passa a REAL"""
+        rows = cursor.execute(
+            "SELECT id, valor_receber FROM diligencias WHERE typeof(valor_receber) = 'text'"
+        ).fetchall()
+        for diligencia_id, text in rows:
+            try:
+                valor = parse_currency(text) if text.strip() else None
+            except ValueError:
+                # Texto na coluna quebraria a comparação das chaves da grade
+                self.logger.warning(f"Diligência {diligencia_id}: valor inválido descartado ({text!r})")
+                valor = None
+            cursor.execute('UPDATE diligencias SET valor_receber = ? WHERE id = ?',
+                           (valor, diligencia_id))
+    
+    def _rebuild_statistics(self, conn):
+        """Recalcula o resumo com agregações completas das tabelas"""
+        for table, prefix, stats, _ in STATS_SOURCES:
+            aggregates = ', '.join(
+                f'COALESCE(SUM({expr.format(r=table)}), 0)' for expr in stats.values()
+            )
+            assignments = ', '.join(f'{prefix}{col} = ?' for col in stats)
+            values = conn.execute(f'SELECT {aggregates} FROM {table}').fetchone()
+            conn.execute(f'UPDATE estatisticas_resumo SET {assignments}', tuple(values))
+    
+    def rebuild_statistics(self):
+        """Reconstrói o resumo de estatísticas (verificação de consistência)"""
+        try:
+            with self.transaction('estatísticas') as conn:
+                self._rebuild_statistics(conn)
+            self.logger.info("Resumo de estatísticas reconstruído")
+            return True
+        except sqlite3.Error as e:
+            self.logger.error(f"Erro ao reconstruir estatísticas: {e}")
+            return False
+    
     def execute_query(self, query, params=None, fetch=False):
         """Executa uma query no banco de dados com tratamento de erro"""
+        if not fetch:
+            lastrowid = self._execute_write(query, params)
+            self.cache.clear()
+            return lastrowid
+        
         try:
-            with sqlite3.connect(str(self.db_path)) as conn:
-                # Configurar row factory para resultados nomeados
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                
-                if params:
-                    cursor.execute(query, params)
-                else:
-                    cursor.execute(query)
-                
-                if fetch:
-                    result = cursor.fetchall()
-                    return [dict(row) for row in result]
-                else:
-                    conn.commit()
-                    return cursor.lastrowid
-                    
+            # Leituras usam o pool de leitores; escritas, o escritor único
+            with self.pool.reader() as conn:
+                result = self.fetch_timed(conn, query, params)
+                return [dict(row) for row in result]
+        
+        except sqlite3.Error as e:
+            self.logger.error(f"Erro na query: {query} | Params: {params} | Erro: {e}")
+            raise
+        except Exception as e:
+            self.logger.error(f"Erro inesperado na query: {e}")
+            raise
+    
+    def _execute_write(self, query, params=None):
+        """Executa uma escrita no escritor único e retorna lastrowid"""
+        try:
+            with self.transaction(' '.join(query.split()[:3])) as conn:
+                started = time.perf_counter()
+                cursor = conn.execute(query, params or ())
+                self._record_query(conn, query, params, time.perf_counter() - started,
+                                   cursor.rowcount)
+                return cursor.lastrowid
+        
         except sqlite3.Error as e:
             self.logger.error(f"Erro na query: {query} | Params: {params} | Erro: {e}")
             raise
@@ -140,42 +926,218 @@ class DatabaseManager:
             self.logger.error(f"Erro inesperado na query: {e}")
             raise
     
+    def fetch_records(self, query, params=None, name='Registro'):
+        """Executa uma leitura e retorna a lista de records (ver records.Record)"""
+        return list(self.iter_records(query, params, name))
+    
+    def iter_records(self, query, params=None, name='Registro', chunk_size=BULK_CHUNK_SIZE):
+        """Gera records lidos em blocos de um único cursor"""
+        try:
+            with self.pool.reader() as conn:
+                started = time.perf_counter()
+                cursor = conn.cursor()
+                cursor.row_factory = None  # tuplas puras, sem sqlite3.Row
+                cursor.execute(query, params or ())
+                cls = record_type(name, (column[0] for column in cursor.description))
+                
+                # O tempo conta só a execução e a leitura dos blocos, não o
+                # que o consumidor faz entre um bloco e outro
+                elapsed, count = time.perf_counter() - started, 0
+                try:
+                    while True:
+                        started = time.perf_counter()
+                        rows = cursor.fetchmany(chunk_size)
+                        elapsed += time.perf_counter() - started
+                        if not rows:
+                            return
+                        count += len(rows)
+                        yield from map(cls, rows)
+                finally:
+                    self._record_query(conn, query, params, elapsed, count)
+        
+        except sqlite3.Error as e:
+            self.logger.error(f"Erro na query: {query} | Params: {params} | Erro: {e}")
+            raise
+    
+    def fetch_timed(self, conn, query, params=None):
+        """Executa uma leitura numa conexão já emprestada e registra o tempo"""
+        started = time.perf_counter()
+        rows = conn.execute(query, params or ()).fetchall()
+        self._record_query(conn, query, params, time.perf_counter() - started, len(rows))
+        return rows
+    
+    def _executemany(self, conn, query, params):
+        """executemany com registro do tempo (o plano usa a primeira linha)"""
+        started = time.perf_counter()
+        cursor = conn.executemany(query, params)
+        self._record_query(conn, query, params[0] if params else None,
+                           time.perf_counter() - started, cursor.rowcount)
+        return cursor
+    
+    def _record_query(self, conn, query, params, elapsed, rows):
+        """Acumula o tempo de uma consulta e registra as lentas (com o plano da primeira)"""
+        key, slow, first_slow = self.query_stats.record(query, elapsed, rows)
+        if not slow:
+            return
+        
+        plan = ''
+        if first_slow:
+            try:
+                explained = conn.execute(f'EXPLAIN QUERY PLAN {query}', params or ())
+                steps = [row[3] for row in explained.fetchall()]
+            except sqlite3.Error as e:
+                steps = [f'plano indisponível: {e}']
+            self.query_stats.set_plan(key, steps)
+            plan = ''.join(f'\n    {step}' for step in steps)
+        
+        self.slow_log.warning(f"Consulta lenta: {elapsed * 1000:.1f} ms, {rows} linhas: {key}{plan}")
+    
+    def explain(self, query, params=None):
+        """Plano de execução (EXPLAIN QUERY PLAN) de query, uma linha por passo"""
+        with self.pool.reader() as conn:
+            rows = conn.execute(f'EXPLAIN QUERY PLAN {query}', params or ()).fetchall()
+        return [row['detail'] for row in rows]
+    
+    @contextmanager
+    def transaction(self, label='transação'):
+        """Executa um bloco de escritas numa única transação (não aninhável)"""
+        start = time.perf_counter()
+        with self.pool.writer() as conn:
+            retries = self._begin_immediate(conn, label, start)
+            self._record_lock_wait(label, time.perf_counter() - start, retries)
+            try:
+                yield conn
+                conn.execute('COMMIT')
+            except BaseException:
+                # Um COMMIT que falha pode ou não ter desfeito a transação
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+    
+    def _begin_immediate(self, conn, label, start):
+        """BEGIN IMMEDIATE com backoff; retorna o número de novas tentativas"""
+        for attempt in range(DB_WRITE_RETRIES + 1):
+            try:
+                # O lock de escrita é reservado no início, e não no meio do bloco
+                conn.execute('BEGIN IMMEDIATE')
+                return attempt
+            except sqlite3.OperationalError as e:
+                if not _is_busy(e) or attempt == DB_WRITE_RETRIES:
+                    if _is_busy(e):
+                        self._record_lock_wait(label, time.perf_counter() - start, attempt,
+                                               failed=True)
+                    raise
+                delay = _retry_delay(attempt)
+                self.logger.debug(f"Banco ocupado ({label}), nova tentativa em {delay * 1000:.0f} ms")
+                time.sleep(delay)
+    
+    def _record_lock_wait(self, label, waited, retries, failed=False):
+        """Acumula e registra no log a espera pelo lock de uma escrita"""
+        with self._lock_stats_lock:
+            stats = self._lock_stats
+            stats['escritas'] += 1
+            stats['novas_tentativas'] += retries
+            stats['falhas'] += failed
+            stats['espera_total'] += waited
+            stats['espera_max'] = max(stats['espera_max'], waited)
+        
+        message = f"Escrita {label}: {waited * 1000:.1f} ms de espera pelo lock, {retries} novas tentativas"
+        if failed:
+            self.logger.error(f"{message}; banco ocupado, escrita não realizada")
+        elif waited * 1000 >= DB_LOCK_WAIT_WARN_MS:
+            self.logger.warning(message)
+        else:
+            self.logger.debug(message)
+    
+    def diagnostics(self):
+        """Resumo para diagnóstico em produção (tempos em ms)"""
+        with self.pool.reader() as conn:
+            pragmas = {
+                name: conn.execute(f'PRAGMA {name}').fetchone()[0]
+                for name in ('user_version', 'page_size', 'page_count', 'freelist_count')
+            }
+        wal_path = Path(f'{self.db_path}-wal')
+        
+        return {
+            'banco': {
+                'arquivo': str(self.db_path),
+                'tamanho_bytes': self.db_path.stat().st_size,
+                'wal_bytes': wal_path.stat().st_size if wal_path.exists() else 0,
+                'sqlite': sqlite3.sqlite_version,
+                **pragmas,
+            },
+            'escritas': self.lock_metrics(),
+            'cache': {'registros': len(self.cache), 'capacidade': self.cache.capacity},
+            'consulta_lenta_ms': self.query_stats.slow_ms,
+            'consultas': self.query_stats.snapshot(),
+        }
+    
+    def reset_diagnostics(self):
+        """Zera os tempos por consulta e as métricas do lock de escrita"""
+        self.query_stats.reset()
+        with self._lock_stats_lock:
+            for name in self._lock_stats:
+                self._lock_stats[name] = 0
+    
+    def lock_metrics(self):
+        """Resumo da espera pelo lock de escrita desde a abertura (tempos em ms)"""
+        with self._lock_stats_lock:
+            stats = dict(self._lock_stats)
+        writes = stats['escritas']
+        return {
+            'escritas': writes,
+            'novas_tentativas': stats['novas_tentativas'],
+            'falhas': stats['falhas'],
+            'espera_media_ms': stats['espera_total'] * 1000 / writes if writes else 0.0,
+            'espera_max_ms': stats['espera_max'] * 1000,
+        }
+    
+    def close(self):
+        """Fecha as conexões com o banco de dados"""
+        self.pool.close()
+    
+    def backup_async(self, progress=None, callback=None):
+        """Backup online em segundo plano (ver utils.backup_database_async)"""
+        return backup_database_async(str(self.db_path), progress=progress, callback=callback,
+                                     backups_dir=self.backups_dir)
+    
+    def period_report(self, kind, first, last, today=None):
+        """Relatório por período (ver reports.period_report)"""
+        # reports importa este módulo: import tardio evita o ciclo
+        from reports import period_report
+        return period_report(self, kind, first, last, today=today)
+    
+    def vacuum(self):
+        """Compacta o banco e atualiza o planejador; retorna o tamanho antes e depois"""
+        before = self.db_path.stat().st_size
+        try:
+            with self.pool.writer() as conn:
+                conn.execute('VACUUM')
+                conn.execute('PRAGMA optimize')
+                # O arquivo principal só encolhe quando o WAL é aplicado a ele
+                conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        except sqlite3.Error as e:
+            self.logger.error(f"Erro ao compactar banco de dados: {e}")
+            raise
+        
+        after = self.db_path.stat().st_size
+        self.logger.info(f"Banco compactado: {before} -> {after} bytes")
+        return before, after
+    
     def get_statistics(self):
-        """Retorna estatísticas do banco de dados"""
+        """Retorna estatísticas do banco de dados (lidas do resumo)"""
         try:
-            stats = {}
-            
-            # Estatísticas de diligências
-            query = '''
-                SELECT 
-                    COUNT(*) as total,
-                    COUNT(CASE WHEN status = 'Pendente' THEN 1 END) as pendentes,
-                    COUNT(CASE WHEN status = 'Cumprida' THEN 1 END) as cumpridas,
-                    COUNT(CASE WHEN status = 'Cancelada' THEN 1 END) as canceladas,
-                    COALESCE(SUM(valor_receber), 0) as faturamento_total,
-                    COALESCE(SUM(CASE WHEN pago = 1 THEN valor_receber ELSE 0 END), 0) as recebido,
-                    COALESCE(SUM(CASE WHEN pago = 0 THEN valor_receber ELSE 0 END), 0) as a_receber
-                FROM diligencias
-            '''
+            summary = self.execute_query(QUERIES['estatisticas'], fetch=True)[0]
             
-            dilig_stats = self.execute_query(query, fetch=True)[0]
-            stats['diligencias'] = dilig_stats
-            
-            # Estatísticas de correspondentes
-            query = '''
-                SELECT 
-                    COUNT(*) as total,
-                    COALESCE(SUM(valor_cobrado), 0) as custos_total,
-                    COALESCE(SUM(CASE WHEN pago = 1 THEN valor_cobrado ELSE 0 END), 0) as pago,
-                    COALESCE(SUM(CASE WHEN pago = 0 THEN valor_cobrado ELSE 0 END), 0) as a_pagar
-                FROM correspondentes
-            '''
-            
-            corresp_stats = self.execute_query(query, fetch=True)[0]
-            stats['correspondentes'] = corresp_stats
+            stats = {}
+            for table, prefix, aggregates, _ in STATS_SOURCES:
+                stats[table] = {
+                    col: int(summary[prefix + col]) if col in STATS_COUNTS else summary[prefix + col]
+                    for col in aggregates
+                }
             
             return stats
-            
+        
         except Exception as e:
             self.logger.error(f"Erro ao obter estatísticas: {e}")
             return {}
@@ -183,83 +1145,261 @@ class DatabaseManager:
     def cleanup_old_records(self, days=365):
         """Remove registros antigos (opcional)"""
         try:
-            query = '''
-                DELETE FROM diligencias 
-                WHERE created_at < date('now', '-{} days')
-                AND status = 'Cancelada'
-            '''.format(days)
+            cutoff = (f'-{int(days)} days',)
+            self.execute_query(QUERIES['limpeza_diligencias'], cutoff)
             
-            cursor = self.execute_query(query)
+            # Exclusões antigas já foram vistas por qualquer grade aberta
+            self.execute_query(QUERIES['limpeza_excluidas'], cutoff)
             self.logger.info(f"Limpeza de registros executada")
             return True
-            
+        
         except Exception as e:
             self.logger.error(f"Erro na limpeza de registros: {e}")
             return False
     
     def insert_diligencia(self, data):
         """Insere nova diligência"""
-        query = '''
-            INSERT INTO diligencias 
-            (data_solicitacao, solicitante, telefone_contato, tipo_demanda, 
-             numero_processo, data_demanda, status, horario, local_realizacao, 
-             valor_receber, observacoes)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        '''
+        params = _diligencia_params(data, INSERT_DEFAULTS)
+        # Id novo: nenhum registro em cache é afetado
+        return self._execute_write(INSERT_DILIGENCIA, params)
+    
+    def insert_diligencias_many(self, records, chunk_size=BULK_CHUNK_SIZE):
+        """Insere várias diligências (dicts ou tuplas) numa única transação"""
+        ids = []
+        try:
+            with self.transaction('inserção em lote') as conn:
+                for chunk in _chunked(records, chunk_size):
+                    params = [_diligencia_params(r, INSERT_DEFAULTS) for r in chunk]
+                    self._executemany(conn, INSERT_DILIGENCIA, params)
+                    
+                    # Com AUTOINCREMENT e o escritor bloqueado, os ids do lote
+                    # são consecutivos e terminam em last_insert_rowid()
+                    last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+                    ids.extend(range(last_id - len(params) + 1, last_id + 1))
+        except sqlite3.Error as e:
+            self.logger.error(f"Erro na inserção em lote: {e}")
+            raise
         
-        params = (
-            data.get('data_solicitacao'),
-            data.get('solicitante'),
-            data.get('telefone_contato'),
-            data.get('tipo_demanda'),
-            data.get('numero_processo'),
-            data.get('data_demanda'),
-            data.get('status', 'Pendente'),
-            data.get('horario'),
-            data.get('local_realizacao'),
-            data.get('valor_receber', 0),
-            data.get('observacoes')
+        self.logger.info(f"Inseridas {len(ids)} diligências em lote")
+        return ids
+    
+    def get_all_diligencias(self):
+        """Retorna todas as diligências (e as guarda no cache de registros)"""
+        generation = self._cache_generation()
+        records = self.fetch_records(QUERIES['diligencias'], name='Diligencia')
+        if generation is not None:
+            self.cache.put_many(((record.id, record) for record in records), generation)
+        return records
+    
+    def iter_diligencias(self, chunk_size=BULK_CHUNK_SIZE):
+        """Percorre todas as diligências em blocos, na ordem da grade"""
+        records = self.iter_records(QUERIES['diligencias'], name='Diligencia',
+                                    chunk_size=chunk_size)
+        try:
+            while True:
+                chunk = list(islice(records, chunk_size))
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            records.close()
+    
+    def get_diligencias_chunk(self, limit=BULK_CHUNK_SIZE, after=None):
+        """Bloco de diligências após a chave after, na ordem de iter_diligencias"""
+        if after is None:
+            return self.fetch_records(QUERIES['diligencias_bloco'], (limit,), name='Diligencia')
+        return self.fetch_records(
+            QUERIES['diligencias_bloco_apos'], (*after, limit), name='Diligencia'
         )
+    
+    def get_diligencias_page(self, limit=PAGE_SIZE, after=None, before=None,
+                             filters=None, sort=DEFAULT_SORT, descending=True):
+        """Retorna uma página da listagem de diligências (paginação por chave)"""
+        if before is not None:
+            # Página anterior: a mesma consulta na ordem inversa
+            query, params = listing_query(filters, sort, not descending, before)
+            rows = self.fetch_records(query, (*params, limit), name='Diligencia')
+            rows.reverse()
+            return rows
         
-        return self.execute_query(query, params)
+        query, params = listing_query(filters, sort, descending, after)
+        return self.fetch_records(query, (*params, limit), name='Diligencia')
     
-    def get_all_diligencias(self):
-        """Retorna todas as diligências"""
-        query = '''
-            SELECT * FROM diligencias 
-            ORDER BY data_solicitacao DESC
+    def search(self, text, limit=PAGE_SIZE, offset=0, filters=None):
+        """Pesquisa diligências por processo, solicitante, local ou observações"""
+        match = _fts_query(text)
+        if not match:
+            return []
+        
+        if not self.fts_available:
+            return self._search_like(text, limit, offset, filters)
+        
+        query, params = search_query(filters)
+        return self.fetch_records(query, (match, *params, limit, offset), name='Diligencia')
+    
+    def _search_like(self, text, limit, offset, filters=None):
+        """Pesquisa sem FTS5: substring em qualquer coluna pesquisável"""
+        columns = ', '.join(LISTING_COLUMNS)
+        conditions, filter_params = _filter_conditions(filters)
+        where = ' AND '.join(
+            ['(' + ' OR '.join(f'{col} LIKE ?' for col in SEARCH_COLUMNS) + ')', *conditions]
+        )
+        query = f'''
+            SELECT {columns} FROM diligencias
+            WHERE {where}
+            ORDER BY data_solicitacao DESC, id DESC
+            LIMIT ? OFFSET ?
         '''
-        return self.execute_query(query, fetch=True)
+        pattern = f'%{text.strip()}%'
+        params = (pattern,) * len(SEARCH_COLUMNS) + (*filter_params, limit, offset)
+        return self.fetch_records(query, params, name='Diligencia')
+    
+    def count_diligencias(self):
+        """Retorna o total de diligências (lido do resumo de estatísticas)"""
+        query = QUERIES['total_diligencias']
+        return int(self.execute_query(query, fetch=True)[0]['dilig_total'])
+    
+    def get_diligencias_changes(self, watermark=None):
+        """Retorna as alterações de diligências desde um watermark"""
+        try:
+            with self.pool.reader() as conn:
+                # Leitura num único snapshot para linhas e exclusões
+                conn.execute('BEGIN')
+                
+                if watermark is None:
+                    changed, deleted = [], []
+                else:
+                    since, last_seq = watermark
+                    cursor = conn.cursor()
+                    cursor.row_factory = None
+                    # updated_at tem resolução de segundos: a comparação inclusiva
+                    # pode reenviar uma linha, mas nunca perdê-la
+                    cursor.execute(QUERIES['alteradas'], (since,))
+                    changed = list(records_from_cursor(cursor, 'Diligencia'))
+                    deleted = conn.execute(QUERIES['excluidas'], (last_seq,)).fetchall()
+                
+                since = conn.execute(QUERIES['ultima_alteracao']).fetchone()[0]
+                last_seq = conn.execute(QUERIES['ultima_exclusao']).fetchone()[0]
+        except sqlite3.Error as e:
+            self.logger.error(f"Erro ao obter alterações: {e}")
+            raise
+        
+        return {
+            'changed': changed,
+            'deleted': [row[0] for row in deleted],
+            'watermark': (since or '', last_seq or 0),
+        }
+    
+    def get_diligencia(self, diligencia_id):
+        """Retorna uma diligência completa ou None (através do cache)"""
+        generation = self._cache_generation()
+        if generation is not None:
+            record = self.cache.get(diligencia_id)
+            if record is not None:
+                return record
+        
+        result = self.fetch_records(QUERIES['diligencia'], (diligencia_id,), name='Diligencia')
+        if not result:
+            return None
+        
+        if generation is not None:
+            self.cache.put(diligencia_id, result[0], generation)
+        return result[0]
+    
+    def _cache_generation(self):
+        """Geração do cache, validada contra outros processos (None se não verificável)"""
+        version = self.pool.data_version()
+        if version is None:
+            return None
+        
+        if version != self._data_version:
+            self.cache.clear()
+            self._data_version = version
+        return self.cache.generation
     
     def update_diligencia(self, diligencia_id, data):
         """Atualiza uma diligência"""
-        query = '''
-            UPDATE diligencias 
-            SET data_solicitacao=?, solicitante=?, telefone_contato=?, 
-                tipo_demanda=?, numero_processo=?, data_demanda=?, 
-                status=?, horario=?, local_realizacao=?, valor_receber=?, 
-                observacoes=?
-            WHERE id=?
-        '''
-        
-        params = (
-            data.get('data_solicitacao'),
-            data.get('solicitante'),
-            data.get('telefone_contato'),
-            data.get('tipo_demanda'),
-            data.get('numero_processo'),
-            data.get('data_demanda'),
-            data.get('status'),
-            data.get('horario'),
-            data.get('local_realizacao'),
-            data.get('valor_receber', 0),
-            data.get('observacoes'),
-            diligencia_id
-        )
+        params = _diligencia_params(data, UPDATE_DEFAULTS) + (diligencia_id,)
+        try:
+            return self._execute_write(UPDATE_DILIGENCIA, params)
+        finally:
+            self.cache.invalidate((diligencia_id,))
+    
+    def update_diligencias_many(self, items, chunk_size=BULK_CHUNK_SIZE):
+        """Atualiza várias diligências (pares id, dados) numa única transação"""
+        updated = 0
+        try:
+            with self.transaction('alteração em lote') as conn:
+                for chunk in _chunked(items, chunk_size):
+                    params = [
+                        _diligencia_params(data, UPDATE_DEFAULTS) + (diligencia_id,)
+                        for diligencia_id, data in chunk
+                    ]
+                    updated += self._executemany(conn, UPDATE_DILIGENCIA, params).rowcount
+                    self.cache.invalidate(param[-1] for param in params)
+        except sqlite3.Error as e:
+            self.logger.error(f"Erro na atualização em lote: {e}")
+            raise
         
-        return self.execute_query(query, params)
+        self.logger.info(f"Atualizadas {updated} diligências em lote")
+        return updated
     
     def delete_diligencia(self, diligencia_id):
         """Remove uma diligência"""
         query = 'DELETE FROM diligencias WHERE id = ?'
-        return self.execute_query(query, (diligencia_id,))
\ No newline at end of file
+        try:
+            return self._execute_write(query, (diligencia_id,))
+        finally:
+            self.cache.invalidate((diligencia_id,))
+    
+    def insert_correspondente(self, data):
+        """Insere novo correspondente (dict ou tupla em CORRESPONDENTE_COLUMNS)"""
+        params = _row_params(data, CORRESPONDENTE_COLUMNS, CORRESPONDENTE_DEFAULTS)
+        return self._execute_write(INSERT_CORRESPONDENTE, params)
+    
+    def insert_correspondentes_many(self, records, chunk_size=BULK_CHUNK_SIZE):
+        """Insere vários correspondentes numa única transação"""
+        ids = []
+        try:
+            with self.transaction('inserção em lote') as conn:
+                for chunk in _chunked(records, chunk_size):
+                    params = [
+                        _row_params(r, CORRESPONDENTE_COLUMNS, CORRESPONDENTE_DEFAULTS)
+                        for r in chunk
+                    ]
+                    self._executemany(conn, INSERT_CORRESPONDENTE, params)
+                    last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+                    ids.extend(range(last_id - len(params) + 1, last_id + 1))
+        except sqlite3.Error as e:
+            self.logger.error(f"Erro na inserção em lote: {e}")
+            raise
+        
+        self.logger.info(f"Inseridos {len(ids)} correspondentes em lote")
+        return ids
+    
+    def update_correspondente(self, correspondente_id, data):
+        """Atualiza um correspondente"""
+        params = _row_params(data, CORRESPONDENTE_COLUMNS, CORRESPONDENTE_DEFAULTS)
+        return self._execute_write(UPDATE_CORRESPONDENTE, params + (correspondente_id,))
+    
+    def delete_correspondente(self, correspondente_id):
+        """Remove um correspondente"""
+        query = 'DELETE FROM correspondentes WHERE id = ?'
+        return self._execute_write(query, (correspondente_id,))
+    
+    def get_correspondente(self, correspondente_id):
+        """Retorna um correspondente completo ou None"""
+        result = self.fetch_records(
+            QUERIES['correspondente'], (correspondente_id,), name='Correspondente'
+        )
+        return result[0] if result else None
+    
+    def get_correspondentes_page(self, limit=PAGE_SIZE, after=None, diligencia_id=None):
+        """Retorna uma página de correspondentes, do mais novo (paginação por id)"""
+        query, params = correspondentes_query(diligencia_id, after)
+        return self.fetch_records(query, (*params, limit), name='Correspondente')
+    
+    def get_margins_page(self, limit=PAGE_SIZE, after=None):
+        """Retorna uma página da rentabilidade por diligência (ver margin_query)"""
+        query, params = margin_query(after)
+        return self.fetch_records(query, (*params, limit), name='Margem')
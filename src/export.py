@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Exportação de diligências para Excel (e CSV) em fluxo contínuo
+"""
+
+import csv
+import logging
+import threading
+from datetime import date
+
+from config import EXCEL_DATE_FORMAT, EXCEL_CURRENCY_FORMAT, BULK_CHUNK_SIZE
+from utils import atomic_write
+
+
+# Colunas com formatação de célula na planilha
+DATE_COLUMNS = ('data_solicitacao', 'data_demanda', 'data_pagamento')
+CURRENCY_COLUMNS = ('valor_receber',)
+
+
+def _to_date(value):
+    """Converte texto yyyy-mm-dd em date (mantém o valor se não for data)"""
+    if not value or not isinstance(value, str):
+        return value
+    try:
+        return date.fromisoformat(value[:10])
+    except ValueError:
+        return value
+
+
+def _to_number(value):
+    """Converte o valor em float (mantém o valor se não for numérico)"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def export_diligencias_excel(db, filename, progress=None, cancel_event=None,
+                             chunk_size=BULK_CHUNK_SIZE):
+    """Exporta todas as diligências para .xlsx em blocos (None se cancelada)"""
+    # openpyxl só é carregado quando a exportação é usada
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    
+    logger = logging.getLogger(__name__)
+    total = db.count_diligencias()
+    
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Diligências')
+    
+    def styled(value, number_format):
+        cell = WriteOnlyCell(sheet, value=value)
+        cell.number_format = number_format
+        return cell
+    
+    exported = 0
+    styled_columns = None
+    chunks = db.iter_diligencias(chunk_size)
+    try:
+        for rows in chunks:
+            if cancel_event is not None and cancel_event.is_set():
+                logger.info(f"Exportação cancelada após {exported} linhas")
+                return None
+            
+            if styled_columns is None:
+                columns = rows[0].keys()
+                sheet.append(columns)
+                # (posição, formato, conversão) resolvidos uma vez por exportação
+                styled_columns = [
+                    (index, EXCEL_DATE_FORMAT, _to_date) if col in DATE_COLUMNS
+                    else (index, EXCEL_CURRENCY_FORMAT, _to_number)
+                    for index, col in enumerate(columns)
+                    if col in DATE_COLUMNS or col in CURRENCY_COLUMNS
+                ]
+            
+            for row in rows:
+                values = list(row)
+                for index, number_format, convert in styled_columns:
+                    if values[index] is not None:
+                        values[index] = styled(convert(values[index]), number_format)
+                sheet.append(values)
+            
+            exported += len(rows)
+            if progress:
+                progress(exported, total)
+        
+        with atomic_write(filename) as partial_path:
+            workbook.save(partial_path)
+    finally:
+        chunks.close()
+    
+    logger.info(f"Exportadas {exported} diligências para {filename}")
+    return exported
+
+
+def export_diligencias_excel_async(db, filename, progress=None, callback=None):
+    """Executa export_diligencias_excel numa thread; retorna o Event que a cancela"""
+    cancel_event = threading.Event()
+    
+    def run():
+        try:
+            result = export_diligencias_excel(db, filename, progress, cancel_event)
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Erro ao exportar Excel: {e}")
+            if callback:
+                callback(None, e)
+            return
+        if callback:
+            callback(result, None)
+    
+    threading.Thread(target=run, name='export', daemon=True).start()
+    return cancel_event
+
+
+def export_diligencias_csv(db, filename, chunk_size=BULK_CHUNK_SIZE):
+    """Exporta todas as diligências para CSV (';' e UTF-8 com BOM)"""
+    exported = 0
+    chunks = db.iter_diligencias(chunk_size)
+    try:
+        with atomic_write(filename) as partial_path, \
+                open(partial_path, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.writer(f, delimiter=';')
+            for rows in chunks:
+                if not exported:
+                    writer.writerow(rows[0].keys())
+                writer.writerows(rows)
+                exported += len(rows)
+    finally:
+        chunks.close()
+    
+    logging.getLogger(__name__).info(f"Exportadas {exported} diligências para {filename}")
+    return exported
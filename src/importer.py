@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Importação de diligências de planilhas (.csv ou .xlsx) em fluxo contínuo
+"""
+
+import csv
+import logging
+from datetime import date, datetime
+from pathlib import Path
+
+from config import BULK_CHUNK_SIZE
+from database import DILIGENCIA_COLUMNS
+from utils import convert_date, parse_currency
+
+
+# Colunas obrigatórias em cada linha importada
+REQUIRED_COLUMNS = ('data_solicitacao', 'solicitante', 'tipo_demanda')
+
+# Colunas convertidas na importação
+DATE_COLUMNS = ('data_solicitacao', 'data_demanda')
+NUMBER_COLUMNS = ('valor_receber',)
+
+
+def _read_csv(path):
+    """Linhas de um CSV como listas de valores (delimitador detectado)"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        sample = f.read(64 * 1024)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=';,\t')
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(f, dialect)
+
+
+def _read_xlsx(path):
+    """Linhas da primeira planilha de um .xlsx (openpyxl em modo somente leitura)"""
+    # openpyxl só é carregado quando um .xlsx é importado
+    from openpyxl import load_workbook
+    
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _to_iso_date(value):
+    """Data do banco (yyyy-mm-dd) a partir de date, ISO ou dd/mm/aaaa"""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    iso = convert_date(str(value).strip())
+    try:
+        date.fromisoformat(iso)
+    except (TypeError, ValueError):
+        raise ValueError(f"data inválida: {value}") from None
+    return iso
+
+
+def _parse_rows(rows, source):
+    """Converte as linhas (a primeira é o cabeçalho) em dicts de DILIGENCIA_COLUMNS"""
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        return
+    
+    names = [str(name).strip() if name is not None else '' for name in header]
+    missing = [col for col in REQUIRED_COLUMNS if col not in names]
+    if missing:
+        raise ValueError(f"{source}: colunas obrigatórias ausentes: {', '.join(missing)}")
+    
+    positions = [(names.index(col) if col in names else None) for col in DILIGENCIA_COLUMNS]
+    
+    for line, row in enumerate(rows, start=2):
+        values = []
+        for col, position in zip(DILIGENCIA_COLUMNS, positions):
+            value = row[position] if position is not None and position < len(row) else None
+            if value == '':
+                value = None
+            values.append(value)
+        
+        if not any(value is not None for value in values):
+            continue  # linha em branco
+        
+        record = dict(zip(DILIGENCIA_COLUMNS, values))
+        try:
+            for col in REQUIRED_COLUMNS:
+                if record[col] is None:
+                    raise ValueError(f"{col} é obrigatório")
+            for col in DATE_COLUMNS:
+                if record[col] is not None:
+                    record[col] = _to_iso_date(record[col])
+            for col in NUMBER_COLUMNS:
+                if record[col] is not None:
+                    record[col] = parse_currency(record[col])
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{source}, linha {line}: {e}") from None
+        
+        # Sem as colunas vazias, valem os padrões de insert (status, valor)
+        yield {col: value for col, value in record.items() if value is not None}
+
+
+def import_diligencias(db, filename, chunk_size=BULK_CHUNK_SIZE):
+    """Importa diligências de um .csv ou .xlsx numa única transação"""
+    path = Path(filename)
+    suffix = path.suffix.lower()
+    if suffix == '.csv':
+        rows = _read_csv(path)
+    elif suffix == '.xlsx':
+        rows = _read_xlsx(path)
+    else:
+        raise ValueError(f"Formato não suportado: {path.suffix or path.name} (use .csv ou .xlsx)")
+    
+    try:
+        ids = db.insert_diligencias_many(_parse_rows(rows, path.name), chunk_size)
+    finally:
+        rows.close()
+    
+    logging.getLogger(__name__).info(f"Importadas {len(ids)} diligências de {path}")
+    return len(ids)
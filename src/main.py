@@ -12,11 +12,16 @@ import logging
 sys.path.insert(0, os.path.dirname(__file__))
 
 from utils import setup_logging, setup_locale, check_dependencies
-from sistema_diligencias import SistemaDiligencias
 
 
-def main():
-    """Função principal"""
+def main(argv=None):
+    """Função principal: sem argumentos abre a interface, com um comando roda a CLI"""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        # Comandos em lote (cron, servidor sem display): nada de Tk
+        from cli import main as cli_main
+        return cli_main(argv)
+
     setup_logging()
     logger = logging.getLogger(__name__)
     logger.info("Iniciando Sistema de Diligências v2.0")
@@ -29,6 +34,8 @@ def main():
         return 1
 
     try:
+        # Importada após a verificação de dependências (carrega o tkinter)
+        from sistema_diligencias import SistemaDiligencias
         app = SistemaDiligencias()
         app.run()
         logger.info("Aplicação finalizada com sucesso")
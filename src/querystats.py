@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Estatísticas de tempo das consultas SQL, agrupadas por impressão digital
+"""
+
+import re
+import threading
+from functools import lru_cache
+
+# Limites superiores (ms) das faixas do histograma: 10 µs dobrando até ~84 s
+BUCKET_BOUNDS_MS = tuple(0.01 * 2 ** i for i in range(24))
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACES = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(query):
+    """SQL normalizado que identifica o grupo da consulta"""
+    normalized = _SPACES.sub(' ', _LITERALS.sub('?', query)).strip()
+    return _IN_LIST.sub('(...)', normalized)
+
+
+def _bucket(elapsed_ms):
+    """Índice da faixa do histograma de um tempo em ms"""
+    for index, bound in enumerate(BUCKET_BOUNDS_MS):
+        if elapsed_ms <= bound:
+            return index
+    return len(BUCKET_BOUNDS_MS)
+
+
+class _Entry:
+    """Acumuladores de um grupo de consultas"""
+    
+    __slots__ = ('count', 'total', 'max', 'rows', 'slow', 'buckets', 'plan')
+    
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.slow = 0
+        self.buckets = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.plan = None
+    
+    def percentile(self, fraction):
+        """Percentil estimado pelo limite superior da faixa (ms)"""
+        wanted = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= wanted and count:
+                bound = BUCKET_BOUNDS_MS[index] if index < len(BUCKET_BOUNDS_MS) else self.max
+                # Nenhuma amostra passa do máximo observado
+                return min(bound, self.max)
+        return self.max
+
+
+class QueryStats:
+    """Tempos das consultas por impressão digital (seguro entre threads)"""
+    
+    def __init__(self, slow_ms):
+        self.slow_ms = slow_ms
+        self._entries = {}
+        self._lock = threading.Lock()
+    
+    def record(self, query, seconds, rows=0):
+        """Registra uma execução; retorna (impressão digital, lenta, primeira lenta)"""
+        key = fingerprint(query)
+        elapsed_ms = seconds * 1000
+        slow = elapsed_ms >= self.slow_ms
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+            entry.count += 1
+            entry.total += elapsed_ms
+            entry.max = max(entry.max, elapsed_ms)
+            entry.rows += rows if rows > 0 else 0
+            entry.buckets[_bucket(elapsed_ms)] += 1
+            if slow:
+                entry.slow += 1
+            first_slow = slow and entry.slow == 1
+        
+        return key, slow, first_slow
+    
+    def set_plan(self, key, plan):
+        """Guarda o plano de execução capturado na primeira execução lenta"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.plan = plan
+    
+    def snapshot(self):
+        """Um dict por grupo (tempos em ms), do maior tempo total ao menor"""
+        with self._lock:
+            rows = [
+                {
+                    'consulta': key,
+                    'execucoes': entry.count,
+                    'total_ms': round(entry.total, 3),
+                    'media_ms': round(entry.total / entry.count, 3),
+                    'p50_ms': round(entry.percentile(0.50), 3),
+                    'p95_ms': round(entry.percentile(0.95), 3),
+                    'p99_ms': round(entry.percentile(0.99), 3),
+                    'max_ms': round(entry.max, 3),
+                    'linhas': entry.rows,
+                    'linhas_media': round(entry.rows / entry.count, 1),
+                    'lentas': entry.slow,
+                    'plano': list(entry.plan) if entry.plan else None,
+                }
+                for key, entry in self._entries.items()
+            ]
+        rows.sort(key=lambda row: row['total_ms'], reverse=True)
+        return rows
+    
+    def reset(self):
+        """Descarta os dados acumulados"""
+        with self._lock:
+            self._entries.clear()
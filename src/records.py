@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Registros leves para linhas do banco de dados
+"""
+
+import threading
+from collections import OrderedDict
+from operator import itemgetter
+
+
+class Record(tuple):
+    """Linha de consulta baseada em tupla, com acesso por atributo e por nome"""
+    
+    __slots__ = ()
+    _fields = ()
+    _index = {}
+    
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                key = self._index[key]
+            except KeyError:
+                raise KeyError(key) from None
+        return tuple.__getitem__(self, key)
+    
+    def __repr__(self):
+        values = ', '.join(f'{name}={value!r}' for name, value in zip(self._fields, self))
+        return f'{type(self).__name__}({values})'
+    
+    def get(self, key, default=None):
+        """Valor da coluna key, ou default se a coluna não existir"""
+        index = self._index.get(key)
+        return default if index is None else tuple.__getitem__(self, index)
+    
+    def keys(self):
+        """Nomes das colunas, na ordem da consulta"""
+        return self._fields
+    
+    def _asdict(self):
+        """Converte em dict (coluna -> valor)"""
+        return dict(zip(self._fields, self))
+
+
+_record_types = {}
+
+
+def record_type(name, fields):
+    """Retorna a subclasse de Record para as colunas fields (com cache)"""
+    fields = tuple(fields)
+    key = (name, fields)
+    cls = _record_types.get(key)
+    if cls is None:
+        namespace = {
+            '__slots__': (),
+            '_fields': fields,
+            '_index': {field: index for index, field in enumerate(fields)},
+        }
+        for index, field in enumerate(fields):
+            # Colunas que colidem com métodos continuam acessíveis por nome
+            if not hasattr(Record, field):
+                namespace[field] = property(itemgetter(index))
+        cls = _record_types[key] = type(name, (Record,), namespace)
+    return cls
+
+
+def records_from_cursor(cursor, name='Registro'):
+    """Converte as linhas de um cursor (row_factory padrão) em records, sob demanda"""
+    cls = record_type(name, (column[0] for column in cursor.description))
+    return map(cls, cursor)
+
+
+class RecordCache:
+    """Cache LRU limitado de records por id, seguro entre threads"""
+    
+    def __init__(self, capacity):
+        self.capacity = max(0, capacity)
+        self.generation = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._items)
+    
+    def get(self, key):
+        """Record em cache para key, ou None"""
+        with self._lock:
+            record = self._items.get(key)
+            if record is not None:
+                self._items.move_to_end(key)
+            return record
+    
+    def put(self, key, record, generation):
+        """Guarda record se o cache não foi invalidado desde generation"""
+        self.put_many(((key, record),), generation)
+    
+    def put_many(self, items, generation):
+        """Guarda vários pares (key, record) lidos na mesma geração"""
+        with self._lock:
+            if generation != self.generation or not self.capacity:
+                return
+            for key, record in items:
+                self._items[key] = record
+                self._items.move_to_end(key)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+    
+    def invalidate(self, keys):
+        """Remove as chaves informadas"""
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                self._items.pop(key, None)
+    
+    def clear(self):
+        """Remove todos os records"""
+        with self._lock:
+            self.generation += 1
+            self._items.clear()
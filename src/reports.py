@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Relatórios por período (REPORT_TYPES) com rollups dos períodos encerrados
+"""
+
+import logging
+from datetime import date, timedelta
+
+from database import QUERIES, REPORT_PERIODS
+
+
+# Agregados de diligências por (período, status, tipo_demanda), numa única
+# passada: a junção soma os correspondentes de cada diligência (pelo índice
+# de diligencia_id, na ordem do índice da data) e o GROUP BY externo agrega.
+AGGREGATE_QUERY = '''
+    SELECT inicio, status, tipo_demanda,
+           COUNT(*) AS quantidade,
+           TOTAL(valor_receber) AS faturamento,
+           TOTAL(CASE WHEN pago = 1 THEN valor_receber END) AS recebido,
+           TOTAL(custos) AS custos,
+           TOTAL(custos_pagos) AS custos_pagos
+    FROM (
+        SELECT {period} AS inicio, d.status, d.tipo_demanda, d.valor_receber, d.pago,
+               TOTAL(c.valor_cobrado) AS custos,
+               TOTAL(CASE WHEN c.pago = 1 THEN c.valor_cobrado END) AS custos_pagos
+        FROM diligencias d
+        LEFT JOIN correspondentes c ON c.diligencia_id = d.id
+        WHERE d.data_solicitacao >= ? AND d.data_solicitacao < ?
+        GROUP BY d.data_solicitacao, d.id
+    )
+    GROUP BY inicio, status, tipo_demanda
+'''
+
+ROLLUP_COLUMNS = (
+    'inicio', 'status', 'tipo_demanda',
+    'quantidade', 'faturamento', 'recebido', 'custos', 'custos_pagos'
+)
+
+INSERT_ROLLUP = f'''
+    INSERT OR REPLACE INTO relatorio_periodos
+    (tipo_periodo, {', '.join(ROLLUP_COLUMNS)})
+    VALUES (?, {', '.join('?' * len(ROLLUP_COLUMNS))})
+'''
+
+INSERT_CLOSED = 'INSERT OR REPLACE INTO relatorio_fechados (tipo_periodo, inicio) VALUES (?, ?)'
+
+
+def _check_kind(kind):
+    """Valida o tipo de relatório (chave de REPORT_TYPES)"""
+    if kind not in REPORT_PERIODS:
+        raise ValueError(f"Tipo de relatório desconhecido: {kind}")
+
+
+def period_start(kind, day):
+    """Primeiro dia do período de tipo kind que contém day"""
+    _check_kind(kind)
+    if kind == 'SEMANAL':
+        return day - timedelta(days=day.weekday())
+    if kind == 'MENSAL':
+        return day.replace(day=1)
+    if kind == 'ANUAL':
+        return day.replace(month=1, day=1)
+    return day
+
+
+def next_period(kind, start):
+    """Início do período seguinte ao que começa em start"""
+    _check_kind(kind)
+    if kind == 'SEMANAL':
+        return start + timedelta(days=7)
+    if kind == 'MENSAL':
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    if kind == 'ANUAL':
+        return start.replace(year=start.year + 1)
+    return start + timedelta(days=1)
+
+
+def period_starts(kind, first, last):
+    """Inícios dos períodos que cobrem as datas de first a last (inclusive)"""
+    start = period_start(kind, first)
+    while start <= last:
+        yield start
+        start = next_period(kind, start)
+
+
+def period_label(kind, start):
+    """Rótulo de exibição de um período"""
+    if kind == 'SEMANAL':
+        end = next_period(kind, start) - timedelta(days=1)
+        return f"{start:%d/%m/%Y} a {end:%d/%m/%Y}"
+    if kind == 'MENSAL':
+        return f"{start:%m/%Y}"
+    if kind == 'ANUAL':
+        return f"{start:%Y}"
+    return f"{start:%d/%m/%Y}"
+
+
+def _aggregate(db, conn, kind, start, end):
+    """Linhas agregadas de [start, end) calculadas a partir das tabelas"""
+    query = AGGREGATE_QUERY.format(period=REPORT_PERIODS[kind].format(d='d.data_solicitacao'))
+    return [
+        tuple(row) for row in db.fetch_timed(conn, query, (start.isoformat(), end.isoformat()))
+    ]
+
+
+def _closed_rows(db, kind, starts):
+    """Linhas dos períodos encerrados: do rollup, calculando os que faltam"""
+    params = (kind, starts[0].isoformat(), next_period(kind, starts[-1]).isoformat())
+    
+    with db.pool.reader() as conn:
+        # Marcas e linhas lidas no mesmo snapshot
+        conn.execute('BEGIN')
+        try:
+            stored = {row[0] for row in conn.execute(QUERIES['relatorio_fechados'], params)}
+            rows = [tuple(row) for row in conn.execute(QUERIES['relatorio_periodos'], params)]
+        finally:
+            conn.execute('COMMIT')
+    
+    missing = [start for start in starts if start.isoformat() not in stored]
+    if missing:
+        rows += _store_rollups(db, kind, missing)
+    return rows
+
+
+def _store_rollups(db, kind, missing):
+    """Calcula e grava o rollup dos períodos encerrados em missing"""
+    wanted = {start.isoformat() for start in missing}
+    
+    # No escritor, nenhuma alteração entra entre o cálculo e a gravação
+    with db.transaction('rollup de relatórios') as conn:
+        rows = [
+            row for row in _aggregate(db, conn, kind, missing[0], next_period(kind, missing[-1]))
+            if row[0] in wanted
+        ]
+        db._executemany(conn, INSERT_ROLLUP, [(kind, *row) for row in rows])
+        db._executemany(conn, INSERT_CLOSED, [(kind, start) for start in sorted(wanted)])
+    
+    logging.getLogger(__name__).info(
+        f"Rollup de {len(missing)} períodos ({kind}) gravado"
+    )
+    return rows
+
+
+def _empty_period(kind, start):
+    """Período sem diligências"""
+    return {
+        'tipo': kind,
+        'inicio': start,
+        'fim': next_period(kind, start) - timedelta(days=1),
+        'total': 0,
+        'por_status': {},
+        'por_tipo': {},
+        'faturamento': 0.0,
+        'recebido': 0.0,
+        'a_receber': 0.0,
+        'custos': 0.0,
+        'custos_pagos': 0.0,
+        'margem': 0.0,
+    }
+
+
+def period_report(db, kind, first, last, today=None):
+    """Relatório por período (kind em REPORT_TYPES) de first a last"""
+    starts = list(period_starts(kind, first, last))
+    if not starts:
+        return []
+    
+    current = period_start(kind, today or date.today())
+    closed = [start for start in starts if start < current]
+    rows = _closed_rows(db, kind, closed) if closed else []
+    
+    open_start = max(starts[0], current)
+    end = next_period(kind, starts[-1])
+    if open_start < end:
+        with db.pool.reader() as conn:
+            rows += _aggregate(db, conn, kind, open_start, end)
+    
+    periods = {start.isoformat(): _empty_period(kind, start) for start in starts}
+    for inicio, status, tipo, quantidade, faturamento, recebido, custos, custos_pagos in rows:
+        period = periods.get(inicio)
+        if period is None:
+            continue
+        period['total'] += quantidade
+        period['por_status'][status] = period['por_status'].get(status, 0) + quantidade
+        period['por_tipo'][tipo] = period['por_tipo'].get(tipo, 0) + quantidade
+        period['faturamento'] += faturamento
+        period['recebido'] += recebido
+        period['custos'] += custos
+        period['custos_pagos'] += custos_pagos
+    
+    for period in periods.values():
+        period['a_receber'] = period['faturamento'] - period['recebido']
+        period['margem'] = period['faturamento'] - period['custos']
+    
+    return list(periods.values())
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Servidor HTTP/JSON local (asyncio, só biblioteca padrão) sobre o DatabaseManager
+"""
+
+import asyncio
+import hmac
+import ipaddress
+import json
+import logging
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qsl
+
+from config import (
+    SERVER_HOST, SERVER_PORT, SERVER_TOKEN, SERVER_MAX_BODY, SERVER_IDLE_TIMEOUT,
+    SERVER_MAX_HEADERS, SERVER_MAX_LIMIT, DB_READER_POOL_SIZE, PAGE_SIZE, BULK_CHUNK_SIZE
+)
+from database import DEFAULT_SORT, SORT_KEYS
+from records import Record
+from utils import backup_database
+
+
+class HttpError(Exception):
+    """Erro com status HTTP, devolvido ao cliente como {"erro": mensagem}"""
+    
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _to_json(value):
+    """Converte records (tuplas) em dicts para a serialização"""
+    if isinstance(value, Record):
+        return value._asdict()
+    if isinstance(value, list):
+        return [_to_json(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _to_json(item) for key, item in value.items()}
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+
+def _int(params, name, default=None):
+    value = params.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise HttpError(HTTPStatus.BAD_REQUEST, f"{name} deve ser inteiro") from None
+
+
+def _limit(params, default):
+    """LIMIT da consulta entre 1 e SERVER_MAX_LIMIT (LIMIT -1 no SQLite é sem limite)"""
+    return max(1, min(_int(params, 'limit', default), SERVER_MAX_LIMIT))
+
+
+def _json_param(params, name):
+    value = params.get(name)
+    if value is None:
+        return None
+    try:
+        return json.loads(value)
+    except ValueError:
+        raise HttpError(HTTPStatus.BAD_REQUEST, f"{name} deve estar em JSON") from None
+
+
+def _is_scalar(value):
+    return value is None or isinstance(value, (str, int, float))
+
+
+def _key_param(params, name, size):
+    """Chave de paginação (lista JSON de size valores simples) como tupla"""
+    value = _json_param(params, name)
+    if value is None:
+        return None
+    if not isinstance(value, list) or len(value) != size or not all(map(_is_scalar, value)):
+        raise HttpError(HTTPStatus.BAD_REQUEST, f"{name} deve ser uma lista de {size} valores")
+    return tuple(value)
+
+
+def _filters_param(params):
+    """Filtros da listagem: objeto JSON de valores simples"""
+    value = _json_param(params, 'filters')
+    if value is not None and not (isinstance(value, dict) and all(map(_is_scalar, value.values()))):
+        raise HttpError(HTTPStatus.BAD_REQUEST, "filters deve ser um objeto de valores simples")
+    return value
+
+
+def _date_param(params, name):
+    value = params.get(name)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise HttpError(HTTPStatus.BAD_REQUEST, f"{name} deve ser uma data aaaa-mm-dd") from None
+
+
+def _is_loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _found(value):
+    if value is None:
+        raise HttpError(HTTPStatus.NOT_FOUND, "Registro não encontrado")
+    return value
+
+
+class ApiServer:
+    """Servidor da API sobre um DatabaseManager já aberto"""
+    
+    def __init__(self, db, host=SERVER_HOST, port=SERVER_PORT, token=SERVER_TOKEN):
+        # Na rede, sem token, qualquer estação poderia alterar e excluir dados
+        if not token and not _is_loopback(host):
+            raise ValueError(f"Servidor em {host or 'todas as interfaces'} exige token "
+                             "(defina SISTEMA_DILIGENCIAS_TOKEN)")
+        self.db = db
+        self.host = host
+        self.port = port
+        self.token = token
+        self.logger = logging.getLogger(__name__)
+        
+        self._readers = ThreadPoolExecutor(DB_READER_POOL_SIZE, thread_name_prefix='api-leitura')
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix='api-escrita')
+        self._server = None
+        self._loop = None
+        self._stopped = None
+        
+        # (método, caminho, operação(params, corpo, *grupos da rota), escrita)
+        routes = (
+            ('GET', r'/saude', self._saude, False),
+            ('GET', r'/diligencias', self._listar_diligencias, False),
+            ('GET', r'/diligencias/pesquisa', self._pesquisar, False),
+            ('GET', r'/diligencias/total', self._total, False),
+            ('GET', r'/diligencias/alteracoes', self._alteracoes, False),
+            ('GET', r'/diligencias/blocos', self._blocos, False),
+            ('POST', r'/diligencias', self._inserir_diligencia, True),
+            ('GET', r'/diligencias/(\d+)', self._diligencia, False),
+            ('PUT', r'/diligencias/(\d+)', self._atualizar_diligencia, True),
+            ('DELETE', r'/diligencias/(\d+)', self._excluir_diligencia, True),
+            ('GET', r'/correspondentes', self._listar_correspondentes, False),
+            ('POST', r'/correspondentes', self._inserir_correspondente, True),
+            ('GET', r'/correspondentes/(\d+)', self._correspondente, False),
+            ('PUT', r'/correspondentes/(\d+)', self._atualizar_correspondente, True),
+            ('DELETE', r'/correspondentes/(\d+)', self._excluir_correspondente, True),
+            ('GET', r'/margens', self._margens, False),
+            ('GET', r'/estatisticas', self._estatisticas, False),
+            ('POST', r'/estatisticas/recalcular', self._recalcular, True),
+            ('GET', r'/relatorios/(\w+)', self._relatorio, False),
+            # Backup online: lê um snapshot, sem ocupar o escritor
+            ('POST', r'/backup', self._backup, False),
+            ('GET', r'/diagnostico', self._diagnostico, False),
+            ('POST', r'/diagnostico/zerar', self._zerar_diagnostico, False),
+        )
+        self._routes = [
+            (method, re.compile(pattern + '$'), handler, write)
+            for method, pattern, handler, write in routes
+        ]
+    
+    # Operações (rodam nas threads dos executores)
+    
+    @staticmethod
+    def _body(body):
+        if not isinstance(body, dict):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Corpo JSON (objeto) obrigatório")
+        return body
+    
+    def _saude(self, params, body):
+        return {'status': 'ok', 'fts': self.db.fts_available}
+    
+    def _listar_diligencias(self, params, body):
+        sort = params.get('sort', DEFAULT_SORT)
+        if sort not in SORT_KEYS:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f"Ordenação desconhecida: {sort}")
+        size = len(SORT_KEYS[sort])
+        return self.db.get_diligencias_page(
+            _limit(params, PAGE_SIZE),
+            after=_key_param(params, 'after', size),
+            before=_key_param(params, 'before', size),
+            filters=_filters_param(params),
+            sort=sort,
+            descending=params.get('descending', 'true') != 'false',
+        )
+    
+    def _pesquisar(self, params, body):
+        return self.db.search(
+            params.get('text', ''), _limit(params, PAGE_SIZE),
+            max(0, _int(params, 'offset', 0)), filters=_filters_param(params)
+        )
+    
+    def _total(self, params, body):
+        return self.db.count_diligencias()
+    
+    def _diligencia(self, params, body, diligencia_id):
+        return _found(self.db.get_diligencia(int(diligencia_id)))
+    
+    def _atualizar_diligencia(self, params, body, diligencia_id):
+        self.db.update_diligencia(int(diligencia_id), self._body(body))
+    
+    def _excluir_diligencia(self, params, body, diligencia_id):
+        self.db.delete_diligencia(int(diligencia_id))
+    
+    def _alteracoes(self, params, body):
+        return self.db.get_diligencias_changes(_key_param(params, 'watermark', 2))
+    
+    def _blocos(self, params, body):
+        return self.db.get_diligencias_chunk(
+            _limit(params, BULK_CHUNK_SIZE), _key_param(params, 'after', 2)
+        )
+    
+    def _inserir_diligencia(self, params, body):
+        return {'id': self.db.insert_diligencia(self._body(body))}
+    
+    def _listar_correspondentes(self, params, body):
+        return self.db.get_correspondentes_page(
+            _limit(params, PAGE_SIZE), _int(params, 'after'),
+            _int(params, 'diligencia_id')
+        )
+    
+    def _inserir_correspondente(self, params, body):
+        return {'id': self.db.insert_correspondente(self._body(body))}
+    
+    def _correspondente(self, params, body, correspondente_id):
+        return _found(self.db.get_correspondente(int(correspondente_id)))
+    
+    def _atualizar_correspondente(self, params, body, correspondente_id):
+        self.db.update_correspondente(int(correspondente_id), self._body(body))
+    
+    def _excluir_correspondente(self, params, body, correspondente_id):
+        self.db.delete_correspondente(int(correspondente_id))
+    
+    def _margens(self, params, body):
+        return self.db.get_margins_page(
+            _limit(params, PAGE_SIZE), _key_param(params, 'after', 2)
+        )
+    
+    def _estatisticas(self, params, body):
+        return self.db.get_statistics()
+    
+    def _recalcular(self, params, body):
+        return self.db.rebuild_statistics()
+    
+    def _backup(self, params, body):
+        return backup_database(str(self.db.db_path), backups_dir=self.db.backups_dir)
+    
+    def _diagnostico(self, params, body):
+        return self.db.diagnostics()
+    
+    def _zerar_diagnostico(self, params, body):
+        self.db.reset_diagnostics()
+    
+    def _relatorio(self, params, body, kind):
+        first, last = _date_param(params, 'first'), _date_param(params, 'last')
+        if first is None or last is None:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "first e last são obrigatórios")
+        return self.db.period_report(kind.upper(), first, last, today=_date_param(params, 'today'))
+    
+    def _call(self, handler, params, body, groups):
+        """Executa a operação e serializa o resultado (na thread do executor)"""
+        try:
+            result = handler(params, body, *groups)
+        except HttpError:
+            raise
+        except ValueError as e:
+            raise HttpError(HTTPStatus.BAD_REQUEST, str(e)) from None
+        except sqlite3.IntegrityError as e:
+            raise HttpError(HTTPStatus.CONFLICT, str(e)) from None
+        return json.dumps(_to_json(result), ensure_ascii=False, default=_json_default).encode('utf-8')
+    
+    # HTTP
+    
+    async def _dispatch(self, method, target, headers, body):
+        """Resolve a rota e executa a operação no executor adequado"""
+        authorization = headers.get('authorization', '').encode('latin-1')
+        if self.token and not hmac.compare_digest(authorization, f'Bearer {self.token}'.encode()):
+            raise HttpError(HTTPStatus.UNAUTHORIZED, "Token ausente ou inválido")
+        
+        url = urlsplit(target)
+        params = dict(parse_qsl(url.query))
+        
+        allowed = False
+        for route_method, pattern, handler, write in self._routes:
+            match = pattern.match(url.path)
+            if not match:
+                continue
+            if route_method != method:
+                allowed = True
+                continue
+            
+            try:
+                data = json.loads(body) if body else None
+            except ValueError:
+                raise HttpError(HTTPStatus.BAD_REQUEST, "Corpo não é JSON válido") from None
+            
+            # Uma única thread de escrita: as gravações não disputam o escritor
+            # com as leituras, que seguem em paralelo nos leitores do pool
+            executor = self._writer if write else self._readers
+            return await self._loop.run_in_executor(
+                executor, self._call, handler, params, data, match.groups()
+            )
+        
+        if allowed:
+            raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED, f"Método {method} não permitido")
+        raise HttpError(HTTPStatus.NOT_FOUND, f"Rota inexistente: {url.path}")
+    
+    async def _read_request(self, reader):
+        """Lê uma requisição: (método, alvo, versão, headers, corpo) ou None no fim"""
+        line = await asyncio.wait_for(reader.readline(), SERVER_IDLE_TIMEOUT)
+        if not line.strip():
+            return None
+        try:
+            method, target, version = line.decode('latin-1').split()
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Linha de requisição inválida") from None
+        
+        headers, count = {}, 0
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:  # linha acima do limite do StreamReader
+                raise HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE,
+                                "Cabeçalho grande demais") from None
+            if line in (b'\r\n', b'\n', b''):
+                break
+            count += 1
+            if count > SERVER_MAX_HEADERS:
+                raise HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Cabeçalhos demais")
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Content-Length inválido")
+        if length > SERVER_MAX_BODY:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Corpo grande demais")
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target, version, headers, body
+    
+    @staticmethod
+    def _response(status, payload, keep_alive):
+        head = (
+            f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+            'Content-Type: application/json; charset=utf-8\r\n'
+            f'Content-Length: {len(payload)}\r\n'
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        # Cabeçalho e corpo num único write: sem espera do Nagle/ACK atrasado
+        return head.encode('latin-1') + payload
+    
+    async def _handle_connection(self, reader, writer):
+        """Atende as requisições de uma conexão até ela ser fechada"""
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HttpError as e:
+                    payload = json.dumps({'erro': str(e)}).encode('utf-8')
+                    writer.write(self._response(e.status, payload, False))
+                    await writer.drain()
+                    return
+                if request is None:
+                    return
+                
+                method, target, version, headers, body = request
+                keep_alive = (version == 'HTTP/1.1'
+                              and headers.get('connection', '').lower() != 'close')
+                try:
+                    status, payload = HTTPStatus.OK, await self._dispatch(method, target, headers, body)
+                except HttpError as e:
+                    status = e.status
+                    payload = json.dumps({'erro': str(e)}, ensure_ascii=False).encode('utf-8')
+                except Exception as e:
+                    self.logger.exception(f"Erro em {method} {target}: {e}")
+                    status = HTTPStatus.INTERNAL_SERVER_ERROR
+                    payload = json.dumps({'erro': str(e)}, ensure_ascii=False).encode('utf-8')
+                
+                writer.write(self._response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass  # conexão ociosa, interrompida ou requisição malformada
+        finally:
+            writer.close()
+    
+    async def serve(self, ready=None):
+        """Atende até stop(); ready (threading.Event) é sinalizado ao começar"""
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.logger.info(f"Servidor da API em http://{self.host}:{self.port}")
+        if ready is not None:
+            ready.set()
+        
+        try:
+            async with self._server:
+                await self._stopped.wait()
+        finally:
+            self._readers.shutdown(wait=True)
+            self._writer.shutdown(wait=True)
+            self.logger.info("Servidor da API encerrado")
+    
+    def run(self):
+        """Atende na thread atual até Ctrl+C"""
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+    
+    def stop(self):
+        """Encerra o servidor (pode ser chamado de qualquer thread)"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+
+
+def run_server(db, host=SERVER_HOST, port=SERVER_PORT, token=SERVER_TOKEN):
+    """Executa o servidor até Ctrl+C"""
+    ApiServer(db, host, port, token).run()
@@ -6,19 +6,63 @@ Interface gráfica principal do Sistema de Diligências
 
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
+import io
 import logging
+from bisect import bisect_left
 from datetime import datetime, date
-import pandas as pd
 from pathlib import Path
 
 from config import (
     WINDOW_TITLE, WINDOW_SIZE, WINDOW_MIN_SIZE, COLORS, 
-    DEMANDA_TYPES, STATUS_OPTIONS, EXPORTS_DIR
+    DEMANDA_TYPES, STATUS_OPTIONS, REPORT_TYPES, EXPORTS_DIR, PAGE_SIZE, GRID_MAX_ROWS,
+    SEARCH_DEBOUNCE_MS, SERVER_URL
 )
-from database import DatabaseManager
+from charts import CHARTS, load_charts
+from database import DatabaseManager, DEFAULT_SORT, listing_key
+from export import export_diligencias_excel_async
+from reports import period_label
+from worker import DatabaseWorker
 from utils import (
-    format_date, convert_date, format_currency, 
-    validate_phone, validate_email
+    format_date, convert_date, format_currency, format_dates, format_currencies,
+    validate_phone, validate_email, parse_currency
+)
+
+
+# Colunas da grade: (identificador, título, coluna ordenada no banco)
+GRID_COLUMNS = (
+    ('ID', 'ID', 'id'),
+    ('Data', 'Data Solicitação', 'data_solicitacao'),
+    ('Solicitante', 'Solicitante', 'solicitante'),
+    ('Tipo', 'Tipo Demanda', 'tipo_demanda'),
+    ('Status', 'Status', 'status'),
+    ('Valor', 'Valor', 'valor_receber'),
+)
+
+# Opções do filtro de pagamento -> valor da coluna pago
+PAGO_OPTIONS = {'': None, 'Sim': 1, 'Não': 0}
+
+# Colunas da lista de correspondentes: (coluna do banco, título, largura)
+CORRESPONDENTE_GRID_COLUMNS = (
+    ('id', 'ID', 50),
+    ('nome_contratado', 'Correspondente', 180),
+    ('telefone', 'Telefone', 110),
+    ('valor_cobrado', 'Valor Cobrado', 100),
+    ('prazo_pagamento', 'Prazo Pagamento', 110),
+    ('pago', 'Pago', 60),
+    ('diligencia_id', 'Diligência', 80),
+    ('solicitante', 'Solicitante', 180),
+)
+
+# Colunas da rentabilidade por diligência: (coluna do banco, título, largura)
+MARGIN_GRID_COLUMNS = (
+    ('id', 'ID', 50),
+    ('data_solicitacao', 'Data Solicitação', 100),
+    ('solicitante', 'Solicitante', 180),
+    ('status', 'Status', 90),
+    ('valor_receber', 'Valor', 100),
+    ('correspondentes', 'Correspondentes', 110),
+    ('custos', 'Custos', 100),
+    ('margem', 'Margem', 100),
 )
 
 
@@ -27,7 +71,13 @@ class SistemaDiligencias:
     
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        self.db = DatabaseManager()
+        if SERVER_URL:
+            # Estação cliente: o banco fica no servidor local (server.py)
+            from client import RemoteDatabase
+            self.db = RemoteDatabase(SERVER_URL)
+        else:
+            self.db = DatabaseManager()
+        self.worker = DatabaseWorker(self.db)
         
         # Configurar janela principal
         self.root = tk.Tk()
@@ -38,9 +88,40 @@ class SistemaDiligencias:
         # Variáveis de controle
         self.selected_diligencia = None
         
+        # Estado da rolagem virtual: chave de paginação (listing_key) por item
+        self._grid_keys = {}
+        self._grid_has_before = False
+        self._grid_has_after = False
+        self._grid_fetching = False
+        self._grid_watermark = None
+        self._grid_generation = 0
+        
+        # Pesquisa textual (vazia = listagem completa)
+        self._search_text = ''
+        self._search_job = None
+        
+        # Ordenação e filtros da grade, aplicados no SQL
+        self._grid_sort = DEFAULT_SORT
+        self._grid_descending = True
+        self._grid_filters = {}
+        
+        # Backup em segundo plano
+        self._backup_state = None
+        
+        # Aba Correspondentes: última chave lida de cada lista paginada
+        self._corresp_after = None
+        self._margin_after = None
+        
+        # Gráficos da aba Relatórios (PhotoImage precisa de referência viva)
+        self._chart_images = {}
+        self._charts_loading = False
+        
         # Construir interface
         self._setup_styles()
         self._build_ui()
+        
+        # Resultados do banco chegam pelo loop do Tk, nunca bloqueando-o
+        self.worker.attach(self.root, on_activity=self._on_db_activity)
         self._load_data()
         
         self.logger.info("Interface gráfica inicializada")
@@ -74,6 +155,7 @@ class SistemaDiligencias:
         self._create_diligencias_tab()
         self._create_correspondentes_tab()
         self._create_relatorios_tab()
+        self.notebook.bind('<<NotebookTabChanged>>', self._on_tab_changed)
         
         # Barra de status
         self._create_status_bar()
@@ -97,6 +179,9 @@ class SistemaDiligencias:
         menubar.add_cascade(label="Ferramentas", menu=tools_menu)
         tools_menu.add_command(label="Backup", command=self._criar_backup)
         tools_menu.add_command(label="Estatísticas", command=self._mostrar_estatisticas)
+        tools_menu.add_command(label="Recalcular Estatísticas", command=self._recalcular_estatisticas)
+        tools_menu.add_separator()
+        tools_menu.add_command(label="Diagnóstico", command=self._mostrar_diagnostico)
         
         # Menu Ajuda
         help_menu = tk.Menu(menubar, tearoff=0)
@@ -115,23 +200,32 @@ class SistemaDiligencias:
         ttk.Button(btn_frame, text="Nova", command=self._nova_diligencia).pack(side='left', padx=2)
         ttk.Button(btn_frame, text="Editar", command=self._editar_diligencia).pack(side='left', padx=2)
         ttk.Button(btn_frame, text="Excluir", command=self._excluir_diligencia).pack(side='left', padx=2)
-        ttk.Button(btn_frame, text="Atualizar", command=self._load_data).pack(side='left', padx=2)
+        ttk.Button(btn_frame, text="Atualizar", command=self._refresh_data).pack(side='left', padx=2)
+        
+        # Frame de pesquisa
+        search_frame = ttk.Frame(frame)
+        search_frame.pack(fill='x', padx=5)
+        
+        ttk.Label(search_frame, text="Pesquisar:").pack(side='left', padx=2)
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add('write', self._on_search_changed)
+        ttk.Entry(search_frame, textvariable=self.search_var).pack(side='left', expand=True, fill='x', padx=2)
+        
+        self._create_filter_bar(frame)
         
         # Frame da tabela
         table_frame = ttk.Frame(frame)
         table_frame.pack(expand=True, fill='both', padx=5, pady=5)
         
         # Treeview para listar diligências
-        columns = ('ID', 'Data', 'Solicitante', 'Tipo', 'Status', 'Valor')
+        columns = tuple(column for column, _, _ in GRID_COLUMNS)
         self.diligencias_tree = ttk.Treeview(table_frame, columns=columns, show='headings', height=15)
         
-        # Configurar colunas
-        self.diligencias_tree.heading('ID', text='ID')
-        self.diligencias_tree.heading('Data', text='Data Solicitação')
-        self.diligencias_tree.heading('Solicitante', text='Solicitante')
-        self.diligencias_tree.heading('Tipo', text='Tipo Demanda')
-        self.diligencias_tree.heading('Status', text='Status')
-        self.diligencias_tree.heading('Valor', text='Valor')
+        # Configurar colunas (clicar no título ordena por ela)
+        for column, title, sort in GRID_COLUMNS:
+            self.diligencias_tree.heading(column, text=title,
+                                          command=lambda sort=sort: self._sort_by(sort))
+        self._update_headings()
         
         # Largura das colunas
         self.diligencias_tree.column('ID', width=50)
@@ -142,29 +236,181 @@ class SistemaDiligencias:
         self.diligencias_tree.column('Valor', width=100)
         
         # Scrollbars
-        v_scrollbar = ttk.Scrollbar(table_frame, orient='vertical', command=self.diligencias_tree.yview)
+        self.v_scrollbar = ttk.Scrollbar(table_frame, orient='vertical', command=self.diligencias_tree.yview)
         h_scrollbar = ttk.Scrollbar(table_frame, orient='horizontal', command=self.diligencias_tree.xview)
-        self.diligencias_tree.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
+        self.diligencias_tree.configure(yscrollcommand=self._on_tree_scroll, xscrollcommand=h_scrollbar.set)
         
         # Pack da tabela e scrollbars
         self.diligencias_tree.pack(side='left', expand=True, fill='both')
-        v_scrollbar.pack(side='right', fill='y')
+        self.v_scrollbar.pack(side='right', fill='y')
         h_scrollbar.pack(side='bottom', fill='x')
         
         # Bind para seleção
         self.diligencias_tree.bind('<<TreeviewSelect>>', self._on_diligencia_select)
     
+    def _create_filter_bar(self, parent):
+        """Cria a barra de filtros da grade"""
+        filter_frame = ttk.Frame(parent)
+        filter_frame.pack(fill='x', padx=5, pady=(5, 0))
+        
+        self.filter_vars = {
+            name: tk.StringVar() for name in (
+                'status', 'tipo_demanda', 'data_inicio', 'data_fim',
+                'pago', 'valor_min', 'valor_max'
+            )
+        }
+        
+        fields = (
+            ('Status:', 'status', STATUS_OPTIONS, 11),
+            ('Tipo:', 'tipo_demanda', DEMANDA_TYPES, 14),
+            ('De:', 'data_inicio', None, 10),
+            ('Até:', 'data_fim', None, 10),
+            ('Pago:', 'pago', [option for option in PAGO_OPTIONS if option], 4),
+            ('Valor de:', 'valor_min', None, 8),
+            ('até:', 'valor_max', None, 8),
+        )
+        for label, name, values, width in fields:
+            ttk.Label(filter_frame, text=label).pack(side='left', padx=(4, 2))
+            if values is None:
+                widget = ttk.Entry(filter_frame, textvariable=self.filter_vars[name], width=width)
+            else:
+                widget = ttk.Combobox(filter_frame, textvariable=self.filter_vars[name],
+                                      values=[''] + list(values), width=width, state='readonly')
+            widget.pack(side='left')
+            widget.bind('<Return>', lambda event: self._apply_filters())
+        
+        ttk.Button(filter_frame, text="Filtrar", command=self._apply_filters).pack(side='left', padx=(8, 2))
+        ttk.Button(filter_frame, text="Limpar", command=self._clear_filters).pack(side='left', padx=2)
+    
+    def _read_filters(self):
+        """Converte os campos da barra de filtros (ValueError se inválidos)"""
+        values = {name: var.get().strip() for name, var in self.filter_vars.items()}
+        filters = {
+            'status': values['status'],
+            'tipo_demanda': values['tipo_demanda'],
+            'pago': PAGO_OPTIONS.get(values['pago']),
+        }
+        
+        for name in ('data_inicio', 'data_fim'):
+            if values[name]:
+                iso_date = convert_date(values[name])
+                try:
+                    datetime.strptime(iso_date or '', '%Y-%m-%d')
+                except ValueError:
+                    raise ValueError(f"Data inválida: {values[name]}") from None
+                filters[name] = iso_date
+        
+        for name in ('valor_min', 'valor_max'):
+            if values[name]:
+                try:
+                    filters[name] = parse_currency(values[name])
+                except ValueError:
+                    raise ValueError(f"Valor inválido: {values[name]}") from None
+        
+        # Filtros vazios não restringem a listagem
+        return {name: value for name, value in filters.items() if value not in (None, '')}
+    
+    def _apply_filters(self):
+        """Recarrega a grade com os filtros da barra"""
+        try:
+            filters = self._read_filters()
+        except ValueError as e:
+            messagebox.showwarning("Filtros", str(e))
+            return
+        
+        if filters != self._grid_filters:
+            self._grid_filters = filters
+            self._load_data()
+    
+    def _clear_filters(self):
+        """Limpa a barra de filtros e recarrega a grade"""
+        for var in self.filter_vars.values():
+            var.set('')
+        self._apply_filters()
+    
+    def _sort_by(self, sort):
+        """Ordena a grade pela coluna (clicar de novo inverte o sentido)"""
+        if sort == self._grid_sort:
+            self._grid_descending = not self._grid_descending
+        else:
+            self._grid_sort = sort
+            self._grid_descending = sort == DEFAULT_SORT
+        
+        self._update_headings()
+        self._load_data()
+    
+    def _update_headings(self):
+        """Indica nos títulos a coluna e o sentido da ordenação"""
+        arrow = ' ▼' if self._grid_descending else ' ▲'
+        for column, title, sort in GRID_COLUMNS:
+            text = title + arrow if sort == self._grid_sort else title
+            self.diligencias_tree.heading(column, text=text)
+    
+    def _page_options(self):
+        """Filtros e ordenação atuais, como argumentos de get_diligencias_page"""
+        return {
+            'filters': self._grid_filters,
+            'sort': self._grid_sort,
+            'descending': self._grid_descending,
+        }
+    
     def _create_correspondentes_tab(self):
         """Cria aba de correspondentes"""
         frame = ttk.Frame(self.notebook)
         self.notebook.add(frame, text="Correspondentes")
         
-        label = ttk.Label(frame, text="Gestão de Correspondentes", style='Title.TLabel')
-        label.pack(pady=20)
+        self.correspondentes_tab = frame
+        
+        # Botões
+        btn_frame = ttk.Frame(frame)
+        btn_frame.pack(fill='x', padx=5, pady=5)
+        
+        ttk.Button(btn_frame, text="Novo", command=self._novo_correspondente).pack(side='left', padx=2)
+        ttk.Button(btn_frame, text="Editar", command=self._editar_correspondente).pack(side='left', padx=2)
+        ttk.Button(btn_frame, text="Excluir", command=self._excluir_correspondente).pack(side='left', padx=2)
+        ttk.Button(btn_frame, text="Atualizar", command=self._load_correspondentes).pack(side='left', padx=2)
+        
+        ttk.Label(btn_frame, text="Diligência nº:").pack(side='left', padx=(12, 2))
+        self.corresp_diligencia_var = tk.StringVar()
+        entry = ttk.Entry(btn_frame, textvariable=self.corresp_diligencia_var, width=8)
+        entry.pack(side='left', padx=2)
+        entry.bind('<Return>', lambda event: self._load_correspondentes())
+        
+        # Correspondentes, do mais novo, em páginas
+        list_frame = ttk.Frame(frame)
+        list_frame.pack(expand=True, fill='both', padx=5)
+        
+        columns = tuple(title for _, title, _ in CORRESPONDENTE_GRID_COLUMNS)
+        self.corresp_tree = ttk.Treeview(list_frame, columns=columns, show='headings', height=8)
+        for _, title, width in CORRESPONDENTE_GRID_COLUMNS:
+            self.corresp_tree.heading(title, text=title)
+            self.corresp_tree.column(title, width=width)
+        scrollbar = ttk.Scrollbar(list_frame, orient='vertical', command=self.corresp_tree.yview)
+        self.corresp_tree.configure(yscrollcommand=scrollbar.set)
+        self.corresp_tree.pack(side='left', expand=True, fill='both')
+        scrollbar.pack(side='right', fill='y')
+        
+        self.corresp_more_button = ttk.Button(frame, text="Carregar mais", state='disabled',
+                                              command=self._load_more_correspondentes)
+        self.corresp_more_button.pack(anchor='e', padx=5, pady=2)
+        
+        # Rentabilidade por diligência (uma consulta agregada por página)
+        margin_frame = ttk.LabelFrame(frame, text="Rentabilidade por Diligência", padding=5)
+        margin_frame.pack(expand=True, fill='both', padx=5, pady=5)
+        
+        columns = tuple(title for _, title, _ in MARGIN_GRID_COLUMNS)
+        self.margin_tree = ttk.Treeview(margin_frame, columns=columns, show='headings', height=8)
+        for _, title, width in MARGIN_GRID_COLUMNS:
+            self.margin_tree.heading(title, text=title)
+            self.margin_tree.column(title, width=width)
+        scrollbar = ttk.Scrollbar(margin_frame, orient='vertical', command=self.margin_tree.yview)
+        self.margin_tree.configure(yscrollcommand=scrollbar.set)
+        self.margin_tree.pack(side='left', expand=True, fill='both')
+        scrollbar.pack(side='right', fill='y')
         
-        # Placeholder para funcionalidade futura
-        info_label = ttk.Label(frame, text="Funcionalidade em desenvolvimento")
-        info_label.pack(pady=10)
+        self.margin_more_button = ttk.Button(frame, text="Carregar mais", state='disabled',
+                                             command=self._load_more_margins)
+        self.margin_more_button.pack(anchor='e', padx=5, pady=(0, 5))
     
     def _create_relatorios_tab(self):
         """Cria aba de relatórios"""
@@ -180,38 +426,370 @@ class SistemaDiligencias:
         
         ttk.Button(btn_frame, text="Estatísticas Gerais", command=self._mostrar_estatisticas).pack(pady=5)
         ttk.Button(btn_frame, text="Exportar Excel", command=self._exportar_excel).pack(pady=5)
+        
+        # Gráficos, carregados ao abrir a aba
+        charts_frame = ttk.LabelFrame(frame, text="Gráficos", padding=5)
+        charts_frame.pack(fill='x', padx=5, pady=5)
+        self.relatorios_tab = frame
+        
+        self.chart_labels = {}
+        for name, title in CHARTS.items():
+            self.chart_labels[name] = ttk.Label(charts_frame, text=title, anchor='center')
+            self.chart_labels[name].pack(side='left', expand=True, fill='both', padx=2)
+        ttk.Button(charts_frame, text="Atualizar", command=self._load_charts).pack(side='right', anchor='n')
+        
+        # Relatório por período
+        period_frame = ttk.LabelFrame(frame, text="Relatório por Período", padding=5)
+        period_frame.pack(expand=True, fill='both', padx=5, pady=5)
+        
+        options_frame = ttk.Frame(period_frame)
+        options_frame.pack(fill='x')
+        
+        today = date.today()
+        self.report_type_var = tk.StringVar(value=REPORT_TYPES['MENSAL'])
+        self.report_start_var = tk.StringVar(value=today.replace(month=1, day=1).strftime('%d/%m/%Y'))
+        self.report_end_var = tk.StringVar(value=today.strftime('%d/%m/%Y'))
+        
+        ttk.Label(options_frame, text="Período:").pack(side='left', padx=2)
+        ttk.Combobox(options_frame, textvariable=self.report_type_var, state='readonly',
+                     values=list(REPORT_TYPES.values()), width=10).pack(side='left', padx=2)
+        ttk.Label(options_frame, text="De:").pack(side='left', padx=(8, 2))
+        ttk.Entry(options_frame, textvariable=self.report_start_var, width=11).pack(side='left')
+        ttk.Label(options_frame, text="Até:").pack(side='left', padx=(8, 2))
+        ttk.Entry(options_frame, textvariable=self.report_end_var, width=11).pack(side='left')
+        ttk.Button(options_frame, text="Gerar", command=self._gerar_relatorio).pack(side='left', padx=8)
+        
+        columns = ('Período', 'Diligências', *STATUS_OPTIONS,
+                   'Faturamento', 'Recebido', 'Custos', 'Margem')
+        self.report_tree = ttk.Treeview(period_frame, columns=columns, show='headings', height=10)
+        for column in columns:
+            self.report_tree.heading(column, text=column)
+            self.report_tree.column(column, width=150 if column == 'Período' else 95)
+        self.report_tree.pack(expand=True, fill='both', pady=(5, 0))
     
     def _create_status_bar(self):
         """Cria barra de status"""
-        self.status_bar = ttk.Label(self.root, text="Pronto", relief='sunken', anchor='w')
-        self.status_bar.pack(side='bottom', fill='x')
+        status_frame = ttk.Frame(self.root)
+        status_frame.pack(side='bottom', fill='x')
+        
+        self.status_bar = ttk.Label(status_frame, text="Pronto", relief='sunken', anchor='w')
+        self.status_bar.pack(side='left', expand=True, fill='x')
+        
+        # Indicador de operações de banco em andamento
+        self.activity_label = ttk.Label(status_frame, text="", relief='sunken', anchor='e', width=28)
+        self.activity_label.pack(side='right')
+    
+    def _on_db_activity(self, in_flight):
+        """Atualiza o indicador de operações em andamento"""
+        text = f"Processando ({in_flight})..." if in_flight else ""
+        self.activity_label.config(text=text)
+    
+    def _db_error(self, message):
+        """Cria um callback de erro que registra e mostra a mensagem"""
+        def handler(error):
+            self.logger.error(f"{message}: {error}")
+            messagebox.showerror("Erro", f"{message}: {error}")
+        return handler
+    
+    def _on_search_changed(self, *args):
+        """Agenda a pesquisa após uma pausa na digitação"""
+        if self._search_job is not None:
+            self.root.after_cancel(self._search_job)
+        self._search_job = self.root.after(SEARCH_DEBOUNCE_MS, self._run_search)
+    
+    def _run_search(self):
+        """Recarrega a grade com o texto pesquisado"""
+        self._search_job = None
+        text = self.search_var.get().strip()
+        if text != self._search_text:
+            self._search_text = text
+            self._load_data()
     
     def _load_data(self):
-        """Carrega dados das diligências"""
+        """Carrega a primeira página de diligências (ou da pesquisa)"""
+        # Respostas de cargas anteriores ainda em andamento são descartadas
+        self._grid_generation += 1
+        generation = self._grid_generation
+        self._grid_fetching = True
+        
+        def on_error(error):
+            if generation == self._grid_generation:
+                self._grid_fetching = False
+            self._db_error("Erro ao carregar dados")(error)
+        
+        if self._search_text:
+            self.worker.submit(
+                self.db.search, self._search_text, PAGE_SIZE, filters=self._grid_filters,
+                on_success=lambda rows: self._show_search(generation, rows),
+                on_error=on_error
+            )
+        else:
+            self.worker.submit(
+                self._read_first_page, self._page_options(),
+                on_success=lambda result: self._show_first_page(generation, *result),
+                on_error=on_error
+            )
+    
+    def _read_first_page(self, options):
+        """Lê watermark, primeira página e total (na thread do worker)"""
+        # Watermark lido antes da página: alterações concorrentes serão
+        # reaplicadas na próxima atualização, nunca perdidas
+        watermark = self.db.get_diligencias_changes()['watermark']
+        diligencias = self.db.get_diligencias_page(PAGE_SIZE, **options)
+        return watermark, diligencias, self.db.count_diligencias()
+    
+    def _show_first_page(self, generation, watermark, diligencias, total):
+        """Exibe a primeira página da listagem"""
+        if generation != self._grid_generation:
+            return
+        
+        self._reset_grid(diligencias)
+        self._grid_watermark = watermark
+        if self._grid_filters:
+            suffix = "+" if self._grid_has_after else ""
+            self.status_bar.config(text=f"Filtradas {len(diligencias)}{suffix} de {total} diligências")
+        else:
+            self.status_bar.config(text=f"Carregadas {total} diligências")
+    
+    def _show_search(self, generation, diligencias):
+        """Exibe a primeira página de resultados da pesquisa"""
+        if generation != self._grid_generation:
+            return
+        
+        self._reset_grid(diligencias)
+        suffix = "+" if self._grid_has_after else ""
+        self.status_bar.config(text=f"Encontradas {len(diligencias)}{suffix} diligências")
+    
+    def _reset_grid(self, diligencias):
+        """Substitui o conteúdo da grade por uma primeira página"""
+        self.diligencias_tree.delete(*self.diligencias_tree.get_children())
+        self._grid_keys.clear()
+        
+        # Carregar apenas a primeira página; as demais vêm com a rolagem
+        self._insert_rows(diligencias, 'end')
+        self._grid_has_before = False
+        self._grid_has_after = len(diligencias) == PAGE_SIZE
+        self._grid_fetching = False
+    
+    def _insert_rows(self, diligencias, position):
+        """Insere linhas na grade a partir de position ('end' ou índice)"""
+        rows = zip(diligencias, self._rows_values(diligencias))
+        for offset, (dilig, values) in enumerate(rows):
+            index = position if position == 'end' else position + offset
+            iid = self.diligencias_tree.insert(
+                '', index, iid=str(dilig['id']), values=values
+            )
+            self._grid_keys[iid] = listing_key(dilig, self._grid_sort)
+    
+    def _rows_values(self, diligencias):
+        """Valores exibidos na grade, formatados coluna a coluna"""
+        dates = format_dates([dilig['data_solicitacao'] for dilig in diligencias])
+        amounts = format_currencies([dilig['valor_receber'] for dilig in diligencias])
+        return [
+            (dilig['id'], data, dilig['solicitante'], dilig['tipo_demanda'],
+             dilig['status'], valor)
+            for dilig, data, valor in zip(diligencias, dates, amounts)
+        ]
+    
+    def _row_values(self, dilig):
+        """Valores exibidos na grade para uma diligência"""
+        return self._rows_values((dilig,))[0]
+    
+    def _refresh_data(self):
+        """Aplica na grade apenas as alterações desde o último watermark"""
+        # Resultados de pesquisa seguem a relevância e uma linha alterada pode
+        # deixar de atender aos filtros: nesses casos, refazer a consulta
+        if self._grid_watermark is None or self._search_text or self._grid_filters:
+            self._load_data()
+            return
+        
+        generation = self._grid_generation
+        self.worker.submit(
+            self.db.get_diligencias_changes, self._grid_watermark,
+            on_success=lambda changes: self._apply_changes(generation, changes),
+            on_error=self._db_error("Erro ao atualizar dados")
+        )
+    
+    def _apply_changes(self, generation, changes):
+        """Corrige na grade as linhas alteradas e excluídas"""
+        if generation != self._grid_generation:
+            return
+        
+        self._grid_watermark = changes['watermark']
+        
+        tree = self.diligencias_tree
+        self._remove_rows([
+            str(dilig_id) for dilig_id in changes['deleted'] if tree.exists(str(dilig_id))
+        ])
+        
+        for dilig in changes['changed']:
+            self._patch_row(dilig)
+        
+        total = len(changes['changed']) + len(changes['deleted'])
+        self.status_bar.config(text=f"Aplicadas {total} alterações")
+    
+    def _patch_row(self, dilig):
+        """Atualiza, move ou insere uma linha alterada na janela carregada"""
+        tree = self.diligencias_tree
+        iid = str(dilig['id'])
+        key = listing_key(dilig, self._grid_sort)
+        
+        if tree.exists(iid):
+            if self._grid_keys[iid] == key:
+                tree.item(iid, values=self._row_values(dilig))
+                return
+            # A chave mudou: a linha muda de posição (ou sai da janela)
+            self._remove_rows([iid])
+        
+        index = self._grid_position(key)
+        if index is not None:
+            self._insert_rows([dilig], index)
+    
+    def _grid_position(self, key):
+        """Índice de key na janela carregada, ou None se ficar fora dela"""
+        # A busca binária usa as chaves em ordem crescente
+        children = self.diligencias_tree.get_children()
+        if self._grid_descending:
+            children = reversed(children)
+        keys = [self._grid_keys[iid] for iid in children]
+        
+        # Há linhas fora da janela abaixo da menor / acima da maior chave?
+        if self._grid_descending:
+            below, above = self._grid_has_after, self._grid_has_before
+        else:
+            below, above = self._grid_has_before, self._grid_has_after
+        
+        if keys:
+            if above and key > keys[-1]:
+                return None
+            if below and key < keys[0]:
+                return None
+        elif self._grid_has_after:
+            return None
+        
+        index = bisect_left(keys, key)
+        return len(keys) - index if self._grid_descending else index
+    
+    def _on_tree_scroll(self, first, last):
+        """Atualiza a scrollbar e busca mais páginas perto das bordas"""
+        self.v_scrollbar.set(first, last)
+        
+        if self._grid_fetching:
+            return
+        
+        # A busca é adiada para fora do callback de rolagem do Tk
+        if float(last) >= 0.95 and self._grid_has_after:
+            self._grid_fetching = True
+            self.root.after_idle(self._fetch_next_page)
+        elif float(first) <= 0.05 and self._grid_has_before:
+            self._grid_fetching = True
+            self.root.after_idle(self._fetch_previous_page)
+    
+    def _fetch_next_page(self):
+        """Solicita a página seguinte à última linha carregada"""
+        children = self.diligencias_tree.get_children()
+        if not children:
+            self._grid_fetching = False
+            return
+        
+        generation = self._grid_generation
+        on_error = lambda error: self._page_error(generation, error)
+        
+        if self._search_text:
+            # Resultados por relevância: paginação por offset, sem corte
+            self.worker.submit(
+                self.db.search, self._search_text, PAGE_SIZE, offset=len(children),
+                filters=self._grid_filters,
+                on_success=lambda rows: self._append_search_page(generation, rows),
+                on_error=on_error
+            )
+            return
+        
+        self.worker.submit(
+            self.db.get_diligencias_page, PAGE_SIZE, after=self._grid_keys[children[-1]],
+            **self._page_options(),
+            on_success=lambda rows: self._append_page(generation, rows),
+            on_error=on_error
+        )
+    
+    def _append_search_page(self, generation, rows):
+        """Acrescenta resultados de pesquisa até GRID_MAX_ROWS"""
+        if generation != self._grid_generation:
+            return
+        
+        loaded = len(self.diligencias_tree.get_children())
+        self._insert_rows(rows, 'end')
+        self._grid_has_after = len(rows) == PAGE_SIZE and loaded + len(rows) < GRID_MAX_ROWS
+        self._grid_fetching = False
+    
+    def _append_page(self, generation, rows):
+        """Acrescenta a próxima página e descarta linhas do topo"""
+        if generation != self._grid_generation:
+            return
+        
+        tree = self.diligencias_tree
         try:
-            # Limpar tabela
-            for item in self.diligencias_tree.get_children():
-                self.diligencias_tree.delete(item)
-            
-            # Carregar diligências
-            diligencias = self.db.get_all_diligencias()
+            children = tree.get_children()
+            top = round(float(tree.yview()[0]) * len(children))
+            self._grid_has_after = len(rows) == PAGE_SIZE
+            self._insert_rows(rows, 'end')
             
-            for dilig in diligencias:
-                values = (
-                    dilig['id'],
-                    format_date(dilig['data_solicitacao']),
-                    dilig['solicitante'],
-                    dilig['tipo_demanda'],
-                    dilig['status'],
-                    format_currency(dilig['valor_receber'])
-                )
-                self.diligencias_tree.insert('', 'end', values=values)
+            excess = len(children) + len(rows) - GRID_MAX_ROWS
+            if excess > 0:
+                self._remove_rows(children[:excess])
+                self._grid_has_before = True
+                # Manter as mesmas linhas visíveis após o corte
+                tree.yview_moveto(max(0, top - excess) / len(tree.get_children()))
+        finally:
+            self._grid_fetching = False
+    
+    def _fetch_previous_page(self):
+        """Solicita a página anterior à primeira linha carregada"""
+        children = self.diligencias_tree.get_children()
+        if not children:
+            self._grid_fetching = False
+            return
+        
+        generation = self._grid_generation
+        self.worker.submit(
+            self.db.get_diligencias_page, PAGE_SIZE, before=self._grid_keys[children[0]],
+            **self._page_options(),
+            on_success=lambda rows: self._prepend_page(generation, rows),
+            on_error=lambda error: self._page_error(generation, error)
+        )
+    
+    def _prepend_page(self, generation, rows):
+        """Recoloca a página anterior no topo e descarta linhas do fim"""
+        if generation != self._grid_generation:
+            return
+        
+        tree = self.diligencias_tree
+        try:
+            children = tree.get_children()
+            top = round(float(tree.yview()[0]) * len(children))
+            self._grid_has_before = len(rows) == PAGE_SIZE
+            self._insert_rows(rows, 0)
             
-            self.status_bar.config(text=f"Carregadas {len(diligencias)} diligências")
+            excess = len(children) + len(rows) - GRID_MAX_ROWS
+            if excess > 0:
+                self._remove_rows(children[-excess:])
+                self._grid_has_after = True
             
-        except Exception as e:
-            self.logger.error(f"Erro ao carregar dados: {e}")
-            messagebox.showerror("Erro", f"Erro ao carregar dados: {e}")
+            tree.yview_moveto((top + len(rows)) / len(tree.get_children()))
+        finally:
+            self._grid_fetching = False
+    
+    def _page_error(self, generation, error):
+        """Registra falha ao buscar uma página e libera nova tentativa"""
+        self.logger.error(f"Erro ao carregar página: {error}")
+        if generation == self._grid_generation:
+            self._grid_fetching = False
+    
+    def _remove_rows(self, iids):
+        """Remove itens da grade e suas chaves de paginação"""
+        self.diligencias_tree.delete(*iids)
+        for iid in iids:
+            self._grid_keys.pop(iid, None)
     
     def _on_diligencia_select(self, event):
         """Callback para seleção de diligência"""
@@ -219,10 +797,12 @@ class SistemaDiligencias:
         if selection:
             item = self.diligencias_tree.item(selection[0])
             self.selected_diligencia = item['values'][0]  # ID da diligência
+            # Pré-carrega o registro completo no cache para o diálogo de edição
+            self.worker.submit(self.db.get_diligencia, self.selected_diligencia)
     
     def _nova_diligencia(self):
         """Abre janela para nova diligência"""
-        DiligenciaDialog(self.root, self.db, callback=self._load_data)
+        DiligenciaDialog(self.root, self.worker, callback=self._refresh_data)
     
     def _editar_diligencia(self):
         """Edita diligência selecionada"""
@@ -230,7 +810,7 @@ class SistemaDiligencias:
             messagebox.showwarning("Aviso", "Selecione uma diligência para editar")
             return
         
-        DiligenciaDialog(self.root, self.db, diligencia_id=self.selected_diligencia, callback=self._load_data)
+        DiligenciaDialog(self.root, self.worker, diligencia_id=self.selected_diligencia, callback=self._refresh_data)
     
     def _excluir_diligencia(self):
         """Exclui diligência selecionada"""
@@ -239,71 +819,287 @@ class SistemaDiligencias:
             return
         
         if messagebox.askyesno("Confirmar", "Deseja realmente excluir esta diligência?"):
-            try:
-                self.db.delete_diligencia(self.selected_diligencia)
-                self._load_data()
+            def on_deleted(result):
+                self.selected_diligencia = None
+                self._refresh_data()
                 messagebox.showinfo("Sucesso", "Diligência excluída com sucesso")
-            except Exception as e:
-                self.logger.error(f"Erro ao excluir diligência: {e}")
-                messagebox.showerror("Erro", f"Erro ao excluir diligência: {e}")
+            
+            self.worker.submit(
+                self.db.delete_diligencia, self.selected_diligencia,
+                on_success=on_deleted,
+                on_error=self._db_error("Erro ao excluir diligência")
+            )
     
-    def _exportar_excel(self):
-        """Exporta dados para Excel"""
-        try:
-            diligencias = self.db.get_all_diligencias()
+    def _selected_correspondente(self):
+        """Id do correspondente selecionado, ou None"""
+        selection = self.corresp_tree.selection()
+        return int(selection[0]) if selection else None
+    
+    def _load_correspondentes(self):
+        """Recarrega a primeira página das duas listas da aba Correspondentes"""
+        value = self.corresp_diligencia_var.get().strip()
+        if value and not value.isdigit():
+            messagebox.showwarning("Aviso", "Informe o número (ID) da diligência")
+            return
+        diligencia_id = int(value) if value else None
+        
+        self.corresp_tree.delete(*self.corresp_tree.get_children())
+        self.margin_tree.delete(*self.margin_tree.get_children())
+        self._corresp_after = self._margin_after = None
+        
+        self.worker.submit(
+            self.db.get_correspondentes_page, PAGE_SIZE, None, diligencia_id,
+            on_success=self._show_correspondentes,
+            on_error=self._db_error("Erro ao carregar correspondentes")
+        )
+        self._load_more_margins()
+    
+    def _load_more_correspondentes(self):
+        """Busca a próxima página de correspondentes"""
+        value = self.corresp_diligencia_var.get().strip()
+        self.corresp_more_button.config(state='disabled')
+        self.worker.submit(
+            self.db.get_correspondentes_page, PAGE_SIZE, self._corresp_after,
+            int(value) if value.isdigit() else None,
+            on_success=self._show_correspondentes,
+            on_error=self._db_error("Erro ao carregar correspondentes")
+        )
+    
+    def _show_correspondentes(self, rows):
+        """Acrescenta uma página à lista de correspondentes"""
+        values = {
+            'valor_cobrado': format_currencies([row.valor_cobrado for row in rows]),
+            'prazo_pagamento': format_dates([row.prazo_pagamento for row in rows]),
+            'pago': ['Sim' if row.pago else 'Não' for row in rows],
+        }
+        for index, row in enumerate(rows):
+            self.corresp_tree.insert('', 'end', iid=str(row.id), values=tuple(
+                values[column][index] if column in values else row[column] or ''
+                for column, _, _ in CORRESPONDENTE_GRID_COLUMNS
+            ))
+        
+        if rows:
+            self._corresp_after = rows[-1].id
+        self.corresp_more_button.config(state='normal' if len(rows) == PAGE_SIZE else 'disabled')
+    
+    def _load_more_margins(self):
+        """Busca a próxima página da rentabilidade por diligência"""
+        self.margin_more_button.config(state='disabled')
+        self.worker.submit(
+            self.db.get_margins_page, PAGE_SIZE, self._margin_after,
+            on_success=self._show_margins,
+            on_error=self._db_error("Erro ao carregar rentabilidade")
+        )
+    
+    def _show_margins(self, rows):
+        """Acrescenta uma página à rentabilidade por diligência"""
+        values = {
+            column: format_currencies([row[column] for row in rows])
+            for column in ('valor_receber', 'custos', 'margem')
+        }
+        values['data_solicitacao'] = format_dates([row.data_solicitacao for row in rows])
+        for index, row in enumerate(rows):
+            self.margin_tree.insert('', 'end', values=tuple(
+                values[column][index] if column in values else row[column]
+                for column, _, _ in MARGIN_GRID_COLUMNS
+            ))
+        
+        if rows:
+            self._margin_after = listing_key(rows[-1])
+        self.margin_more_button.config(state='normal' if len(rows) == PAGE_SIZE else 'disabled')
+    
+    def _novo_correspondente(self):
+        """Abre janela para novo correspondente"""
+        CorrespondenteDialog(self.root, self.worker, callback=self._load_correspondentes)
+    
+    def _editar_correspondente(self):
+        """Edita o correspondente selecionado"""
+        correspondente_id = self._selected_correspondente()
+        if not correspondente_id:
+            messagebox.showwarning("Aviso", "Selecione um correspondente para editar")
+            return
+        
+        CorrespondenteDialog(self.root, self.worker, correspondente_id=correspondente_id,
+                             callback=self._load_correspondentes)
+    
+    def _excluir_correspondente(self):
+        """Exclui o correspondente selecionado"""
+        correspondente_id = self._selected_correspondente()
+        if not correspondente_id:
+            messagebox.showwarning("Aviso", "Selecione um correspondente para excluir")
+            return
+        
+        if messagebox.askyesno("Confirmar", "Deseja realmente excluir este correspondente?"):
+            def on_deleted(result):
+                self._load_correspondentes()
+                messagebox.showinfo("Sucesso", "Correspondente excluído com sucesso")
             
-            if not diligencias:
+            self.worker.submit(
+                self.db.delete_correspondente, correspondente_id,
+                on_success=on_deleted,
+                on_error=self._db_error("Erro ao excluir correspondente")
+            )
+    
+    def _exportar_excel(self):
+        """Exporta dados para Excel em segundo plano"""
+        def on_count(total):
+            if not total:
                 messagebox.showinfo("Info", "Não há dados para exportar")
                 return
             
-            # Converter para DataFrame
-            df = pd.DataFrame(diligencias)
-            
-            # Formatar datas
-            date_columns = ['data_solicitacao', 'data_demanda', 'data_pagamento']
-            for col in date_columns:
-                if col in df.columns:
-                    df[col] = pd.to_datetime(df[col], errors='coerce').dt.strftime('%d/%m/%Y')
-            
-            # Salvar arquivo
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             filename = EXPORTS_DIR / f"diligencias_{timestamp}.xlsx"
             
-            df.to_excel(filename, index=False, sheet_name='Diligências')
-            
-            messagebox.showinfo("Sucesso", f"Dados exportados para:\n{filename}")
-            
-        except Exception as e:
-            self.logger.error(f"Erro ao exportar Excel: {e}")
-            messagebox.showerror("Erro", f"Erro ao exportar: {e}")
+            ExportDialog(self.root, self.db, filename)
+        
+        self.worker.submit(
+            self.db.count_diligencias,
+            on_success=on_count,
+            on_error=self._db_error("Erro ao exportar")
+        )
     
     def _criar_backup(self):
-        """Cria backup do banco de dados"""
+        """Cria backup do banco de dados em segundo plano"""
+        if self._backup_state and self._backup_state['result'] is None:
+            messagebox.showinfo("Info", "Já existe um backup em andamento")
+            return
+        
+        # Preenchido pela thread do backup, lido pelo Tk em _poll_backup
+        state = {'copied': 0, 'total': 0, 'result': None}
+        self._backup_state = state
+        
         try:
-            from utils import backup_database
-            if backup_database(str(self.db.db_path)):
-                messagebox.showinfo("Sucesso", "Backup criado com sucesso")
-            else:
-                messagebox.showerror("Erro", "Falha ao criar backup")
+            self.db.backup_async(
+                progress=lambda copied, total: state.update(copied=copied, total=total),
+                callback=lambda success: state.update(result=success)
+            )
+            self._poll_backup()
         except Exception as e:
+            state['result'] = False
             self.logger.error(f"Erro ao criar backup: {e}")
             messagebox.showerror("Erro", f"Erro ao criar backup: {e}")
     
+    def _poll_backup(self):
+        """Mostra o progresso do backup até a thread terminar"""
+        state = self._backup_state
+        
+        if state['result'] is None:
+            percent = 100 * state['copied'] // state['total'] if state['total'] else 0
+            self.status_bar.config(text=f"Backup em andamento: {percent}%")
+            self.root.after(100, self._poll_backup)
+            return
+        
+        if state['result']:
+            self.status_bar.config(text="Backup concluído")
+            messagebox.showinfo("Sucesso", "Backup criado com sucesso")
+        else:
+            self.status_bar.config(text="Falha no backup")
+            messagebox.showerror("Erro", "Falha ao criar backup")
+    
     def _mostrar_estatisticas(self):
         """Mostra estatísticas do sistema"""
-        try:
-            stats = self.db.get_statistics()
-            
+        def on_stats(stats):
             if not stats:
                 messagebox.showinfo("Info", "Não há dados para estatísticas")
                 return
             
             # Criar janela de estatísticas
             EstatisticasDialog(self.root, stats)
-            
-        except Exception as e:
-            self.logger.error(f"Erro ao obter estatísticas: {e}")
-            messagebox.showerror("Erro", f"Erro ao obter estatísticas: {e}")
+        
+        self.worker.submit(
+            self.db.get_statistics,
+            on_success=on_stats,
+            on_error=self._db_error("Erro ao obter estatísticas")
+        )
+    
+    def _gerar_relatorio(self):
+        """Gera o relatório por período em segundo plano"""
+        kinds = {label: kind for kind, label in REPORT_TYPES.items()}
+        kind = kinds[self.report_type_var.get()]
+        try:
+            first, last = (
+                datetime.strptime(var.get().strip(), '%d/%m/%Y').date()
+                for var in (self.report_start_var, self.report_end_var)
+            )
+        except ValueError:
+            messagebox.showwarning("Relatório", "Informe as datas no formato dd/mm/aaaa")
+            return
+        
+        self.worker.submit(
+            self.db.period_report, kind, first, last,
+            on_success=lambda periods: self._show_report(kind, periods),
+            on_error=self._db_error("Erro ao gerar relatório")
+        )
+    
+    def _show_report(self, kind, periods):
+        """Exibe as linhas do relatório por período"""
+        tree = self.report_tree
+        tree.delete(*tree.get_children())
+        
+        money = {
+            column: format_currencies([period[column] for period in periods])
+            for column in ('faturamento', 'recebido', 'custos', 'margem')
+        }
+        for index, period in enumerate(periods):
+            tree.insert('', 'end', values=(
+                period_label(kind, period['inicio']),
+                period['total'],
+                *(period['por_status'].get(status, 0) for status in STATUS_OPTIONS),
+                *(money[column][index] for column in ('faturamento', 'recebido', 'custos', 'margem')),
+            ))
+        
+        self.status_bar.config(text=f"Relatório com {len(periods)} períodos")
+    
+    def _on_tab_changed(self, event):
+        """Carrega os dados das abas Correspondentes e Relatórios ao abri-las"""
+        selected = self.notebook.select()
+        if selected == str(self.correspondentes_tab):
+            self._load_correspondentes()
+        elif selected == str(self.relatorios_tab):
+            self._load_charts()
+    
+    def _load_charts(self):
+        """Carrega os gráficos em segundo plano (do cache, se os dados não mudaram)"""
+        if self._charts_loading:
+            return
+        self._charts_loading = True
+        
+        def on_error(error):
+            self._charts_loading = False
+            self.logger.error(f"Erro ao gerar gráficos: {error}")
+            self.status_bar.config(text="Gráficos indisponíveis")
+        
+        self.worker.submit(load_charts, self.db, on_success=self._show_charts, on_error=on_error)
+    
+    def _show_charts(self, charts):
+        """Exibe os PNGs dos gráficos nos rótulos da aba Relatórios"""
+        self._charts_loading = False
+        
+        # Pillow só é carregado quando há gráficos para exibir
+        try:
+            from PIL import Image, ImageTk
+        except ImportError:
+            self.status_bar.config(text="Instale o Pillow para exibir os gráficos")
+            return
+        
+        for name, png in charts.items():
+            image = ImageTk.PhotoImage(Image.open(io.BytesIO(png)), master=self.root)
+            self._chart_images[name] = image
+            self.chart_labels[name].config(image=image, text='')
+    
+    def _recalcular_estatisticas(self):
+        """Reconstrói o resumo de estatísticas a partir das tabelas"""
+        def on_done(success):
+            if success:
+                messagebox.showinfo("Sucesso", "Estatísticas recalculadas com sucesso")
+            else:
+                messagebox.showerror("Erro", "Falha ao recalcular estatísticas")
+        
+        self.worker.submit(self.db.rebuild_statistics, on_success=on_done)
+    
+    def _mostrar_diagnostico(self):
+        """Mostra os tempos por consulta e as métricas do banco"""
+        DiagnosticoDialog(self.root, self.worker)
     
     def _mostrar_sobre(self):
         """Mostra informações sobre o sistema"""
@@ -328,13 +1124,17 @@ Sistema para controle e gestão de diligências jurídicas.
         except Exception as e:
             self.logger.error(f"Erro na execução da aplicação: {e}")
             messagebox.showerror("Erro Fatal", f"Erro na aplicação: {e}")
+        finally:
+            self.worker.shutdown()
+            self.db.close()
 
 
 class DiligenciaDialog:
     """Dialog para criar/editar diligências"""
     
-    def __init__(self, parent, db, diligencia_id=None, callback=None):
-        self.db = db
+    def __init__(self, parent, worker, diligencia_id=None, callback=None):
+        self.worker = worker
+        self.db = worker.db
         self.diligencia_id = diligencia_id
         self.callback = callback
         
@@ -385,7 +1185,7 @@ class DiligenciaDialog:
                 entry = ttk.Entry(main_frame, textvariable=var, width=40)
                 entry.grid(row=row, column=1, sticky='ew', pady=2, padx=(5, 0))
                 self.vars[field_name] = var
-                
+            
             elif field_type == 'combo':
                 var = tk.StringVar()
                 if field_name == 'tipo_demanda':
@@ -398,7 +1198,7 @@ class DiligenciaDialog:
                 combo = ttk.Combobox(main_frame, textvariable=var, values=values, width=37)
                 combo.grid(row=row, column=1, sticky='ew', pady=2, padx=(5, 0))
                 self.vars[field_name] = var
-                
+            
             elif field_type == 'text':
                 var = tk.StringVar()
                 text_frame = ttk.Frame(main_frame)
@@ -422,32 +1222,35 @@ class DiligenciaDialog:
         btn_frame = ttk.Frame(self.window)
         btn_frame.pack(fill='x', padx=10, pady=10)
         
-        ttk.Button(btn_frame, text="Salvar", command=self._save).pack(side='right', padx=2)
+        self.save_button = ttk.Button(btn_frame, text="Salvar", command=self._save)
+        self.save_button.pack(side='right', padx=2)
         ttk.Button(btn_frame, text="Cancelar", command=self.window.destroy).pack(side='right', padx=2)
     
     def _load_diligencia(self):
-        """Carrega dados da diligência para edição"""
-        try:
-            query = 'SELECT * FROM diligencias WHERE id = ?'
-            result = self.db.execute_query(query, (self.diligencia_id,), fetch=True)
+        """Carrega dados da diligência para edição (em segundo plano)"""
+        self.worker.submit(
+            self.db.get_diligencia, self.diligencia_id,
+            on_success=self._fill_form,
+            on_error=lambda e: messagebox.showerror("Erro", f"Erro ao carregar diligência: {e}")
+        )
+    
+    def _fill_form(self, data):
+        """Preenche o formulário com os dados carregados"""
+        # A janela pode ter sido fechada antes de a consulta terminar
+        if not data or not self.window.winfo_exists():
+            return
+        
+        for field_name, var in self.vars.items():
+            value = data.get(field_name, '')
             
-            if result:
-                data = result[0]
-                
-                for field_name, var in self.vars.items():
-                    value = data.get(field_name, '')
-                    
-                    if isinstance(var, tk.Text):
-                        var.delete('1.0', 'end')
-                        if value:
-                            var.insert('1.0', str(value))
-                    else:
-                        if field_name in ['data_solicitacao', 'data_demanda', 'data_pagamento']:
-                            value = format_date(value) if value else ''
-                        var.set(str(value) if value else '')
-                        
-        except Exception as e:
-            messagebox.showerror("Erro", f"Erro ao carregar diligência: {e}")
+            if isinstance(var, tk.Text):
+                var.delete('1.0', 'end')
+                if value:
+                    var.insert('1.0', str(value))
+            else:
+                if field_name in ['data_solicitacao', 'data_demanda', 'data_pagamento']:
+                    value = format_date(value) if value else ''
+                var.set(str(value) if value else '')
     
     def _save(self):
         """Salva diligência"""
@@ -480,22 +1283,369 @@ class DiligenciaDialog:
                 messagebox.showerror("Erro", "Formato de telefone inválido")
                 return
             
-            # Salvar
-            if self.diligencia_id:
-                self.db.update_diligencia(self.diligencia_id, data)
-                messagebox.showinfo("Sucesso", "Diligência atualizada com sucesso")
-            else:
-                self.db.insert_diligencia(data)
-                messagebox.showinfo("Sucesso", "Diligência criada com sucesso")
-            
-            # Callback e fechar
-            if self.callback:
-                self.callback()
-            
-            self.window.destroy()
-            
+            # Valor como número (REAL): texto ordenaria depois de todos os números
+            if data.get('valor_receber'):
+                try:
+                    data['valor_receber'] = parse_currency(data['valor_receber'])
+                except ValueError:
+                    messagebox.showerror("Erro", "Valor a receber deve ser um número")
+                    return
+        
         except Exception as e:
             messagebox.showerror("Erro", f"Erro ao salvar: {e}")
+            return
+        
+        # Salvar em segundo plano; o botão evita envios duplicados
+        self.save_button.config(state='disabled')
+        
+        if self.diligencia_id:
+            self.worker.submit(
+                self.db.update_diligencia, self.diligencia_id, data,
+                on_success=lambda result: self._on_saved("Diligência atualizada com sucesso"),
+                on_error=self._on_save_error
+            )
+        else:
+            self.worker.submit(
+                self.db.insert_diligencia, data,
+                on_success=lambda result: self._on_saved("Diligência criada com sucesso"),
+                on_error=self._on_save_error
+            )
+    
+    def _on_saved(self, message):
+        """Conclui o salvamento: avisa, atualiza a grade e fecha"""
+        messagebox.showinfo("Sucesso", message)
+        
+        # Callback e fechar
+        if self.callback:
+            self.callback()
+        
+        if self.window.winfo_exists():
+            self.window.destroy()
+    
+    def _on_save_error(self, error):
+        if self.window.winfo_exists():
+            self.save_button.config(state='normal')
+        messagebox.showerror("Erro", f"Erro ao salvar: {error}")
+
+
+class CorrespondenteDialog:
+    """Dialog para criar/editar correspondentes"""
+    
+    # Campos: (coluna, rótulo, tipo)
+    FIELDS = (
+        ('nome_contratado', 'Nome:', 'entry'),
+        ('telefone', 'Telefone:', 'entry'),
+        ('email', 'E-mail:', 'entry'),
+        ('endereco', 'Endereço:', 'entry'),
+        ('valor_cobrado', 'Valor Cobrado:', 'entry'),
+        ('prazo_pagamento', 'Prazo Pagamento:', 'entry'),
+        ('pago', 'Pago:', 'check'),
+        ('diligencia_id', 'Diligência nº:', 'entry'),
+        ('observacoes', 'Observações:', 'text'),
+    )
+    
+    def __init__(self, parent, worker, correspondente_id=None, callback=None):
+        self.worker = worker
+        self.db = worker.db
+        self.correspondente_id = correspondente_id
+        self.callback = callback
+        
+        self.window = tk.Toplevel(parent)
+        self.window.title("Novo Correspondente" if not correspondente_id else "Editar Correspondente")
+        self.window.geometry("520x400")
+        self.window.transient(parent)
+        self.window.grab_set()
+        
+        self.vars = {}
+        self._build_form()
+        
+        if correspondente_id:
+            self.worker.submit(
+                self.db.get_correspondente, correspondente_id,
+                on_success=self._fill_form,
+                on_error=lambda e: messagebox.showerror("Erro", f"Erro ao carregar correspondente: {e}")
+            )
+    
+    def _build_form(self):
+        """Constrói formulário"""
+        main_frame = ttk.Frame(self.window)
+        main_frame.pack(expand=True, fill='both', padx=10, pady=10)
+        
+        for row, (field_name, label_text, field_type) in enumerate(self.FIELDS):
+            ttk.Label(main_frame, text=label_text).grid(row=row, column=0, sticky='w', pady=2)
+            
+            if field_type == 'check':
+                var = tk.BooleanVar()
+                ttk.Checkbutton(main_frame, variable=var).grid(row=row, column=1, sticky='w', pady=2, padx=(5, 0))
+            elif field_type == 'text':
+                var = tk.Text(main_frame, height=4, width=40)
+                var.grid(row=row, column=1, sticky='ew', pady=2, padx=(5, 0))
+            else:
+                var = tk.StringVar()
+                ttk.Entry(main_frame, textvariable=var, width=40).grid(row=row, column=1, sticky='ew', pady=2, padx=(5, 0))
+            self.vars[field_name] = var
+        
+        main_frame.columnconfigure(1, weight=1)
+        
+        btn_frame = ttk.Frame(self.window)
+        btn_frame.pack(fill='x', padx=10, pady=10)
+        
+        self.save_button = ttk.Button(btn_frame, text="Salvar", command=self._save)
+        self.save_button.pack(side='right', padx=2)
+        ttk.Button(btn_frame, text="Cancelar", command=self.window.destroy).pack(side='right', padx=2)
+    
+    def _fill_form(self, data):
+        """Preenche o formulário com os dados carregados"""
+        if not data or not self.window.winfo_exists():
+            return
+        
+        for field_name, var in self.vars.items():
+            value = data.get(field_name)
+            if isinstance(var, tk.Text):
+                var.delete('1.0', 'end')
+                if value:
+                    var.insert('1.0', str(value))
+            elif isinstance(var, tk.BooleanVar):
+                var.set(bool(value))
+            elif field_name == 'prazo_pagamento':
+                var.set(format_date(value) if value else '')
+            else:
+                var.set('' if value is None else str(value))
+    
+    def _save(self):
+        """Valida e salva o correspondente"""
+        data = {}
+        for field_name, var in self.vars.items():
+            if isinstance(var, tk.Text):
+                value = var.get('1.0', 'end-1c').strip()
+            elif isinstance(var, tk.BooleanVar):
+                value = int(var.get())
+            else:
+                value = var.get().strip()
+            data[field_name] = value if value != '' else None
+        
+        if not data['nome_contratado']:
+            messagebox.showerror("Erro", "Nome do correspondente é obrigatório")
+            return
+        
+        if data['telefone'] and not validate_phone(data['telefone']):
+            messagebox.showerror("Erro", "Formato de telefone inválido")
+            return
+        
+        if data['email'] and not validate_email(data['email']):
+            messagebox.showerror("Erro", "Formato de e-mail inválido")
+            return
+        
+        try:
+            if data['valor_cobrado']:
+                data['valor_cobrado'] = parse_currency(data['valor_cobrado'])
+            if data['diligencia_id']:
+                data['diligencia_id'] = int(data['diligencia_id'])
+        except ValueError:
+            messagebox.showerror("Erro", "Valor cobrado e diligência devem ser números")
+            return
+        
+        if data['prazo_pagamento']:
+            data['prazo_pagamento'] = convert_date(data['prazo_pagamento'])
+        
+        # Salvar em segundo plano; o botão evita envios duplicados
+        self.save_button.config(state='disabled')
+        
+        if self.correspondente_id:
+            self.worker.submit(
+                self.db.update_correspondente, self.correspondente_id, data,
+                on_success=lambda result: self._on_saved("Correspondente atualizado com sucesso"),
+                on_error=self._on_save_error
+            )
+        else:
+            self.worker.submit(
+                self.db.insert_correspondente, data,
+                on_success=lambda result: self._on_saved("Correspondente cadastrado com sucesso"),
+                on_error=self._on_save_error
+            )
+    
+    def _on_saved(self, message):
+        """Conclui o salvamento: avisa, atualiza as listas e fecha"""
+        messagebox.showinfo("Sucesso", message)
+        
+        if self.callback:
+            self.callback()
+        
+        if self.window.winfo_exists():
+            self.window.destroy()
+    
+    def _on_save_error(self, error):
+        if self.window.winfo_exists():
+            self.save_button.config(state='normal')
+        messagebox.showerror("Erro", f"Erro ao salvar: {error}")
+
+
+class ExportDialog:
+    """Dialog de progresso da exportação para Excel"""
+    
+    def __init__(self, parent, db, filename):
+        self.filename = filename
+        
+        # Preenchido pela thread da exportação, lido pelo Tk em _poll
+        self.state = {'exported': 0, 'total': 0, 'done': False, 'result': None, 'error': None}
+        
+        self.window = tk.Toplevel(parent)
+        self.window.title("Exportar Excel")
+        self.window.geometry("400x150")
+        self.window.transient(parent)
+        self.window.grab_set()
+        self.window.protocol("WM_DELETE_WINDOW", self._cancel)
+        
+        main_frame = ttk.Frame(self.window)
+        main_frame.pack(expand=True, fill='both', padx=10, pady=10)
+        
+        self.label = ttk.Label(main_frame, text="Preparando exportação...")
+        self.label.pack(fill='x', pady=5)
+        
+        self.progress = ttk.Progressbar(main_frame, mode='determinate', maximum=100)
+        self.progress.pack(fill='x', pady=5)
+        
+        self.cancel_button = ttk.Button(main_frame, text="Cancelar", command=self._cancel)
+        self.cancel_button.pack(pady=5)
+        
+        self.cancel_event = export_diligencias_excel_async(
+            db, filename, progress=self._on_progress, callback=self._on_done
+        )
+        self._poll()
+    
+    def _on_progress(self, exported, total):
+        self.state.update(exported=exported, total=total)
+    
+    def _on_done(self, result, error):
+        self.state.update(result=result, error=error, done=True)
+    
+    def _cancel(self):
+        """Solicita o cancelamento; o dialog fecha quando a thread parar"""
+        self.cancel_event.set()
+        self.cancel_button.config(state='disabled')
+        self.label.config(text="Cancelando...")
+    
+    def _poll(self):
+        """Atualiza a barra de progresso até a exportação terminar"""
+        state = self.state
+        
+        if not state['done']:
+            if state['total'] and not self.cancel_event.is_set():
+                self.progress['value'] = 100 * state['exported'] / state['total']
+                self.label.config(text=f"Exportadas {state['exported']} de {state['total']} diligências")
+            self.window.after(100, self._poll)
+            return
+        
+        self.window.destroy()
+        
+        if state['error'] is not None:
+            messagebox.showerror("Erro", f"Erro ao exportar: {state['error']}")
+        elif state['result'] is not None:
+            messagebox.showinfo("Sucesso", f"Dados exportados para:\n{self.filename}")
+
+
+class DiagnosticoDialog:
+    """Dialog com os tempos por consulta (db.diagnostics) para achar gargalos"""
+    
+    # Colunas: (chave em diagnostics()['consultas'], título, largura)
+    COLUMNS = (
+        ('execucoes', 'Execuções', 75),
+        ('total_ms', 'Total (ms)', 85),
+        ('p50_ms', 'p50', 65),
+        ('p95_ms', 'p95', 65),
+        ('p99_ms', 'p99', 65),
+        ('max_ms', 'Máx.', 65),
+        ('linhas_media', 'Linhas', 60),
+        ('lentas', 'Lentas', 55),
+        ('consulta', 'Consulta', 420),
+    )
+    
+    def __init__(self, parent, worker):
+        self.worker = worker
+        self.db = worker.db
+        self.rows = []
+        
+        self.window = tk.Toplevel(parent)
+        self.window.title("Diagnóstico do Banco de Dados")
+        self.window.geometry("1000x560")
+        self.window.transient(parent)
+        
+        self._build()
+        self._refresh()
+    
+    def _build(self):
+        """Constrói a tabela de consultas, o plano e os botões"""
+        main_frame = ttk.Frame(self.window)
+        main_frame.pack(expand=True, fill='both', padx=10, pady=10)
+        
+        self.summary_label = ttk.Label(main_frame, text="Carregando...", justify='left')
+        self.summary_label.pack(anchor='w', pady=(0, 5))
+        
+        list_frame = ttk.Frame(main_frame)
+        list_frame.pack(expand=True, fill='both')
+        columns = tuple(title for _, title, _ in self.COLUMNS)
+        self.tree = ttk.Treeview(list_frame, columns=columns, show='headings', height=14)
+        for _, title, width in self.COLUMNS:
+            self.tree.heading(title, text=title)
+            self.tree.column(title, width=width, stretch=title == 'Consulta')
+        scrollbar = ttk.Scrollbar(list_frame, orient='vertical', command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side='left', expand=True, fill='both')
+        scrollbar.pack(side='right', fill='y')
+        self.tree.bind('<<TreeviewSelect>>', self._on_select)
+        
+        # SQL e plano da consulta selecionada (plano só das que já foram lentas)
+        self.detail_text = tk.Text(main_frame, height=7, wrap='word', state='disabled')
+        self.detail_text.pack(fill='x', pady=5)
+        
+        button_frame = ttk.Frame(main_frame)
+        button_frame.pack(fill='x')
+        ttk.Button(button_frame, text="Fechar", command=self.window.destroy).pack(side='right')
+        ttk.Button(button_frame, text="Zerar", command=self._reset).pack(side='right', padx=5)
+        ttk.Button(button_frame, text="Atualizar", command=self._refresh).pack(side='right')
+    
+    def _refresh(self):
+        self.worker.submit(self.db.diagnostics, on_success=self._show, on_error=self._on_error)
+    
+    def _reset(self):
+        self.worker.submit(self.db.reset_diagnostics,
+                           on_success=lambda _: self._refresh(), on_error=self._on_error)
+    
+    def _on_error(self, error):
+        if self.window.winfo_exists():
+            messagebox.showerror("Erro", f"Erro ao obter diagnóstico: {error}", parent=self.window)
+    
+    def _show(self, report):
+        if not self.window.winfo_exists():
+            return
+        
+        banco, escritas = report['banco'], report['escritas']
+        self.summary_label.config(text=(
+            f"Banco: {banco['arquivo']} ({banco['tamanho_bytes'] / 1024:.0f} KB, "
+            f"WAL {banco['wal_bytes'] / 1024:.0f} KB, SQLite {banco['sqlite']})\n"
+            f"Escritas: {escritas['escritas']}, espera média pelo lock "
+            f"{escritas['espera_media_ms']:.1f} ms (máx. {escritas['espera_max_ms']:.1f} ms), "
+            f"{escritas['falhas']} falhas  |  Consultas lentas: acima de "
+            f"{report['consulta_lenta_ms']} ms"
+        ))
+        
+        self.rows = report['consultas']
+        self.tree.delete(*self.tree.get_children())
+        for index, row in enumerate(self.rows):
+            self.tree.insert('', 'end', iid=str(index),
+                             values=tuple(row[key] for key, _, _ in self.COLUMNS))
+    
+    def _on_select(self, event):
+        selection = self.tree.selection()
+        if not selection:
+            return
+        row = self.rows[int(selection[0])]
+        plan = '\n'.join(f"  {step}" for step in row['plano'] or ())
+        
+        self.detail_text.config(state='normal')
+        self.detail_text.delete('1.0', 'end')
+        self.detail_text.insert('1.0', row['consulta'] + (f"\n\nPlano:\n{plan}" if plan else ''))
+        self.detail_text.config(state='disabled')
 
 
 class EstatisticasDialog:
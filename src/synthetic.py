@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gerador determinístico de dados sintéticos (diligências e correspondentes)
+"""
+
+import random
+from datetime import date, timedelta
+from itertools import islice
+
+from config import DEMANDA_TYPES
+from database import DILIGENCIA_COLUMNS
+
+# Data final das solicitações: fixa, para que a semente baste à reprodução
+REFERENCE_DATE = date(2024, 12, 31)
+YEARS = 5
+
+FIRST_NAMES = (
+    'Ana', 'Bruno', 'Carla', 'Daniel', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique',
+    'Isabela', 'João', 'Juliana', 'Lucas', 'Mariana', 'Marcos', 'Natália', 'Otávio',
+    'Paula', 'Rafael', 'Sofia', 'Thiago', 'Vanessa', 'Vinícius', 'Beatriz', 'Gustavo',
+)
+SURNAMES = (
+    'Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira',
+    'Lima', 'Gomes', 'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida', 'Lopes',
+    'Soares', 'Fernandes', 'Vieira', 'Barbosa', 'Rocha', 'Dias', 'Nascimento', 'Moreira',
+)
+CITIES = (
+    ('São Paulo', 'SP', 26), ('Rio de Janeiro', 'RJ', 19), ('Belo Horizonte', 'MG', 13),
+    ('Porto Alegre', 'RS', 21), ('Curitiba', 'PR', 16), ('Salvador', 'BA', 5),
+    ('Recife', 'PE', 17), ('Fortaleza', 'CE', 6), ('Goiânia', 'GO', 9),
+    ('Campinas', 'SP', 26), ('Florianópolis', 'SC', 24), ('Brasília', 'DF', 7),
+)
+PLACES = ('Fórum Central', 'Fórum Regional', 'Vara do Trabalho', 'Cartório', 'Juizado Especial')
+HOURS = ('09:00', '10:30', '13:00', '14:00', '15:30', '16:00')
+
+# Status: maioria já cumprida; pendentes concentradas nos meses recentes
+STATUS_WEIGHTS = (('Cumprida', 70), ('Pendente', 22), ('Cancelada', 8))
+DEMANDA_WEIGHTS = (50, 15, 15, 8, 8, 4)  # na ordem de DEMANDA_TYPES
+
+# Solicitantes distintos e parcela das diligências com correspondente
+CLIENTS = 400
+CORRESPONDENTE_RATIO = 0.4
+
+# Diligências geradas e gravadas por transação em populate
+POPULATE_CHUNK_SIZE = 20000
+
+
+def cnj_number(rng, year, tribunal, origin):
+    """Número de processo no padrão CNJ com dígitos verificadores (módulo 97)"""
+    sequence = rng.randrange(10 ** 7)
+    base = f'{sequence:07d}{year:04d}8{tribunal:02d}{origin:04d}'
+    digits = 98 - (int(base) * 100) % 97
+    return f'{sequence:07d}-{digits:02d}.{year:04d}.8.{tribunal:02d}.{origin:04d}'
+
+
+def cnj_is_valid(number):
+    """Verifica os dígitos de um número CNJ formatado"""
+    sequence, rest = number.split('-')
+    digits, year, segment, tribunal, origin = rest.split('.')
+    return int(f'{sequence}{year}{segment}{tribunal}{origin}{digits}') % 97 == 1
+
+
+def _person(rng):
+    return f'{rng.choice(FIRST_NAMES)} {rng.choice(SURNAMES)} {rng.choice(SURNAMES)}'
+
+
+def _phone(rng):
+    return f'({rng.randint(11, 99)}) 9{rng.randint(1000, 9999)}-{rng.randint(0, 9999):04d}'
+
+
+def _clients(rng):
+    """Solicitantes (escritórios e pessoas) e seus pesos, em cauda longa"""
+    clients = []
+    for i in range(CLIENTS):
+        if i % 3:
+            name = _person(rng)
+        else:
+            name = f'{rng.choice(SURNAMES)} & {rng.choice(SURNAMES)} Advogados'
+        clients.append((name, _phone(rng)))
+    # Peso ~ 1/posição (Zipf): os primeiros concentram as demandas
+    weights = [1 / (position + 1) for position in range(CLIENTS)]
+    return clients, weights
+
+
+def synthetic_diligencias(count, seed=0):
+    """Gera count diligências, tuplas na ordem de DILIGENCIA_COLUMNS"""
+    rng = random.Random(seed)
+    clients, client_weights = _clients(rng)
+    statuses = [status for status, _ in STATUS_WEIGHTS]
+    status_weights = [weight for _, weight in STATUS_WEIGHTS]
+    first_day = REFERENCE_DATE - timedelta(days=365 * YEARS)
+    span = (REFERENCE_DATE - first_day).days
+    
+    # Sorteios em blocos: choices com pesos é bem mais rápido em lote
+    block = 1000
+    for start in range(0, count, block):
+        size = min(block, count - start)
+        picked_clients = rng.choices(clients, client_weights, k=size)
+        picked_types = rng.choices(DEMANDA_TYPES, DEMANDA_WEIGHTS, k=size)
+        picked_status = rng.choices(statuses, status_weights, k=size)
+        
+        for offset in range(size):
+            position = start + offset
+            requested = first_day + timedelta(days=span * position // max(1, count))
+            client, phone = picked_clients[offset]
+            city, state, tribunal = rng.choice(CITIES)
+            status = picked_status[offset]
+            # O que foi pedido há pouco tende a continuar pendente
+            if (REFERENCE_DATE - requested).days < 60 and rng.random() < 0.6:
+                status = 'Pendente'
+            
+            yield (
+                requested.isoformat(),
+                client,
+                phone if rng.random() < 0.8 else None,
+                picked_types[offset],
+                cnj_number(rng, requested.year - rng.randint(0, 6), tribunal, rng.randint(1, 999)),
+                (requested + timedelta(days=rng.randint(1, 45))).isoformat(),
+                status,
+                rng.choice(HOURS),
+                f'{rng.choice(PLACES)} de {city}/{state}',
+                round(rng.lognormvariate(5.3, 0.6), 2),  # mediana ~R$ 200
+                'Levar cópia da procuração' if rng.random() < 0.1 else None,
+            )
+
+
+def synthetic_correspondentes(diligencias, seed=0, ratio=CORRESPONDENTE_RATIO):
+    """Gera correspondentes (tuplas) para pares (id, valor_receber)"""
+    rng = random.Random(seed + 1)
+    pool = [(_person(rng), _phone(rng)) for _ in range(CLIENTS // 4)]
+    
+    for diligencia_id, valor in diligencias:
+        if rng.random() >= ratio:
+            continue
+        for _ in range(2 if rng.random() < 0.1 else 1):
+            name, phone = rng.choice(pool)
+            first, last = name.split()[0], name.split()[-1]
+            yield (
+                name,
+                phone,
+                f'{first}.{last}@exemplo.com.br'.lower(),
+                None,
+                round((valor or 0) * rng.uniform(0.3, 0.7), 2),
+                None,
+                1 if rng.random() < 0.75 else 0,
+                diligencia_id,
+                None,
+            )
+
+
+def populate(db, count, seed=0, chunk_size=POPULATE_CHUNK_SIZE):
+    """Insere count diligências sintéticas e seus correspondentes em db, em blocos"""
+    rows = synthetic_diligencias(count, seed)
+    valor = DILIGENCIA_COLUMNS.index('valor_receber')
+    diligencias = correspondentes = 0
+    
+    # Só um bloco de linhas geradas fica em memória por vez
+    for block in iter(lambda: list(islice(rows, chunk_size)), []):
+        ids = db.insert_diligencias_many(block)
+        correspondentes += len(db.insert_correspondentes_many(synthetic_correspondentes(
+            ((i, row[valor]) for i, row in zip(ids, block)), seed + diligencias
+        )))
+        diligencias += len(ids)
+    
+    with db.transaction('pagamentos sintéticos') as conn:
+        conn.execute('''
+            UPDATE diligencias SET pago = 1, data_pagamento = data_demanda
+            WHERE status = 'Cumprida' AND id % 5 != 0
+        ''')
+    db.cache.clear()
+    return diligencias, correspondentes
+
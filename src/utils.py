@@ -4,12 +4,22 @@
 Utilitários e funções auxiliares
 """
 
+import atexit
+import gzip
+import importlib.util
 import locale
 import os
 import logging
-import sys
+import logging.handlers
+import queue
 import shutil
+import sys
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
+from functools import lru_cache
 
 # Fallback para pathlib se não estiver disponível
 try:
@@ -42,20 +52,8 @@ except ImportError:
         def home(cls):
             return cls(os.path.expanduser("~"))
 
-# Imports condicionais para compatibilidade
-try:
-    import tkinter as tk
-    from tkinter import ttk, messagebox, filedialog
-    TKINTER_AVAILABLE = True
-except ImportError:
-    try:
-        import Tkinter as tk
-        import ttk
-        from tkMessageBox import messagebox
-        from tkFileDialog import filedialog
-        TKINTER_AVAILABLE = True
-    except ImportError:
-        TKINTER_AVAILABLE = False
+# Disponibilidade verificada sem importar: tkinter só é carregado pela interface
+TKINTER_AVAILABLE = importlib.util.find_spec('tkinter') is not None
 
 
 def setup_locale():
@@ -81,10 +79,41 @@ def setup_locale():
     return False
 
 
-def setup_logging():
-    """Configura sistema de logging"""
+# Listener da fila de log ativo (ver setup_logging)
+_log_listener = None
+_log_queue_handler = None
+
+
+def _gzip_namer(name):
+    return f"{name}.gz"
+
+
+def _gzip_rotator(source, dest):
+    """Comprime o arquivo rotacionado (roda na thread do listener)"""
+    with open(source, 'rb') as raw, gzip.open(dest, 'wb') as compressed:
+        shutil.copyfileobj(raw, compressed)
+    os.remove(source)
+
+
+def parse_log_levels(spec):
+    """Converte "modulo=NIVEL,..." em {logger: nível}; '' é o logger raiz"""
+    levels = {}
+    for item in (spec or '').split(','):
+        name, _, level = item.strip().rpartition('=')
+        if level:
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(console=sys.stdout, console_level=logging.INFO):
+    """Configura o log: arquivo com rotação e console, gravados pela thread da fila"""
+    global _log_listener, _log_queue_handler
+    
     try:
-        from config import LOGS_DIR
+        from config import (
+            LOGS_DIR, LOG_LEVEL, LOG_FILE_NAME, LOG_MAX_SIZE, LOG_BACKUP_COUNT,
+            LOG_COMPRESS, LOG_MODULE_LEVELS, LOG_LEVELS_ENV
+        )
         logs_dir = LOGS_DIR
     except ImportError:
         # Fallback se config não estiver disponível
@@ -93,17 +122,63 @@ def setup_logging():
             logs_dir.mkdir(exist_ok=True)
         else:
             os.makedirs(str(logs_dir), exist_ok=True)
+        LOG_LEVEL, LOG_FILE_NAME, LOG_MAX_SIZE, LOG_BACKUP_COUNT = "INFO", "diligencias.log", 10 * 1024 * 1024, 5
+        LOG_COMPRESS, LOG_MODULE_LEVELS, LOG_LEVELS_ENV = True, {}, None
+    
+    levels = {'': LOG_LEVEL, **LOG_MODULE_LEVELS, **parse_log_levels(LOG_LEVELS_ENV)}
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    
+    file_handler = logging.handlers.RotatingFileHandler(
+        str(logs_dir / LOG_FILE_NAME), maxBytes=LOG_MAX_SIZE,
+        backupCount=LOG_BACKUP_COUNT, encoding='utf-8', delay=True
+    )
+    if LOG_COMPRESS:
+        file_handler.namer = _gzip_namer
+        file_handler.rotator = _gzip_rotator
+    file_handler.setFormatter(formatter)
+    
+    console_handler = logging.StreamHandler(console)
+    console_handler.setLevel(console_level)
+    console_handler.setFormatter(formatter)
     
-    log_file = logs_dir / f"diligencias_{datetime.now().strftime('%Y%m%d')}.log"
+    shutdown_logging()
     
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(str(log_file), encoding='utf-8'),
-            logging.StreamHandler(sys.stdout)
-        ]
+    log_queue = queue.SimpleQueue()
+    _log_queue_handler = logging.handlers.QueueHandler(log_queue)
+    _log_listener = logging.handlers.QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
     )
+    
+    root = logging.getLogger()
+    root.addHandler(_log_queue_handler)
+    invalid = []
+    for name, level in levels.items():
+        try:
+            logging.getLogger(name or None).setLevel(level)
+        except ValueError:
+            invalid.append(f"{name or 'raiz'}={level}")
+    
+    _log_listener.start()
+    if invalid:
+        logging.warning(f"Níveis de log inválidos ignorados: {', '.join(invalid)}")
+    return _log_listener
+
+
+def shutdown_logging():
+    """Esvazia a fila de log e fecha os arquivos (também chamado na saída)"""
+    global _log_listener, _log_queue_handler
+    
+    if _log_queue_handler is not None:
+        logging.getLogger().removeHandler(_log_queue_handler)
+        _log_queue_handler = None
+    if _log_listener is not None:
+        _log_listener.stop()
+        for handler in _log_listener.handlers:
+            handler.close()
+        _log_listener = None
+
+
+atexit.register(shutdown_logging)
 
 
 def check_dependencies():
@@ -120,10 +195,10 @@ def check_dependencies():
     if not TKINTER_AVAILABLE:
         missing.append('tkinter')
     
+    # find_spec localiza o módulo sem executá-lo: pandas, matplotlib e
+    # openpyxl só são importados pelas funções que os usam
     for module in required_modules:
-        try:
-            __import__(module)
-        except ImportError:
+        if importlib.util.find_spec(module) is None:
             missing.append(module)
     
     if missing:
@@ -172,6 +247,51 @@ def format_currency(value):
         return "R$ 0,00"
 
 
+def parse_currency(value):
+    """Valor numérico a partir de número, '1234.56', '1.234,56' ou 'R$ 1.234,56'"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).replace('R$', '').strip()
+    if ',' in text:  # formato brasileiro: o ponto separa milhares
+        text = text.replace('.', '').replace(',', '.')
+    return float(text)
+
+
+# Troca de separadores en-US -> pt-BR numa única passada (independe do locale)
+_PT_BR_SEPARATORS = str.maketrans(',.', '.,')
+
+# Valores distintos lembrados pelos formatadores em lote
+FORMAT_CACHE_SIZE = 8192
+
+
+@lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def _format_date_cached(date_str):
+    if date_str.count('-') != 2:
+        return format_date(date_str)
+    year, month, day = date_str.split('-')
+    return f"{day.zfill(2)}/{month.zfill(2)}/{year}"
+
+
+@lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def _format_currency_cached(value):
+    try:
+        return f"R$ {float(value):,.2f}".translate(_PT_BR_SEPARATORS)
+    except (ValueError, TypeError):
+        return "R$ 0,00"
+
+
+def format_dates(values):
+    """Versão em lote de format_date para uma coluna inteira"""
+    cached = _format_date_cached
+    return [cached(value) if value else "" for value in values]
+
+
+def format_currencies(values):
+    """Versão em lote de format_currency para uma coluna inteira"""
+    cached = _format_currency_cached
+    return ["R$ 0,00" if value is None else cached(value) for value in values]
+
+
 def validate_phone(phone):
     """Valida formato de telefone brasileiro"""
     if not phone:
@@ -193,14 +313,25 @@ def validate_email(email):
     return '@' in email and '.' in email.split('@')[-1]
 
 
-def backup_database(db_path):
-    """Cria backup do banco de dados"""
-    if not os.path.exists(db_path):
-        return False
-    
+@contextmanager
+def atomic_write(path):
+    """Caminho temporário para gravar path; só arquivos completos recebem o nome final"""
+    partial_path = f"{path}.{threading.get_ident()}.part"
     try:
-        from config import BACKUPS_DIR
-        backups_dir = BACKUPS_DIR
+        yield partial_path
+        os.replace(partial_path, str(path))
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+
+def _backup_settings():
+    """Diretório e parâmetros de backup (config.py, com fallback)"""
+    try:
+        from config import (
+            BACKUPS_DIR, MAX_BACKUPS, BACKUP_PAGES_PER_STEP, BACKUP_STEP_DELAY
+        )
+        return BACKUPS_DIR, MAX_BACKUPS, BACKUP_PAGES_PER_STEP, BACKUP_STEP_DELAY
     except ImportError:
         # Fallback se config não estiver disponível
         backups_dir = get_app_data_dir() / "backups" if PATHLIB_AVAILABLE else Path(os.path.join(get_app_data_dir().path, "backups"))
@@ -208,17 +339,91 @@ def backup_database(db_path):
             backups_dir.mkdir(exist_ok=True)
         else:
             os.makedirs(str(backups_dir), exist_ok=True)
+        return backups_dir, 30, 1024, 0.01
+
+
+def backup_database(db_path, progress=None, backups_dir=None):
+    """Cria backup online do banco em backups_dir (padrão: BACKUPS_DIR) e poda só ali"""
+    if not os.path.exists(db_path):
+        return False
+    
+    default_dir, max_backups, pages, step_delay = _backup_settings()
+    backups_dir = Path(backups_dir) if backups_dir else default_dir
     
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     backup_path = backups_dir / f"diligencias_backup_{timestamp}.db"
     
+    def on_step(status, remaining, total):
+        if progress:
+            progress(total - remaining, total)
+        if remaining:
+            time.sleep(step_delay)
+    
     try:
-        shutil.copy2(db_path, str(backup_path))
+        with atomic_write(backup_path) as partial_path:
+            source = sqlite3.connect(db_path, isolation_level=None)
+            target = sqlite3.connect(partial_path)
+            try:
+                # Snapshot fixo: escritas concorrentes não reiniciam a cópia
+                source.execute('BEGIN')
+                source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+                source.backup(target, pages=pages, progress=on_step)
+                source.execute('COMMIT')
+            finally:
+                target.close()
+                source.close()
         logging.info(f"Backup criado: {backup_path}")
-        return True
     except Exception as e:
         logging.error(f"Erro ao criar backup: {e}")
         return False
+    
+    prune_backups(backups_dir, max_backups)
+    return True
+
+
+def backup_database_async(db_path, progress=None, callback=None, backups_dir=None):
+    """Executa backup_database numa thread e chama callback(sucesso) ao final"""
+    def run():
+        success = backup_database(db_path, progress=progress, backups_dir=backups_dir)
+        if callback:
+            callback(success)
+    
+    thread = threading.Thread(target=run, name='backup', daemon=True)
+    thread.start()
+    return thread
+
+
+def _list_backups(backups_dir):
+    """Nomes dos backups completos, do mais antigo ao mais novo"""
+    # O timestamp no nome ordena os arquivos cronologicamente
+    return sorted(
+        name for name in os.listdir(str(backups_dir))
+        if name.startswith('diligencias_backup_') and name.endswith('.db')
+    )
+
+
+def backup_is_due(frequency_days, backups_dir=None):
+    """Indica se o último backup tem mais de frequency_days dias (ou não existe)"""
+    backups_dir = backups_dir or _backup_settings()[0]
+    backups = _list_backups(backups_dir)
+    if not backups:
+        return True
+    
+    newest = os.path.getmtime(os.path.join(str(backups_dir), backups[-1]))
+    age_days = (time.time() - newest) / 86400
+    return age_days >= frequency_days
+
+
+def prune_backups(backups_dir, max_backups):
+    """Remove os backups mais antigos além de max_backups"""
+    backups = _list_backups(backups_dir)
+    
+    for name in backups[:max(0, len(backups) - max_backups)]:
+        try:
+            os.remove(os.path.join(str(backups_dir), name))
+            logging.info(f"Backup antigo removido: {name}")
+        except OSError as e:
+            logging.warning(f"Erro ao remover backup {name}: {e}")
 
 
 def get_app_data_dir():
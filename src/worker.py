@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Execução de operações de banco de dados fora da thread da interface
+"""
+
+import logging
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+from config import DB_WORKER_THREADS, WORKER_POLL_MS
+
+
+class DatabaseWorker:
+    """Executa chamadas ao banco em threads e entrega os resultados ao Tk"""
+    
+    def __init__(self, db, max_workers=DB_WORKER_THREADS):
+        self.db = db
+        self.logger = logging.getLogger(__name__)
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='db-worker')
+        self._completed = queue.SimpleQueue()
+        self._in_flight = 0
+        self._root = None
+        self._on_activity = None
+    
+    @property
+    def in_flight(self):
+        """Número de operações submetidas e ainda não entregues"""
+        return self._in_flight
+    
+    def attach(self, root, on_activity=None):
+        """Passa a entregar resultados no loop do Tk de root"""
+        self._root = root
+        self._on_activity = on_activity
+        self._schedule()
+    
+    def submit(self, func, *args, on_success=None, on_error=None, **kwargs):
+        """Executa func(*args, **kwargs) numa thread do worker (chamar na thread do Tk)"""
+        future = self._executor.submit(func, *args, **kwargs)
+        self._in_flight += 1
+        self._notify()
+        future.add_done_callback(
+            lambda done: self._completed.put((done, on_success, on_error))
+        )
+        return future
+    
+    def poll(self):
+        """Entrega os resultados concluídos (na thread que chamar)"""
+        delivered = False
+        while True:
+            try:
+                future, on_success, on_error = self._completed.get_nowait()
+            except queue.Empty:
+                break
+            
+            self._in_flight -= 1
+            delivered = True
+            
+            try:
+                error = future.exception()
+                if error is None:
+                    if on_success:
+                        on_success(future.result())
+                elif on_error:
+                    on_error(error)
+                else:
+                    self.logger.error(f"Erro em operação de banco de dados: {error}")
+            except Exception as e:
+                self.logger.exception(f"Erro no callback de operação de banco: {e}")
+        
+        if delivered:
+            self._notify()
+    
+    def shutdown(self, wait=True):
+        """Encerra as threads (aguardando as operações pendentes)"""
+        self._root = None
+        self._executor.shutdown(wait=wait)
+    
+    def _schedule(self):
+        if self._root is not None:
+            self._root.after(WORKER_POLL_MS, self._poll_loop)
+    
+    def _poll_loop(self):
+        self.poll()
+        self._schedule()
+    
+    def _notify(self):
+        if self._on_activity:
+            self._on_activity(self._in_flight)
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Funções auxiliares compartilhadas pelos testes
+"""
+
+import gc
+import os
+import time
+import unittest
+
+# Orçamentos de tempo e memória variam com a máquina: ficam fora da suíte
+# padrão e rodam com SISTEMA_DILIGENCIAS_TESTES_DESEMPENHO=1
+performance_test = unittest.skipUnless(
+    os.environ.get('SISTEMA_DILIGENCIAS_TESTES_DESEMPENHO') == '1',
+    "orçamento de desempenho (defina SISTEMA_DILIGENCIAS_TESTES_DESEMPENHO=1)"
+)
+
+
+def nova_diligencia(**overrides):
+    """Dados mínimos válidos de uma diligência"""
+    data = {
+        'data_solicitacao': '2024-01-01',
+        'solicitante': 'Teste',
+        'tipo_demanda': 'Audiência',
+        'status': 'Pendente',
+        'valor_receber': 100.0,
+    }
+    data.update(overrides)
+    return data
+
+
+def best_time(func, repeat=5):
+    """Menor tempo de func() em repeat execuções"""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes dos gráficos da aba Relatórios e do cache de PNGs
+"""
+
+import sys
+import os
+import importlib.util
+import tempfile
+import time
+import unittest
+from datetime import date
+from pathlib import Path
+from unittest import mock
+
+# Adicionar src ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import charts
+from charts import CHARTS, chart_data, chart_key, load_chart, load_charts, prune_charts
+from database import DatabaseManager
+
+TODAY = date(2024, 6, 15)
+PNG = b'\x89PNG\r\n\x1a\nteste'
+
+HAS_MATPLOTLIB = importlib.util.find_spec('matplotlib') is not None
+
+
+class TestChartData(unittest.TestCase):
+    """Dados dos gráficos a partir do relatório mensal"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = Path(self.tmp_dir.name) / 'charts'
+        self.cache_dir.mkdir()
+        self.db = DatabaseManager(Path(self.tmp_dir.name) / 'teste.db')
+        self.db.insert_diligencias_many([
+            {'data_solicitacao': '2024-01-10', 'solicitante': 'Teste', 'tipo_demanda': 'Audiência',
+             'status': 'Cumprida', 'valor_receber': 200.0},
+            {'data_solicitacao': '2024-06-14', 'solicitante': 'Teste', 'tipo_demanda': 'Cópia',
+             'status': 'Pendente', 'valor_receber': 70.0},
+        ])
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp_dir.cleanup()
+
+    def test_chart_data(self):
+        """Testa meses, mix de status e série acumulada a receber"""
+        data = chart_data(self.db, months=12, today=TODAY)
+        self.assertEqual(set(data), set(CHARTS))
+        self.assertEqual(data['faturamento']['meses'][0], '07/2023')
+        self.assertEqual(data['faturamento']['meses'][-1], '06/2024')
+        self.assertEqual(sum(data['faturamento']['faturamento']), 270.0)
+        self.assertEqual(data['status'], {'status': ['Cumprida', 'Pendente'], 'quantidades': [1, 1]})
+        self.assertEqual(data['a_receber']['acumulado'][-1], 270.0)
+
+    def test_key_follows_data(self):
+        """Testa se a chave muda com os dados e os parâmetros, e só com eles"""
+        data = chart_data(self.db, today=TODAY)
+        key = chart_key('status', data['status'])
+        self.assertEqual(key, chart_key('status', chart_data(self.db, today=TODAY)['status']))
+        self.assertNotEqual(key, chart_key('status', data['status'], dpi=200))
+
+        self.db.insert_diligencia({
+            'data_solicitacao': '2024-06-01', 'solicitante': 'Outro',
+            'tipo_demanda': 'Audiência', 'status': 'Cancelada', 'valor_receber': 10.0,
+        })
+        self.assertNotEqual(key, chart_key('status', chart_data(self.db, today=TODAY)['status']))
+
+    def test_unchanged_data_reads_cache(self):
+        """Testa se reabrir sem alterações lê os PNGs em vez de renderizar"""
+        with mock.patch.object(charts, 'render_chart', return_value=PNG) as render:
+            first = load_charts(self.db, today=TODAY, cache_dir=self.cache_dir)
+            self.assertEqual(render.call_count, len(CHARTS))
+
+            again = load_charts(self.db, today=TODAY, cache_dir=self.cache_dir)
+            self.assertEqual(render.call_count, len(CHARTS))
+            self.assertEqual(again, first)
+
+            self.db.insert_diligencia({
+                'data_solicitacao': '2024-06-01', 'solicitante': 'Outro',
+                'tipo_demanda': 'Audiência', 'status': 'Cancelada', 'valor_receber': 10.0,
+            })
+            load_charts(self.db, today=TODAY, cache_dir=self.cache_dir)
+            self.assertEqual(render.call_count, 2 * len(CHARTS))
+
+        self.assertEqual(list(self.cache_dir.glob('*.part')), [])
+
+    def test_prune_keeps_recent(self):
+        """Testa se a limpeza remove os PNGs usados há mais tempo"""
+        for index in range(5):
+            path = self.cache_dir / f'grafico-{index}.png'
+            path.write_bytes(PNG)
+            os.utime(path, (time.time() - 100 + index, time.time() - 100 + index))
+
+        prune_charts(self.cache_dir, 2)
+        self.assertEqual(sorted(p.name for p in self.cache_dir.iterdir()),
+                         ['grafico-3.png', 'grafico-4.png'])
+
+    @unittest.skipUnless(HAS_MATPLOTLIB, "matplotlib não instalado")
+    def test_render_png(self):
+        """Testa a renderização real com o backend Agg"""
+        data = chart_data(self.db, today=TODAY)
+        for name in CHARTS:
+            with self.subTest(chart=name):
+                png = load_chart(name, data[name], self.cache_dir)
+                self.assertTrue(png.startswith(b'\x89PNG'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes da linha de comando (operações em lote sem interface gráfica)
+"""
+
+import sys
+import os
+import contextlib
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Adicionar src ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import cli
+from database import DatabaseManager
+from test_startup import run_python
+
+CSV = (
+    'id;data_solicitacao;solicitante;tipo_demanda;valor_receber;status\n'
+    '1;10/01/2024;Ana;Audiência;1.234,50;\n'
+    '2;2024-02-03;Bruno;Cópia;99.5;Cumprida\n'
+)
+
+
+class TestCli(unittest.TestCase):
+    """Comandos executados por cli.main contra um banco temporário"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name)
+        self.db_path = self.path / 'cli.db'
+        patcher = mock.patch.object(cli, 'setup_logging')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def run_cli(self, *argv):
+        """Executa a CLI e retorna (código de saída, saída padrão)"""
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            code = cli.main(['--banco', str(self.db_path), *argv])
+        return code, output.getvalue()
+
+    def import_csv(self):
+        source = self.path / 'entrada.csv'
+        source.write_text(CSV, encoding='utf-8')
+        return self.run_cli('import', str(source))
+
+    def test_import_and_stats(self):
+        """Testa a importação de CSV (datas e valores em pt-BR) e as estatísticas"""
+        code, output = self.import_csv()
+        self.assertEqual(code, 0)
+        self.assertIn('2 diligências importadas', output)
+
+        code, output = self.run_cli('stats', '--json')
+        stats = json.loads(output)['diligencias']
+        self.assertEqual((stats['total'], stats['pendentes'], stats['cumpridas']), (2, 1, 1))
+        self.assertEqual(stats['faturamento_total'], 1334.0)
+
+    def test_invalid_row_rolls_back(self):
+        """Testa se uma linha inválida desfaz a importação inteira"""
+        source = self.path / 'invalido.csv'
+        source.write_text(CSV + '3;31/02/2024;Carla;Audiência;10;\n', encoding='utf-8')
+        code, _ = self.run_cli('import', str(source))
+        self.assertEqual(code, 1)
+
+        db = DatabaseManager(self.db_path, auto_backup=False)
+        try:
+            self.assertEqual(db.count_diligencias(), 0)
+        finally:
+            db.close()
+
+    def test_export_round_trip(self):
+        """Testa se o CSV exportado é importado de volta"""
+        self.import_csv()
+        target = self.path / 'saida.csv'
+        code, output = self.run_cli('export', str(target))
+        self.assertEqual(code, 0)
+        self.assertIn('2 diligências exportadas', output)
+
+        code, _ = self.run_cli('import', str(target))
+        self.assertEqual(code, 0)
+        _, output = self.run_cli('stats', '--json')
+        self.assertEqual(json.loads(output)['diligencias']['faturamento_total'], 2668.0)
+
+    def test_report(self):
+        """Testa o relatório por período em JSON"""
+        self.import_csv()
+        code, output = self.run_cli('report', '--tipo', 'mensal',
+                                    '--de', '01/01/2024', '--ate', '31/03/2024', '--json')
+        self.assertEqual(code, 0)
+        periods = json.loads(output)
+        self.assertEqual([p['inicio'] for p in periods], ['2024-01-01', '2024-02-01', '2024-03-01'])
+        self.assertEqual([p['total'] for p in periods], [1, 1, 0])
+
+    def test_vacuum_and_backup(self):
+        """Testa a compactação e o backup online"""
+        self.import_csv()
+        code, _ = self.run_cli('vacuum')
+        self.assertEqual(code, 0)
+
+        backups_dir = self.path / 'backups'
+        backups_dir.mkdir()
+        with mock.patch.multiple('config', BACKUPS_DIR=backups_dir, BACKUP_STEP_DELAY=0):
+            code, _ = self.run_cli('backup')
+        self.assertEqual(code, 0)
+        self.assertEqual(len(list(backups_dir.glob('diligencias_backup_*.db'))), 1)
+
+    def test_diagnostics(self):
+        """Testa o diagnóstico em JSON do próprio processo"""
+        self.import_csv()
+        code, output = self.run_cli('diagnostics', '--json', '--servidor', '')
+        self.assertEqual(code, 0)
+        report = json.loads(output)
+        self.assertEqual(report['banco']['arquivo'], str(self.db_path))
+        self.assertIn('consultas', report)
+
+    def test_remote_diagnostics_skips_local_database(self):
+        """Testa se o diagnóstico de um servidor não abre (nem cria) o banco local"""
+        with mock.patch('client.RemoteDatabase.diagnostics', return_value={}) as remote, \
+                mock.patch('cli.DatabaseManager') as manager, \
+                contextlib.redirect_stdout(io.StringIO()):
+            code = cli.main(['--banco', str(self.db_path), 'diagnostics', '--json',
+                             '--servidor', 'http://127.0.0.1:8765'])
+        self.assertEqual(code, 0)
+        remote.assert_called_once_with()
+        manager.assert_not_called()
+        self.assertFalse(self.db_path.exists())
+
+    def test_unsupported_format(self):
+        """Testa a recusa de formatos de arquivo desconhecidos"""
+        code, _ = self.run_cli('export', str(self.path / 'saida.txt'))
+        self.assertEqual(code, 1)
+
+
+class TestHeadless(unittest.TestCase):
+    """A CLI não deve carregar a interface nem bibliotecas pesadas"""
+
+    def test_no_gui_imports(self):
+        """Testa se um comando via main.main não importa tkinter, pandas ou matplotlib"""
+        code = '''
+import os, sys, tempfile
+import main
+path = os.path.join(tempfile.mkdtemp(), 'cli.db')
+assert main.main(['--banco', path, 'stats']) == 0
+assert main.main(['--banco', path, 'report', '--json']) == 0
+loaded = {name.split('.')[0] for name in sys.modules}
+print(sorted(loaded & {'tkinter', '_tkinter', 'pandas', 'matplotlib', 'openpyxl', 'numpy', 'PIL'}))
+'''
+        result = run_python(code)
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+        self.assertEqual(result.stdout.strip().splitlines()[-1], '[]')
+
+
+if __name__ == "__main__":
+    unittest.main()
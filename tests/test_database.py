@@ -0,0 +1,896 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes da camada de banco de dados
+"""
+
+import sys
+import os
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Adicionar src ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import config
+from database import DatabaseManager, SORT_KEYS, listing_key
+from utils import backup_database, backup_database_async, backup_is_due
+from helpers import nova_diligencia
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """Base que cria um banco temporário por teste"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.tmp_dir.name) / 'teste.db'
+        # Backups e poda ficam no diretório temporário, nunca no do usuário
+        self.backups_dir = Path(self.tmp_dir.name) / 'backups'
+        self.backups_dir.mkdir()
+        self.db = DatabaseManager(self.db_path, backups_dir=self.backups_dir)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp_dir.cleanup()
+
+
+class TestConnectionPool(DatabaseTestCase):
+    """Testes do pool de conexões"""
+
+    def test_pragmas(self):
+        """Testa se as conexões abrem com WAL e pragmas ajustados"""
+        with self.db.pool.reader() as conn:
+            self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+            self.assertEqual(conn.execute('PRAGMA synchronous').fetchone()[0], 1)  # NORMAL
+            self.assertEqual(conn.execute('PRAGMA temp_store').fetchone()[0], 2)  # MEMORY
+
+    def test_readers_reused(self):
+        """Testa se leitores devolvidos ao pool são reutilizados"""
+        with self.db.pool.reader() as first:
+            pass
+        with self.db.pool.reader() as second:
+            self.assertIs(first, second)
+
+    def test_reader_not_blocked_by_writer(self):
+        """Testa se leituras prosseguem durante uma transação de escrita"""
+        self.db.insert_diligencia(nova_diligencia())
+
+        with self.db.pool.writer() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute("UPDATE diligencias SET solicitante = 'Outro'")
+
+            result = []
+            reader = threading.Thread(
+                target=lambda: result.extend(self.db.get_all_diligencias())
+            )
+            reader.start()
+            reader.join(timeout=5)
+            conn.execute('COMMIT')
+
+        self.assertFalse(reader.is_alive())
+        self.assertEqual(result[0]['solicitante'], 'Teste')
+
+    def test_str_path(self):
+        """Testa se o caminho do banco pode ser informado como texto"""
+        db = DatabaseManager(str(Path(self.tmp_dir.name) / 'outro.db'))
+        try:
+            self.assertIsNotNone(db.insert_diligencia(nova_diligencia()))
+        finally:
+            db.close()
+
+
+class TestMigrations(DatabaseTestCase):
+    """Testes das migrações de esquema"""
+
+    def user_version(self):
+        with self.db.pool.reader() as conn:
+            return conn.execute('PRAGMA user_version').fetchone()[0]
+
+    def test_new_database_fully_migrated(self):
+        """Testa se um banco novo fica na última versão"""
+        self.assertEqual(self.user_version(), len(self.db._migrations()))
+
+    def test_reopen_skips_migrations_and_backup(self):
+        """Testa se reabrir um banco atualizado não migra nem copia"""
+        self.db.close()
+        with mock.patch.object(DatabaseManager, '_migrate') as migrate, \
+                mock.patch('database.backup_is_due', return_value=False), \
+                mock.patch('database.backup_database') as backup:
+            self.db = DatabaseManager(self.db_path, backups_dir=self.backups_dir)
+        migrate.assert_called_once_with(len(self.db._migrations()))
+        backup.assert_not_called()
+
+    def test_pending_migrations_from_legacy_database(self):
+        """Testa se um banco sem versão recebe backup e todas as migrações"""
+        self.db.insert_diligencia(nova_diligencia())
+        with self.db.pool.writer() as conn:
+            conn.execute('PRAGMA user_version = 0')
+        self.db.close()
+
+        with mock.patch('database.backup_database') as backup:
+            self.db = DatabaseManager(self.db_path, backups_dir=self.backups_dir)
+        backup.assert_called_once_with(str(self.db_path), backups_dir=self.backups_dir)
+        self.assertEqual(self.user_version(), len(self.db._migrations()))
+        self.assertEqual(self.db.count_diligencias(), 1)
+
+    def test_text_values_normalized(self):
+        """Testa se valores gravados como texto passam a REAL na migração"""
+        ids = [self.db.insert_diligencia(nova_diligencia(valor_receber=valor))
+               for valor in ('150,00', 'R$ 1.234,50', '1.5', 'abc')]
+        with self.db.pool.writer() as conn:
+            conn.execute(f'PRAGMA user_version = {len(self.db._migrations()) - 1}')
+        self.db.close()
+
+        with mock.patch('database.backup_database'), \
+                self.assertLogs('database', 'WARNING') as logs:
+            self.db = DatabaseManager(self.db_path, backups_dir=self.backups_dir)
+        values = [self.db.get_diligencia(i).valor_receber for i in ids]
+        self.assertEqual(values, [150.0, 1234.5, 1.5, None])
+        self.assertIn("'abc'", logs.output[0])
+
+        # Sem texto na coluna, as chaves da grade são todas comparáveis
+        keys = [listing_key(row, 'valor_receber') for row in
+                self.db.get_diligencias_page(sort='valor_receber')]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+
+    def test_periodic_backup_when_due(self):
+        """Testa se o backup periódico roda em segundo plano quando vencido"""
+        self.db.close()
+        with mock.patch('database.backup_is_due', return_value=True), \
+                mock.patch('database.backup_database_async') as backup:
+            self.db = DatabaseManager(self.db_path, backups_dir=self.backups_dir)
+        backup.assert_called_once_with(str(self.db_path), backups_dir=self.backups_dir)
+
+
+class TestBulkWrites(DatabaseTestCase):
+    """Testes das operações em lote"""
+
+    def test_insert_many_returns_ids(self):
+        """Testa se a inserção em lote retorna os ids gerados em ordem"""
+        records = [nova_diligencia(solicitante=f'Cliente {i}') for i in range(2500)]
+        ids = self.db.insert_diligencias_many(records, chunk_size=1000)
+
+        self.assertEqual(len(ids), 2500)
+        rows = self.db.execute_query('SELECT id, solicitante FROM diligencias', fetch=True)
+        by_id = {row['id']: row['solicitante'] for row in rows}
+        self.assertEqual(by_id[ids[0]], 'Cliente 0')
+        self.assertEqual(by_id[ids[-1]], 'Cliente 2499')
+
+    def test_insert_many_accepts_tuples(self):
+        """Testa inserção em lote a partir de tuplas ordenadas"""
+        row = ('2024-02-01', 'Tupla', None, 'Cópia', None, None,
+               'Pendente', None, None, 10.0, None)
+        ids = self.db.insert_diligencias_many([row, row])
+        self.assertEqual(len(ids), 2)
+
+    def test_insert_many_rolls_back_on_error(self):
+        """Testa se um erro no lote desfaz toda a transação"""
+        records = [nova_diligencia(), nova_diligencia(solicitante=None)]
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.db.insert_diligencias_many(records)
+        self.assertEqual(self.db.get_all_diligencias(), [])
+
+    def test_update_many(self):
+        """Testa atualização em lote"""
+        ids = self.db.insert_diligencias_many([nova_diligencia() for _ in range(3)])
+        updated = self.db.update_diligencias_many(
+            (i, nova_diligencia(status='Cumprida')) for i in ids
+        )
+        self.assertEqual(updated, 3)
+        statuses = {d['status'] for d in self.db.get_all_diligencias()}
+        self.assertEqual(statuses, {'Cumprida'})
+
+
+class TestPagination(DatabaseTestCase):
+    """Testes da listagem paginada por chave"""
+
+    def setUp(self):
+        super().setUp()
+        # Datas repetidas para exercitar o desempate por id
+        self.ids = self.db.insert_diligencias_many(
+            nova_diligencia(data_solicitacao=f'2024-01-{i % 10 + 1:02d}')
+            for i in range(50)
+        )
+        self.expected = [
+            row['id'] for row in self.db.execute_query(
+                'SELECT id FROM diligencias ORDER BY data_solicitacao DESC, id DESC',
+                fetch=True
+            )
+        ]
+
+    def test_first_page_columns(self):
+        """Testa se a página traz apenas as colunas da grade"""
+        page = self.db.get_diligencias_page(limit=10)
+        self.assertEqual(len(page), 10)
+        self.assertEqual(set(page[0].keys()), {
+            'id', 'data_solicitacao', 'solicitante', 'tipo_demanda', 'status', 'valor_receber'
+        })
+        self.assertEqual([row['id'] for row in page], self.expected[:10])
+
+    def test_walk_forward_and_back(self):
+        """Testa se after/before percorrem a ordem da grade sem lacunas"""
+        seen = []
+        page = self.db.get_diligencias_page(limit=7)
+        while page:
+            seen.extend(row['id'] for row in page)
+            last = page[-1]
+            page = self.db.get_diligencias_page(
+                limit=7, after=(last['data_solicitacao'], last['id'])
+            )
+        self.assertEqual(seen, self.expected)
+
+        anchor = self.db.get_diligencias_page(limit=30)[-1]
+        previous = self.db.get_diligencias_page(
+            limit=5, before=(anchor['data_solicitacao'], anchor['id'])
+        )
+        self.assertEqual([row['id'] for row in previous], self.expected[24:29])
+
+    def test_iter_in_chunks(self):
+        """Testa leitura em blocos na ordem da grade"""
+        chunks = list(self.db.iter_diligencias(chunk_size=20))
+        self.assertEqual([len(chunk) for chunk in chunks], [20, 20, 10])
+        self.assertEqual([row['id'] for chunk in chunks for row in chunk], self.expected)
+
+    def test_count(self):
+        """Testa contagem total de diligências"""
+        self.assertEqual(self.db.count_diligencias(), 50)
+
+
+class TestSortingAndFilters(DatabaseTestCase):
+    """Testes da listagem ordenada e filtrada no SQL"""
+
+    def setUp(self):
+        super().setUp()
+        self.db.insert_diligencias_many(
+            nova_diligencia(
+                data_solicitacao=f'2024-{i % 6 + 1:02d}-{i % 3 + 1:02d}',
+                solicitante=f'Solicitante {i % 7}',
+                tipo_demanda=('Audiência', 'Protocolo', 'Cópia')[i % 3],
+                status=('Pendente', 'Cumprida', 'Cancelada')[i % 4 % 3],
+                valor_receber=None if i % 9 == 0 else float(i % 5 * 100),
+            )
+            for i in range(60)
+        )
+        self.db.execute_query('UPDATE diligencias SET pago = id % 2')
+        self.rows = self.db.execute_query('SELECT * FROM diligencias', fetch=True)
+
+    def expected(self, sort, descending=True, predicate=lambda row: True):
+        rows = [row for row in self.rows if predicate(row)]
+        rows.sort(key=lambda row: listing_key(row, sort), reverse=descending)
+        return [row['id'] for row in rows]
+
+    def walk(self, limit=7, **options):
+        """Percorre a listagem inteira página a página"""
+        seen = []
+        page = self.db.get_diligencias_page(limit, **options)
+        while page:
+            seen.extend(row.id for row in page)
+            key = listing_key(page[-1], options.get('sort', 'data_solicitacao'))
+            page = self.db.get_diligencias_page(limit, after=key, **options)
+        return seen
+
+    def test_every_sort_and_direction(self):
+        """Testa cada ordenação, nos dois sentidos, com paginação por chave"""
+        for sort in SORT_KEYS:
+            for descending in (True, False):
+                with self.subTest(sort=sort, descending=descending):
+                    self.assertEqual(self.walk(sort=sort, descending=descending),
+                                     self.expected(sort, descending))
+
+    def test_previous_page(self):
+        """Testa before numa ordenação que não é a padrão"""
+        expected = self.expected('valor_receber', False)
+        anchor = self.db.get_diligencias_page(30, sort='valor_receber', descending=False)[-1]
+        previous = self.db.get_diligencias_page(
+            5, before=listing_key(anchor, 'valor_receber'),
+            sort='valor_receber', descending=False
+        )
+        self.assertEqual([row.id for row in previous], expected[24:29])
+
+    def test_combined_filters(self):
+        """Testa filtros combinados (vazios são ignorados)"""
+        filters = {
+            'status': 'Pendente', 'tipo_demanda': 'Audiência',
+            'data_inicio': '2024-02-01', 'data_fim': '2024-05-31',
+            'pago': 1, 'valor_min': 100, 'valor_max': 300,
+        }
+
+        def matches(row):
+            return (row['status'] == 'Pendente' and row['tipo_demanda'] == 'Audiência'
+                    and '2024-02-01' <= row['data_solicitacao'] <= '2024-05-31'
+                    and row['pago'] == 1 and 100 <= (row['valor_receber'] or 0) <= 300)
+
+        for sort in ('data_solicitacao', 'solicitante'):
+            with self.subTest(sort=sort):
+                self.assertEqual(self.walk(3, filters=filters, sort=sort),
+                                 self.expected(sort, predicate=matches))
+
+        self.assertEqual(self.walk(filters={'status': 'Cancelada', 'pago': ''}),
+                         self.expected('data_solicitacao',
+                                       predicate=lambda row: row['status'] == 'Cancelada'))
+
+    def test_null_value_sorts_as_zero(self):
+        """Testa se valor NULL pagina como 0 na ordenação por valor"""
+        ids = self.walk(sort='valor_receber', filters={'valor_max': 0})
+        self.assertEqual(ids, self.expected(
+            'valor_receber', predicate=lambda row: not row['valor_receber']
+        ))
+        self.assertTrue(any(row['valor_receber'] is None for row in self.rows))
+
+    def test_search_with_filters(self):
+        """Testa a pesquisa textual restrita pelos filtros"""
+        rows = self.db.search('Solicitante 3', limit=100, filters={'status': 'Cumprida'})
+        self.assertTrue(rows)
+        self.assertTrue(all(row.status == 'Cumprida' for row in rows))
+        self.assertTrue(all(row.solicitante == 'Solicitante 3' for row in rows))
+
+    def test_invalid_options(self):
+        """Testa filtro ou ordenação desconhecidos"""
+        with self.assertRaises(ValueError):
+            self.db.get_diligencias_page(filters={'telefone_contato': '1'})
+        with self.assertRaises(ValueError):
+            self.db.get_diligencias_page(sort='observacoes')
+
+
+class TestIncrementalChanges(DatabaseTestCase):
+    """Testes da atualização incremental por watermark"""
+
+    def test_first_call_only_returns_watermark(self):
+        """Testa se a chamada sem watermark não devolve linhas"""
+        self.db.insert_diligencia(nova_diligencia())
+        changes = self.db.get_diligencias_changes()
+        self.assertEqual(changes['changed'], [])
+        self.assertEqual(changes['deleted'], [])
+        self.assertIsNotNone(changes['watermark'])
+
+    def test_changes_since_watermark(self):
+        """Testa se alterações e exclusões aparecem após o watermark"""
+        ids = self.db.insert_diligencias_many([nova_diligencia() for _ in range(3)])
+        watermark = self.db.get_diligencias_changes()['watermark']
+
+        self.db.update_diligencia(ids[0], nova_diligencia(status='Cumprida'))
+        self.db.delete_diligencia(ids[1])
+        novo = self.db.insert_diligencia(nova_diligencia())
+
+        changes = self.db.get_diligencias_changes(watermark)
+        # updated_at tem resolução de segundos: ids[2] pode ser reenviado
+        changed = {row['id'] for row in changes['changed']}
+        self.assertTrue({ids[0], novo} <= changed)
+        self.assertNotIn(ids[1], changed)
+        self.assertEqual(changes['deleted'], [ids[1]])
+
+        # Exclusões não são reenviadas no watermark seguinte
+        again = self.db.get_diligencias_changes(changes['watermark'])
+        self.assertEqual(again['deleted'], [])
+
+
+class TestSearch(DatabaseTestCase):
+    """Testes da pesquisa textual"""
+
+    def setUp(self):
+        super().setUp()
+        self.joao = self.db.insert_diligencia(nova_diligencia(
+            solicitante='João Conceição', numero_processo='0001234-56.2024.8.26.0100'
+        ))
+        self.maria = self.db.insert_diligencia(nova_diligencia(
+            solicitante='Maria Souza', local_realizacao='Fórum de Campinas',
+            observacoes='Levar cópia da procuração'
+        ))
+
+    def ids(self, text):
+        return [row['id'] for row in self.db.search(text)]
+
+    def test_accent_insensitive_prefix(self):
+        """Testa pesquisa por prefixo sem acentos"""
+        self.assertEqual(self.ids('joao concei'), [self.joao])
+        self.assertEqual(self.ids('forum camp'), [self.maria])
+        self.assertEqual(self.ids('procuracao'), [self.maria])
+
+    def test_process_number(self):
+        """Testa pesquisa por número de processo com pontuação"""
+        self.assertEqual(self.ids('0001234-56.2024'), [self.joao])
+
+    def test_index_follows_updates_and_deletes(self):
+        """Testa se os triggers mantêm o índice sincronizado"""
+        self.db.update_diligencia(self.joao, nova_diligencia(solicitante='Pedro Alves'))
+        self.assertEqual(self.ids('joao'), [])
+        self.assertEqual(self.ids('pedro'), [self.joao])
+
+        self.db.delete_diligencia(self.maria)
+        self.assertEqual(self.ids('maria'), [])
+
+    def test_pagination_and_empty_text(self):
+        """Testa paginação dos resultados e texto vazio"""
+        self.db.insert_diligencias_many(
+            nova_diligencia(solicitante=f'Cliente {i}') for i in range(5)
+        )
+        first = self.ids('cliente')
+        self.assertEqual(len(first), 5)
+        page = self.db.search('cliente', limit=2, offset=2)
+        self.assertEqual([row['id'] for row in page], first[2:4])
+        self.assertEqual(self.db.search('  '), [])
+
+    def test_existing_rows_indexed(self):
+        """Testa se um banco sem índice é indexado na abertura"""
+        with self.db.pool.writer() as conn:
+            conn.execute('DROP TABLE diligencias_fts')
+            conn.execute('DROP TRIGGER diligencias_fts_insert')
+            conn.execute('DROP TRIGGER diligencias_fts_delete')
+            conn.execute('DROP TRIGGER diligencias_fts_update')
+            conn.execute('PRAGMA user_version = 2')
+        self.db.close()
+
+        self.db = DatabaseManager(self.db_path, backups_dir=self.backups_dir)
+        self.assertEqual(len(list(self.backups_dir.glob('diligencias_backup_*.db'))), 1)
+        self.assertTrue(self.db.fts_available)
+        self.assertEqual(self.ids('maria'), [self.maria])
+
+
+class TestStatisticsSummary(DatabaseTestCase):
+    """Testes do resumo de estatísticas mantido por triggers"""
+
+    def insert_correspondente(self, valor, pago):
+        query = 'INSERT INTO correspondentes (nome_contratado, valor_cobrado, pago) VALUES (?, ?, ?)'
+        return self.db.execute_query(query, ('Corresp', valor, pago))
+
+    def assert_matches_rebuild(self):
+        """O resumo incremental deve igualar o recálculo completo"""
+        incremental = self.db.get_statistics()
+        self.assertTrue(self.db.rebuild_statistics())
+        rebuilt = self.db.get_statistics()
+        for table in ('diligencias', 'correspondentes'):
+            for key, value in rebuilt[table].items():
+                self.assertAlmostEqual(incremental[table][key], value, msg=f'{table}.{key}')
+        return rebuilt
+
+    def test_incremental_updates(self):
+        """Testa o resumo após inserções, alterações e exclusões"""
+        ids = self.db.insert_diligencias_many([
+            nova_diligencia(valor_receber=100.0),
+            nova_diligencia(valor_receber=50.0, status='Cumprida'),
+            nova_diligencia(valor_receber=25.0),
+        ])
+        self.db.execute_query('UPDATE diligencias SET pago = 1 WHERE id = ?', (ids[1],))
+        self.db.update_diligencia(ids[0], nova_diligencia(status='Cancelada', valor_receber=80.0))
+        self.db.delete_diligencia(ids[2])
+
+        corresp = self.insert_correspondente(30.0, 0)
+        self.insert_correspondente(20.0, 1)
+        self.db.execute_query('UPDATE correspondentes SET pago = 1 WHERE id = ?', (corresp,))
+
+        stats = self.assert_matches_rebuild()
+        self.assertEqual(stats['diligencias']['total'], 2)
+        self.assertEqual(stats['diligencias']['canceladas'], 1)
+        self.assertEqual(stats['diligencias']['cumpridas'], 1)
+        self.assertAlmostEqual(stats['diligencias']['faturamento_total'], 130.0)
+        self.assertAlmostEqual(stats['diligencias']['recebido'], 50.0)
+        self.assertAlmostEqual(stats['diligencias']['a_receber'], 80.0)
+        self.assertAlmostEqual(stats['correspondentes']['pago'], 50.0)
+        self.assertAlmostEqual(stats['correspondentes']['a_pagar'], 0.0)
+        self.assertEqual(self.db.count_diligencias(), 2)
+
+    def test_rebuild_repairs_drift(self):
+        """Testa se o recálculo corrige um resumo inconsistente"""
+        self.db.insert_diligencia(nova_diligencia())
+        self.db.execute_query('UPDATE estatisticas_resumo SET dilig_total = 99')
+        self.assertTrue(self.db.rebuild_statistics())
+        self.assertEqual(self.db.get_statistics()['diligencias']['total'], 1)
+
+    def test_existing_database_summarised(self):
+        """Testa se um banco sem resumo é calculado na abertura"""
+        self.db.insert_diligencia(nova_diligencia())
+        with self.db.pool.writer() as conn:
+            conn.execute('DROP TABLE estatisticas_resumo')
+            for table in ('diligencias', 'correspondentes'):
+                for event in ('insert', 'delete', 'update'):
+                    conn.execute(f'DROP TRIGGER {table}_stats_{event}')
+            conn.execute('PRAGMA user_version = 3')
+        self.db.close()
+
+        self.db = DatabaseManager(self.db_path, backups_dir=self.backups_dir)
+        self.assertEqual(len(list(self.backups_dir.glob('diligencias_backup_*.db'))), 1)
+        self.assertEqual(self.db.get_statistics()['diligencias']['total'], 1)
+
+
+class TestRecordCache(DatabaseTestCase):
+    """Testes do cache de registros (get_diligencia)"""
+
+    def count_queries(self):
+        """Conta as consultas feitas pelos leitores durante o bloco"""
+        return mock.patch.object(self.db, 'fetch_records', wraps=self.db.fetch_records)
+
+    def test_repeated_lookup_hits_cache(self):
+        """Testa se a segunda leitura não consulta o banco"""
+        diligencia_id = self.db.insert_diligencia(nova_diligencia())
+        with self.count_queries() as fetch:
+            first = self.db.get_diligencia(diligencia_id)
+            second = self.db.get_diligencia(diligencia_id)
+        self.assertIs(first, second)
+        self.assertEqual(fetch.call_count, 1)
+
+    def test_get_all_fills_cache(self):
+        """Testa se a listagem completa alimenta o cache"""
+        ids = self.db.insert_diligencias_many([nova_diligencia() for _ in range(3)])
+        self.db.get_all_diligencias()
+        with self.count_queries() as fetch:
+            for diligencia_id in ids:
+                self.assertEqual(self.db.get_diligencia(diligencia_id).id, diligencia_id)
+        self.assertEqual(fetch.call_count, 0)
+
+    def test_writes_invalidate(self):
+        """Testa se alterações e exclusões invalidam o registro em cache"""
+        ids = self.db.insert_diligencias_many([nova_diligencia() for _ in range(3)])
+        self.db.get_diligencia(ids[0])
+        self.db.update_diligencia(ids[0], nova_diligencia(solicitante='Alterado'))
+        self.assertEqual(self.db.get_diligencia(ids[0]).solicitante, 'Alterado')
+
+        self.db.get_diligencia(ids[1])
+        self.db.update_diligencias_many([(ids[1], nova_diligencia(status='Cumprida'))])
+        self.assertEqual(self.db.get_diligencia(ids[1]).status, 'Cumprida')
+
+        self.db.get_diligencia(ids[2])
+        self.db.execute_query('UPDATE diligencias SET pago = 1')
+        self.assertEqual(self.db.get_diligencia(ids[2]).pago, 1)
+
+        self.db.delete_diligencia(ids[2])
+        self.assertIsNone(self.db.get_diligencia(ids[2]))
+
+    def test_external_change_detected(self):
+        """Testa se gravações de outro processo esvaziam o cache"""
+        diligencia_id = self.db.insert_diligencia(nova_diligencia())
+        self.db.get_diligencia(diligencia_id)
+
+        other = sqlite3.connect(self.db_path)
+        with other:
+            other.execute("UPDATE diligencias SET status = 'Cancelada' WHERE id = ?",
+                          (diligencia_id,))
+        other.close()
+
+        self.assertEqual(self.db.get_diligencia(diligencia_id).status, 'Cancelada')
+
+    def test_stale_read_not_cached(self):
+        """Testa se uma leitura concorrente a uma escrita não entra no cache"""
+        diligencia_id = self.db.insert_diligencia(nova_diligencia())
+        fetch_records = self.db.fetch_records
+
+        def slow_fetch(*args, **kwargs):
+            # A escrita termina entre a consulta e a gravação no cache
+            records = fetch_records(*args, **kwargs)
+            self.db.update_diligencia(diligencia_id, nova_diligencia(status='Cumprida'))
+            return records
+
+        with mock.patch.object(self.db, 'fetch_records', side_effect=slow_fetch):
+            self.assertEqual(self.db.get_diligencia(diligencia_id).status, 'Pendente')
+        self.assertEqual(self.db.get_diligencia(diligencia_id).status, 'Cumprida')
+
+    def test_busy_writer_bypasses_cache(self):
+        """Testa se o cache é ignorado quando não dá para validá-lo"""
+        diligencia_id = self.db.insert_diligencia(nova_diligencia())
+        self.db.get_diligencia(diligencia_id)
+
+        def lookup(result):
+            result.append(self.db.get_diligencia(diligencia_id))
+
+        result = []
+        with self.db.pool.writer():
+            # Outra thread não consegue o escritor para ler data_version
+            with self.count_queries() as fetch:
+                thread = threading.Thread(target=lookup, args=(result,))
+                thread.start()
+                thread.join()
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(result[0].id, diligencia_id)
+
+
+class TestCorrespondentes(DatabaseTestCase):
+    """Testes do cadastro de correspondentes e da rentabilidade por diligência"""
+
+    def novo_correspondente(self, diligencia_id, valor, **overrides):
+        data = {'nome_contratado': 'Correspondente', 'valor_cobrado': valor,
+                'diligencia_id': diligencia_id}
+        data.update(overrides)
+        return self.db.insert_correspondente(data)
+
+    def test_crud(self):
+        """Testa inserção, leitura, alteração e exclusão"""
+        diligencia_id = self.db.insert_diligencia(nova_diligencia())
+        correspondente_id = self.novo_correspondente(diligencia_id, 40.0, telefone='11999990000')
+
+        correspondente = self.db.get_correspondente(correspondente_id)
+        self.assertEqual(correspondente.nome_contratado, 'Correspondente')
+        self.assertEqual(correspondente.pago, 0)
+
+        self.db.update_correspondente(correspondente_id, {
+            'nome_contratado': 'Outro', 'valor_cobrado': 55.0, 'pago': 1,
+            'diligencia_id': diligencia_id,
+        })
+        correspondente = self.db.get_correspondente(correspondente_id)
+        self.assertEqual((correspondente.nome_contratado, correspondente.valor_cobrado,
+                          correspondente.pago, correspondente.telefone),
+                         ('Outro', 55.0, 1, None))
+
+        self.db.delete_correspondente(correspondente_id)
+        self.assertIsNone(self.db.get_correspondente(correspondente_id))
+
+    def test_pages(self):
+        """Testa a paginação por id, o filtro por diligência e o solicitante"""
+        first = self.db.insert_diligencia(nova_diligencia(solicitante='Primeira'))
+        second = self.db.insert_diligencia(nova_diligencia(solicitante='Segunda'))
+        ids = [self.novo_correspondente(first if i % 2 else second, 10.0) for i in range(5)]
+
+        page = self.db.get_correspondentes_page(limit=3)
+        self.assertEqual([row.id for row in page], ids[:1:-1])
+        rest = self.db.get_correspondentes_page(limit=3, after=page[-1].id)
+        self.assertEqual([row.id for row in rest], ids[1::-1])
+
+        linked = self.db.get_correspondentes_page(diligencia_id=first)
+        self.assertEqual([row.id for row in linked], [ids[3], ids[1]])
+        self.assertEqual({row.solicitante for row in linked}, {'Primeira'})
+
+    def test_margins(self):
+        """Testa valor_receber menos o total cobrado, com e sem correspondentes"""
+        with_costs = self.db.insert_diligencia(nova_diligencia(data_solicitacao='2024-02-01'))
+        without = self.db.insert_diligencia(nova_diligencia(valor_receber=None))
+        self.novo_correspondente(with_costs, 30.0)
+        self.novo_correspondente(with_costs, 25.5)
+
+        rows = {row.id: row for row in self.db.get_margins_page()}
+        self.assertEqual((rows[with_costs].correspondentes, rows[with_costs].custos,
+                          rows[with_costs].margem), (2, 55.5, 44.5))
+        self.assertEqual((rows[without].correspondentes, rows[without].custos,
+                          rows[without].margem), (0, 0.0, 0.0))
+
+    def test_margin_pagination_single_query(self):
+        """Testa a paginação por chave, com uma consulta por página"""
+        ids = self.db.insert_diligencias_many(
+            nova_diligencia(data_solicitacao=f'2024-01-{1 + i % 3:02d}') for i in range(7)
+        )
+        for diligencia_id in ids:
+            self.novo_correspondente(diligencia_id, 10.0)
+            self.novo_correspondente(diligencia_id, 5.0)
+
+        seen, after = [], None
+        with mock.patch.object(self.db, 'fetch_records', wraps=self.db.fetch_records) as fetch:
+            while True:
+                page = self.db.get_margins_page(limit=3, after=after)
+                if not page:
+                    break
+                seen.extend(page)
+                after = listing_key(page[-1])
+        self.assertEqual(fetch.call_count, 4)
+
+        self.assertEqual(sorted(row.id for row in seen), ids)
+        keys = [listing_key(row) for row in seen]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+        self.assertTrue(all(row.margem == 85.0 for row in seen))
+
+
+class TestWriteCoordination(DatabaseTestCase):
+    """Escritas com outra instância segurando o lock do mesmo arquivo"""
+
+    def hold_lock(self):
+        """Conexão externa com o lock de escrita (como outro processo)"""
+        other = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        other.execute('BEGIN IMMEDIATE')
+        self.addCleanup(other.close)
+        # Espera curta do SQLite: o teste exercita as novas tentativas
+        with self.db.pool.writer() as conn:
+            conn.execute('PRAGMA busy_timeout=10')
+        return other
+
+    def test_busy_timeout(self):
+        """Testa se as conexões abrem com o busy_timeout configurado"""
+        with self.db.pool.reader() as conn:
+            timeout = conn.execute('PRAGMA busy_timeout').fetchone()[0]
+        self.assertEqual(timeout, config.DB_BUSY_TIMEOUT_MS)
+
+    def test_retry_until_released(self):
+        """Testa se a escrita espera o lock ser liberado, sem erro"""
+        other = self.hold_lock()
+        threading.Timer(0.2, other.execute, ('COMMIT',)).start()
+
+        with mock.patch.multiple('database', DB_WRITE_RETRIES=20, DB_RETRY_BASE_DELAY=0.02):
+            diligencia_id = self.db.insert_diligencia(nova_diligencia())
+
+        self.assertIsNotNone(self.db.get_diligencia(diligencia_id))
+        metrics = self.db.lock_metrics()
+        self.assertGreater(metrics['novas_tentativas'], 0)
+        self.assertGreaterEqual(metrics['espera_max_ms'], 150)
+        self.assertEqual(metrics['falhas'], 0)
+
+    def test_gives_up(self):
+        """Testa se, com o lock nunca liberado, o erro chega após as tentativas"""
+        self.hold_lock()
+        with mock.patch.multiple('database', DB_WRITE_RETRIES=2, DB_RETRY_BASE_DELAY=0.001):
+            with self.assertLogs('database', 'ERROR'):
+                with self.assertRaises(sqlite3.OperationalError):
+                    self.db.insert_diligencia(nova_diligencia())
+
+        metrics = self.db.lock_metrics()
+        self.assertEqual((metrics['falhas'], metrics['novas_tentativas']), (1, 2))
+        self.assertEqual(self.db.count_diligencias(), 0)
+
+    def test_failed_commit(self):
+        """Testa se um COMMIT recusado não deixa a conexão de escrita presa"""
+        with self.db.pool.writer() as conn:
+            conn.execute('PRAGMA foreign_keys=ON')
+
+        with self.assertRaises(sqlite3.IntegrityError):
+            with self.db.transaction() as conn:
+                # Violação adiada: só o COMMIT a detecta
+                conn.execute('PRAGMA defer_foreign_keys=ON')
+                conn.execute("INSERT INTO correspondentes (nome_contratado, diligencia_id) "
+                             "VALUES ('Órfão', 999)")
+
+        diligencia_id = self.db.insert_diligencia(nova_diligencia())
+        self.assertIsNotNone(self.db.get_diligencia(diligencia_id))
+        self.assertEqual(self.db.get_correspondentes_page(), [])
+
+    def test_concurrent_processes(self):
+        """Testa várias instâncias abrindo e gravando o mesmo arquivo novo"""
+        shared = Path(self.tmp_dir.name) / 'compartilhado.db'
+        src_dir = os.path.join(os.path.dirname(__file__), '..', 'src')
+        code = f'''
+import sys
+sys.path.insert(0, {src_dir!r})
+from database import DatabaseManager
+db = DatabaseManager({str(shared)!r}, auto_backup=False)
+for i in range(100):
+    db.insert_diligencia({{'data_solicitacao': '2024-01-01', 'solicitante': 'P', 'tipo_demanda': 'Cópia'}})
+print(db.lock_metrics()['falhas'])
+'''
+        with tempfile.TemporaryDirectory() as home:
+            env = dict(os.environ, HOME=home, APPDATA=home)
+            processes = [
+                subprocess.Popen([sys.executable, '-c', code], env=env, text=True,
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                for _ in range(4)
+            ]
+            results = [process.communicate(timeout=60) for process in processes]
+
+        for process, (stdout, stderr) in zip(processes, results):
+            self.assertEqual(process.returncode, 0, stderr[-2000:])
+            self.assertEqual(stdout.strip(), '0')
+
+        db = DatabaseManager(shared, backups_dir=self.backups_dir)
+        try:
+            self.assertEqual(db.count_diligencias(), 400)
+            self.assertEqual(db.get_statistics()['diligencias']['total'], 400)
+        finally:
+            db.close()
+
+
+class TestQueryDiagnostics(DatabaseTestCase):
+    """Tempo por consulta, log de consultas lentas e diagnóstico"""
+
+    def test_timing(self):
+        """Testa se leituras e escritas entram nas estatísticas por consulta"""
+        for _ in range(3):
+            self.db.insert_diligencia(nova_diligencia())
+        self.db.get_diligencias_page(limit=2)
+        self.db.count_diligencias()
+
+        rows = {row['consulta']: row for row in self.db.diagnostics()['consultas']}
+        insert = next(row for key, row in rows.items() if key.startswith('INSERT INTO diligencias'))
+        self.assertEqual((insert['execucoes'], insert['linhas']), (3, 3))
+        page = next(row for key, row in rows.items() if 'LIMIT ?' in key and 'diligencias' in key)
+        self.assertEqual(page['linhas'], 2)
+
+    def test_slow_query_log(self):
+        """Testa o log das lentas, com o plano só na primeira de cada consulta"""
+        self.db.query_stats.slow_ms = 0
+        with self.assertLogs('database.lentas', 'WARNING') as logs:
+            self.db.get_diligencias_page(limit=5)
+            self.db.get_diligencias_page(limit=5)
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn('Consulta lenta', logs.output[0])
+        self.assertGreater(logs.output[0].count('\n'), logs.output[1].count('\n'))
+
+        page = next(row for row in self.db.diagnostics()['consultas'] if row['lentas'] == 2)
+        self.assertTrue(page['plano'])
+
+    def test_diagnostics_and_reset(self):
+        """Testa o resumo do arquivo e o zeramento"""
+        self.db.insert_diligencia(nova_diligencia())
+        report = self.db.diagnostics()
+        self.assertEqual(report['banco']['user_version'], len(self.db._migrations()))
+        self.assertGreater(report['banco']['page_count'], 0)
+        self.assertGreater(report['escritas']['escritas'], 0)
+
+        self.db.reset_diagnostics()
+        report = self.db.diagnostics()
+        self.assertEqual(report['escritas']['escritas'], 0)
+        self.assertEqual(report['consultas'], [])
+
+
+class TestOnlineBackup(DatabaseTestCase):
+    """Testes do backup online"""
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.multiple(
+            'config', BACKUPS_DIR=self.backups_dir, BACKUP_PAGES_PER_STEP=4,
+            BACKUP_STEP_DELAY=0
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def backups(self):
+        return sorted(self.backups_dir.glob('diligencias_backup_*.db'))
+
+    def test_backup_consistent_during_writes(self):
+        """Testa se o backup copia um snapshot enquanto há escritas"""
+        self.db.insert_diligencias_many(
+            nova_diligencia(observacoes='x' * 500) for _ in range(500)
+        )
+        steps = []
+
+        def progress(copied, total):
+            steps.append((copied, total))
+            self.db.insert_diligencia(nova_diligencia())
+
+        self.assertTrue(backup_database(str(self.db_path), progress=progress))
+        self.assertGreater(len(steps), 1)
+        self.assertEqual(steps[-1][0], steps[-1][1])
+
+        [backup] = self.backups()
+        conn = sqlite3.connect(str(backup))
+        try:
+            count = conn.execute('SELECT COUNT(*) FROM diligencias').fetchone()[0]
+        finally:
+            conn.close()
+        self.assertEqual(count, 500)
+        self.assertEqual(list(self.backups_dir.glob('*.part')), [])
+
+    def test_prunes_to_max_backups(self):
+        """Testa se apenas MAX_BACKUPS arquivos são mantidos"""
+        for day in range(1, 5):
+            (self.backups_dir / f'diligencias_backup_2000010{day}_000000.db').touch()
+
+        with mock.patch('config.MAX_BACKUPS', 3):
+            self.assertTrue(backup_database(str(self.db_path)))
+
+        names = [path.name for path in self.backups()]
+        self.assertEqual(len(names), 3)
+        self.assertNotIn('diligencias_backup_20000101_000000.db', names)
+        self.assertNotIn('diligencias_backup_20000102_000000.db', names)
+
+    def test_prunes_only_given_directory(self):
+        """Testa se um backup em outro diretório não poda os backups padrão"""
+        (self.backups_dir / 'diligencias_backup_20000101_000000.db').touch()
+        other_dir = Path(self.tmp_dir.name) / 'outros'
+        other_dir.mkdir()
+
+        with mock.patch('config.MAX_BACKUPS', 1):
+            self.assertTrue(backup_database(str(self.db_path), backups_dir=other_dir))
+
+        self.assertEqual(len(list(other_dir.glob('diligencias_backup_*.db'))), 1)
+        self.assertEqual([path.name for path in self.backups()],
+                         ['diligencias_backup_20000101_000000.db'])
+
+    def test_async_backup(self):
+        """Testa backup em thread com callback de conclusão"""
+        results = []
+        thread = backup_database_async(str(self.db_path), callback=results.append)
+        thread.join(timeout=10)
+        self.assertEqual(results, [True])
+
+    def test_backup_is_due(self):
+        """Testa a verificação de frequência dos backups"""
+        self.assertTrue(backup_is_due(7))
+        self.assertTrue(backup_database(str(self.db_path)))
+        self.assertFalse(backup_is_due(7))
+        self.assertTrue(backup_is_due(0))
+
+    def test_missing_database(self):
+        """Testa backup de um arquivo inexistente"""
+        self.assertFalse(backup_database(str(Path(self.tmp_dir.name) / 'nada.db')))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,6 +6,7 @@ Testes de deploy e verificação do sistema
 
 import sys
 import os
+import shutil
 import tempfile
 import unittest
 from pathlib import Path
@@ -64,8 +65,11 @@ class TestDeploy(unittest.TestCase):
             with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
                 db_path = tmp.name
             
+            backups_dir = tempfile.mkdtemp()
+            
             try:
-                db = DatabaseManager(db_path)
+                # O arquivo vazio já existe: a migração faz backup antes de alterar
+                db = DatabaseManager(db_path, backups_dir=backups_dir)
                 
                 # Testar inserção básica
                 query = '''INSERT INTO diligencias 
@@ -86,6 +90,7 @@ class TestDeploy(unittest.TestCase):
                 # Limpar arquivo temporário
                 if os.path.exists(db_path):
                     os.unlink(db_path)
+                shutil.rmtree(backups_dir, ignore_errors=True)
                     
         except Exception as e:
             self.fail(f"Erro ao testar banco de dados: {e}")
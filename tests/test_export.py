@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes da exportação para Excel
+"""
+
+import sys
+import os
+import importlib.util
+import tempfile
+import threading
+import unittest
+from datetime import date
+from pathlib import Path
+
+# Adicionar src ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from config import EXCEL_DATE_FORMAT, EXCEL_CURRENCY_FORMAT
+from database import DatabaseManager
+from export import export_diligencias_excel
+
+
+@unittest.skipUnless(importlib.util.find_spec('openpyxl'), "openpyxl não instalado")
+class TestExcelExport(unittest.TestCase):
+    """Testes da exportação em fluxo contínuo"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp = Path(self.tmp_dir.name)
+        self.db = DatabaseManager(self.tmp / 'teste.db')
+        self.db.insert_diligencias_many(
+            {
+                'data_solicitacao': '2024-03-15',
+                'solicitante': f'Cliente {i}',
+                'tipo_demanda': 'Audiência',
+                'valor_receber': 150.0,
+            }
+            for i in range(250)
+        )
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp_dir.cleanup()
+
+    def test_export_formats_and_progress(self):
+        """Testa linhas exportadas, formatos de célula e progresso"""
+        from openpyxl import load_workbook
+
+        filename = self.tmp / 'saida.xlsx'
+        steps = []
+        exported = export_diligencias_excel(
+            self.db, filename, progress=lambda done, total: steps.append((done, total)),
+            chunk_size=100
+        )
+
+        self.assertEqual(exported, 250)
+        self.assertEqual(steps, [(100, 250), (200, 250), (250, 250)])
+
+        sheet = load_workbook(filename).active
+        header = [cell.value for cell in sheet[1]]
+        self.assertEqual(sheet.max_row, 251)
+
+        data_cell = sheet.cell(row=2, column=header.index('data_solicitacao') + 1)
+        self.assertEqual(data_cell.value.date(), date(2024, 3, 15))
+        self.assertEqual(data_cell.number_format, EXCEL_DATE_FORMAT)
+
+        valor_cell = sheet.cell(row=2, column=header.index('valor_receber') + 1)
+        self.assertEqual(valor_cell.value, 150.0)
+        self.assertEqual(valor_cell.number_format, EXCEL_CURRENCY_FORMAT)
+
+    def test_cancel_leaves_no_file(self):
+        """Testa se o cancelamento não deixa arquivo parcial"""
+        cancel_event = threading.Event()
+        cancel_event.set()
+        filename = self.tmp / 'cancelada.xlsx'
+
+        self.assertIsNone(export_diligencias_excel(self.db, filename, cancel_event=cancel_event))
+        self.assertEqual(list(self.tmp.glob('cancelada*')), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Regressão de planos de execução das consultas frequentes (EXPLAIN QUERY PLAN)
+"""
+
+import sys
+import os
+import re
+import tempfile
+import unittest
+from pathlib import Path
+
+# Adicionar src ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from config import PAGE_SIZE
+from database import DatabaseManager, QUERIES, SORT_KEYS, listing_query
+from synthetic import synthetic_diligencias
+from helpers import best_time, performance_test
+
+# Linhas da base sintética: o bastante para o planejador preferir índices
+SYNTHETIC_ROWS = 20000
+
+# Base do teste de desempenho da listagem filtrada e orçamento por página
+LISTING_ROWS = 500000
+LISTING_BUDGET = 0.1
+CORRESPONDENTE_ROWS = 60000
+
+# Combinações de filtros da barra de filtros da grade
+FILTER_SETS = (
+    {'status': 'Pendente'},
+    {'tipo_demanda': 'Tipo 3'},
+    {'status': 'Cancelada', 'tipo_demanda': 'Tipo 5'},
+    {'data_inicio': '2020-01-01', 'data_fim': '2020-03-31'},
+    {'pago': 1},
+    {'valor_min': 100, 'valor_max': 120},
+    {'status': 'Pendente', 'pago': 0, 'data_inicio': '2018-01-01'},
+    {'status': 'Cancelada', 'tipo_demanda': 'Tipo 5', 'data_inicio': '2019-06-01',
+     'data_fim': '2019-06-30', 'pago': 0, 'valor_min': 1000, 'valor_max': 3000},
+)
+
+# Percorrer uma tabela sem índice (SCAN tabela) ou ordenar em B-tree temporária
+FULL_SCAN = re.compile(r'^SCAN (\w+)$|^SCAN (\w+) \(~')
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+class TestQueryPlans(unittest.TestCase):
+    """Cada consulta de QUERIES deve usar índices, sem varredura nem ordenação temporária"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.db = DatabaseManager(Path(cls.tmp_dir.name) / 'planos.db')
+        ids = cls.db.insert_diligencias_many(synthetic_diligencias(SYNTHETIC_ROWS))
+        for diligencia_id in ids[::10]:
+            cls.db.delete_diligencia(diligencia_id)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db.close()
+        cls.tmp_dir.cleanup()
+
+    def assert_plans(self):
+        for name, query in QUERIES.items():
+            with self.subTest(query=name):
+                params = (1,) * query.count('?')
+                plan = self.db.explain(query, params)
+                for step in plan:
+                    self.assertIsNone(FULL_SCAN.match(step), f"{name}: {plan}")
+                    self.assertNotIn(TEMP_SORT, step, f"{name}: {plan}")
+
+    def test_plans_without_statistics(self):
+        """Testa os planos sem sqlite_stat1 (banco recém-criado)"""
+        self.assert_plans()
+
+    def test_plans_with_statistics(self):
+        """Testa os planos depois de ANALYZE (como após PRAGMA optimize)"""
+        with self.db.pool.writer() as conn:
+            conn.execute('ANALYZE')
+        try:
+            self.assert_plans()
+        finally:
+            with self.db.pool.writer() as conn:
+                conn.execute('DROP TABLE IF EXISTS sqlite_stat1')
+
+    def test_listing_plans(self):
+        """Testa as ordenações da grade e os filtros na ordem padrão"""
+        cases = [
+            ({}, sort, descending, after)
+            for sort in SORT_KEYS for descending in (True, False) for after in (False, True)
+        ]
+        cases += [
+            ({name: 'x'}, 'data_solicitacao', descending, False)
+            for name in ('status', 'tipo_demanda') for descending in (True, False)
+        ]
+        for filters, sort, descending, after in cases:
+            key = (1,) * len(SORT_KEYS[sort]) if after else None
+            query, params = listing_query(filters, sort, descending, key)
+            with self.subTest(filters=filters, sort=sort, descending=descending, after=after):
+                plan = self.db.explain(query, (*params, 1))
+                for step in plan:
+                    # Em id, percorrer a tabela já é percorrer a chave primária
+                    if sort != 'id':
+                        self.assertIsNone(FULL_SCAN.match(step), plan)
+                    self.assertNotIn(TEMP_SORT, step, plan)
+
+    def test_detects_full_scan(self):
+        """Testa se o critério reconhece uma varredura completa"""
+        plan = self.db.explain('SELECT * FROM diligencias WHERE telefone_contato = ?', (1,))
+        self.assertTrue(any(FULL_SCAN.match(step) for step in plan), plan)
+        plan = self.db.explain('SELECT * FROM diligencias ORDER BY telefone_contato')
+        self.assertTrue(any(TEMP_SORT in step for step in plan), plan)
+
+
+@performance_test
+class TestListingPerformance(unittest.TestCase):
+    """Páginas da listagem filtrada e da rentabilidade numa tabela de 500 mil linhas"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.db = DatabaseManager(Path(cls.tmp_dir.name) / 'listagem.db')
+        with cls.db.transaction() as conn:
+            conn.execute('''
+                WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+                INSERT INTO diligencias
+                    (data_solicitacao, solicitante, tipo_demanda, status, valor_receber, pago)
+                SELECT printf('20%02d-%02d-%02d', 15 + i % 10, 1 + i % 12, 1 + i % 28),
+                       'Solicitante ' || (i % 5000), 'Tipo ' || (i % 8),
+                       CASE WHEN i % 50 = 0 THEN 'Cancelada'
+                            WHEN i % 2 THEN 'Pendente' ELSE 'Cumprida' END,
+                       (i * 37) % 5000, (i / 3) % 2
+                FROM n
+            ''', (LISTING_ROWS - 1,))
+            # Dezenas de milhares de correspondentes, espalhados pelas diligências
+            conn.execute('''
+                WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+                INSERT INTO correspondentes (nome_contratado, valor_cobrado, pago, diligencia_id)
+                SELECT 'Correspondente ' || (i % 300), 50 + i % 200, i % 2, 1 + (i * 7919) % ?
+                FROM n
+            ''', (CORRESPONDENTE_ROWS - 1, LISTING_ROWS))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db.close()
+        cls.tmp_dir.cleanup()
+
+    def assert_fast(self, **options):
+        page = self.db.get_diligencias_page(**options)
+        elapsed = best_time(lambda: self.db.get_diligencias_page(**options))
+        self.assertLess(elapsed, LISTING_BUDGET, f"{elapsed * 1000:.1f} ms")
+        return page
+
+    def test_filtered_first_page(self):
+        """Testa cada combinação de filtros, nos dois sentidos da data"""
+        for filters in FILTER_SETS:
+            for descending in (True, False):
+                with self.subTest(filters=filters, descending=descending):
+                    self.assert_fast(filters=filters, descending=descending)
+
+    def test_sorted_first_page(self):
+        """Testa cada ordenação sem filtros"""
+        for sort in SORT_KEYS:
+            for descending in (True, False):
+                with self.subTest(sort=sort, descending=descending):
+                    page = self.assert_fast(sort=sort, descending=descending)
+                    self.assertEqual(len(page), PAGE_SIZE)
+
+    def test_margin_pages(self):
+        """Testa a rentabilidade por diligência, na primeira página e no meio da lista"""
+        first = self.db.get_margins_page()
+        self.assertEqual(len(first), PAGE_SIZE)
+        elapsed = best_time(lambda: self.db.get_margins_page())
+        self.assertLess(elapsed, LISTING_BUDGET, f"{elapsed * 1000:.1f} ms")
+
+        middle = ('2020-01-01', LISTING_ROWS // 2)
+        page = self.db.get_margins_page(after=middle)
+        self.assertEqual(len(page), PAGE_SIZE)
+        elapsed = best_time(lambda: self.db.get_margins_page(after=middle))
+        self.assertLess(elapsed, LISTING_BUDGET, f"{elapsed * 1000:.1f} ms")
+
+        # Conferência de uma linha com correspondentes contra a soma direta
+        row = next(row for row in page if row.correspondentes)
+        custos = self.db.execute_query(
+            'SELECT TOTAL(valor_cobrado) AS custos FROM correspondentes WHERE diligencia_id = ?',
+            (row.id,), fetch=True
+        )[0]['custos']
+        self.assertEqual(row.custos, custos)
+        self.assertEqual(row.margem, row.valor_receber - custos)
+
+
+if __name__ == "__main__":
+    unittest.main()
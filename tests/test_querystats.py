@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes das estatísticas de tempo por consulta
+"""
+
+import sys
+import os
+import threading
+import unittest
+
+# Adicionar src ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from querystats import QueryStats, fingerprint
+
+
+class TestFingerprint(unittest.TestCase):
+    """Variações da mesma consulta devem cair no mesmo grupo"""
+
+    def test_normalization(self):
+        """Testa espaços, literais e listas IN"""
+        self.assertEqual(
+            fingerprint("SELECT *  FROM diligencias\n WHERE status = 'Pendente' LIMIT 50"),
+            'SELECT * FROM diligencias WHERE status = ? LIMIT ?'
+        )
+        self.assertEqual(fingerprint('SELECT 1 WHERE id IN (?, ?, ?)'),
+                         fingerprint('SELECT 2 WHERE id IN (?,?)'))
+        self.assertEqual(fingerprint("SELECT 'it''s' FROM t2"), 'SELECT ? FROM t2')
+
+
+class TestQueryStats(unittest.TestCase):
+    """Acumuladores, percentis e consultas lentas"""
+
+    def test_percentiles(self):
+        """Testa p50/p95/p99 estimados pelo histograma"""
+        stats = QueryStats(slow_ms=1000)
+        for _ in range(90):
+            stats.record('SELECT 1', 0.001, rows=2)  # 1 ms
+        for _ in range(10):
+            stats.record('SELECT 1', 0.1)  # 100 ms
+
+        row = stats.snapshot()[0]
+        self.assertEqual((row['execucoes'], row['linhas'], row['lentas']), (100, 180, 0))
+        self.assertLessEqual(1, row['p50_ms'])
+        self.assertLess(row['p50_ms'], 2.1)
+        self.assertEqual(row['p99_ms'], 100)
+        self.assertEqual(row['max_ms'], 100)
+        self.assertAlmostEqual(row['media_ms'], 10.9)
+
+    def test_slow_and_order(self):
+        """Testa a sinalização da primeira lenta e a ordem por tempo total"""
+        stats = QueryStats(slow_ms=50)
+        self.assertEqual(stats.record('SELECT a FROM t', 0.01)[1:], (False, False))
+        self.assertEqual(stats.record('SELECT a FROM t', 0.06)[1:], (True, True))
+        self.assertEqual(stats.record('SELECT a FROM t', 0.07)[1:], (True, False))
+        stats.record('SELECT b FROM t', 0.5)
+
+        key = fingerprint('SELECT a FROM t')
+        stats.set_plan(key, ['SCAN t'])
+        rows = stats.snapshot()
+        self.assertEqual([row['consulta'] for row in rows], ['SELECT b FROM t', key])
+        self.assertEqual(rows[1]['plano'], ['SCAN t'])
+
+        stats.reset()
+        self.assertEqual(stats.snapshot(), [])
+
+    def test_threads(self):
+        """Testa registros concorrentes"""
+        stats = QueryStats(slow_ms=1000)
+
+        def run():
+            for _ in range(1000):
+                stats.record('SELECT 1', 0.0001)
+
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(stats.snapshot()[0]['execucoes'], 4000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes dos registros leves e benchmark contra dict por linha
+"""
+
+import sys
+import os
+import gc
+import tempfile
+import tracemalloc
+import unittest
+from pathlib import Path
+
+# Adicionar src ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from database import DatabaseManager
+from records import Record, record_type
+from synthetic import synthetic_diligencias
+from helpers import best_time, performance_test
+
+LISTING_QUERY = '''
+    SELECT id, data_solicitacao, solicitante, tipo_demanda, status, valor_receber
+    FROM diligencias ORDER BY data_solicitacao DESC, id DESC
+'''
+
+
+class TestRecord(unittest.TestCase):
+    """Testes do acesso aos campos"""
+
+    def setUp(self):
+        cls = record_type('Diligencia', ('id', 'solicitante', 'status'))
+        self.record = cls((7, 'Maria', 'Pendente'))
+
+    def test_access(self):
+        """Testa acesso por atributo, nome, índice e get()"""
+        self.assertEqual(self.record.solicitante, 'Maria')
+        self.assertEqual(self.record['status'], 'Pendente')
+        self.assertEqual(self.record[0], 7)
+        self.assertEqual(self.record.get('status'), 'Pendente')
+        self.assertIsNone(self.record.get('inexistente'))
+        with self.assertRaises(KeyError):
+            self.record['inexistente']
+
+    def test_dict_compatibility(self):
+        """Testa keys(), _asdict() e ausência de __dict__"""
+        self.assertEqual(self.record.keys(), ('id', 'solicitante', 'status'))
+        self.assertEqual(self.record._asdict(), {'id': 7, 'solicitante': 'Maria', 'status': 'Pendente'})
+        self.assertFalse(hasattr(self.record, '__dict__'))
+        self.assertIsInstance(self.record, Record)
+
+    def test_type_cache(self):
+        """Testa se a mesma consulta reutiliza a classe"""
+        self.assertIs(
+            record_type('Diligencia', ('id', 'solicitante', 'status')), type(self.record)
+        )
+
+
+@performance_test
+class TestRecordBenchmark(unittest.TestCase):
+    """Benchmark: records x dict por linha na listagem completa"""
+
+    ROWS = 20000
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.db = DatabaseManager(Path(cls.tmp_dir.name) / 'bench.db')
+        cls.db.insert_diligencias_many(synthetic_diligencias(cls.ROWS))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db.close()
+        cls.tmp_dir.cleanup()
+
+    def fetch_dicts(self):
+        return self.db.execute_query(LISTING_QUERY, fetch=True)
+
+    def fetch_records(self):
+        return self.db.fetch_records(LISTING_QUERY, name='Diligencia')
+
+    def memory(self, fetch):
+        """Bytes alocados pelo resultado de fetch()"""
+        gc.collect()
+        tracemalloc.start()
+        try:
+            result = fetch()
+            size = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(len(result), self.ROWS)
+        return size
+
+    def test_less_memory_per_row(self):
+        """Testa se records ocupam menos memória por linha que dicts"""
+        dict_bytes = self.memory(self.fetch_dicts)
+        record_bytes = self.memory(self.fetch_records)
+        print(f"\nMemória por linha: dict {dict_bytes / self.ROWS:.0f} B, "
+              f"record {record_bytes / self.ROWS:.0f} B")
+        self.assertLess(record_bytes, dict_bytes * 0.85)
+
+    def test_faster_fetch(self):
+        """Testa se a leitura em records não é mais lenta que em dicts"""
+        dict_time = best_time(self.fetch_dicts)
+        record_time = best_time(self.fetch_records)
+        print(f"\nLeitura de {self.ROWS} linhas: dict {dict_time * 1000:.1f} ms, "
+              f"record {record_time * 1000:.1f} ms")
+        self.assertLess(record_time, dict_time)
+
+
+if __name__ == "__main__":
+    unittest.main()
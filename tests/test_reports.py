@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes do relatório por período e dos rollups dos períodos encerrados
+"""
+
+import sys
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from datetime import date
+from pathlib import Path
+from unittest import mock
+
+# Adicionar src ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import reports
+from config import REPORT_TYPES
+from database import DatabaseManager, REPORT_PERIODS
+from reports import period_report, period_start, next_period, period_starts
+from helpers import nova_diligencia, performance_test
+
+TODAY = date(2024, 6, 15)
+
+
+class TestPeriods(unittest.TestCase):
+    """Aritmética de períodos em Python e no SQL"""
+
+    def test_report_types_covered(self):
+        """Testa se cada tipo de REPORT_TYPES tem período definido"""
+        self.assertEqual(set(REPORT_PERIODS), set(REPORT_TYPES))
+
+    def test_python_matches_sql(self):
+        """Testa se period_start concorda com as expressões dos triggers"""
+        conn = sqlite3.connect(':memory:')
+        for day in (date(2024, 1, 1), date(2024, 2, 29), date(2024, 6, 15), date(2023, 12, 31)):
+            for kind, expr in REPORT_PERIODS.items():
+                with self.subTest(kind=kind, day=day):
+                    sql = conn.execute(f'SELECT {expr.format(d="?")}', (day.isoformat(),))
+                    self.assertEqual(sql.fetchone()[0], period_start(kind, day).isoformat())
+        conn.close()
+
+    def test_period_starts(self):
+        """Testa a sequência de períodos e a virada de mês e ano"""
+        self.assertEqual(next_period('MENSAL', date(2024, 12, 1)), date(2025, 1, 1))
+        self.assertEqual(next_period('SEMANAL', date(2024, 6, 10)), date(2024, 6, 17))
+        self.assertEqual(list(period_starts('ANUAL', date(2022, 5, 5), date(2024, 1, 1))),
+                         [date(2022, 1, 1), date(2023, 1, 1), date(2024, 1, 1)])
+        with self.assertRaises(ValueError):
+            period_start('QUINZENAL', TODAY)
+
+
+class TestPeriodReport(unittest.TestCase):
+    """Relatório por período"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(Path(self.tmp_dir.name) / 'teste.db')
+        ids = self.db.insert_diligencias_many([
+            nova_diligencia(data_solicitacao='2024-01-10', status='Cumprida', valor_receber=200.0),
+            nova_diligencia(data_solicitacao='2024-01-20', tipo_demanda='Cópia', valor_receber=50.0),
+            nova_diligencia(data_solicitacao='2024-03-05', status='Cancelada', valor_receber=30.0),
+            nova_diligencia(data_solicitacao='2024-06-14', valor_receber=70.0),
+        ])
+        self.db.execute_query('UPDATE diligencias SET pago = 1 WHERE id = ?', (ids[0],))
+        self.db.execute_query(
+            'INSERT INTO correspondentes (nome_contratado, valor_cobrado, pago, diligencia_id) '
+            'VALUES (?, ?, ?, ?)', ('Corresp', 40.0, 1, ids[0])
+        )
+        self.ids = ids
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp_dir.cleanup()
+
+    def monthly(self):
+        """Relatório mensal do primeiro semestre, visto em TODAY"""
+        return period_report(self.db, 'MENSAL', date(2024, 1, 1), date(2024, 6, 30), today=TODAY)
+
+    def test_monthly_aggregates(self):
+        """Testa contagens, valores e margem por mês, incluindo meses vazios"""
+        periods = self.monthly()
+        self.assertEqual([p['inicio'].month for p in periods], [1, 2, 3, 4, 5, 6])
+
+        january = periods[0]
+        self.assertEqual(january['total'], 2)
+        self.assertEqual(january['por_status'], {'Cumprida': 1, 'Pendente': 1})
+        self.assertEqual(january['por_tipo'], {'Audiência': 1, 'Cópia': 1})
+        self.assertEqual(january['faturamento'], 250.0)
+        self.assertEqual(january['recebido'], 200.0)
+        self.assertEqual(january['a_receber'], 50.0)
+        self.assertEqual(january['custos'], 40.0)
+        self.assertEqual(january['custos_pagos'], 40.0)
+        self.assertEqual(january['margem'], 210.0)
+        self.assertEqual(periods[1]['total'], 0)
+        self.assertEqual(periods[5]['total'], 1)
+
+    def test_several_correspondentes(self):
+        """Testa se vários correspondentes somam custos sem repetir a diligência"""
+        self.db.execute_query(
+            'INSERT INTO correspondentes (nome_contratado, valor_cobrado, pago, diligencia_id) '
+            'VALUES (?, ?, ?, ?)', ('Outro', 10.0, 0, self.ids[0])
+        )
+        january = self.monthly()[0]
+        self.assertEqual((january['total'], january['faturamento']), (2, 250.0))
+        self.assertEqual((january['custos'], january['custos_pagos']), (50.0, 40.0))
+
+    def test_closed_periods_stored_once(self):
+        """Testa se meses encerrados vão para o rollup e o mês atual não"""
+        self.monthly()
+        stored = self.db.execute_query(
+            "SELECT inicio FROM relatorio_fechados WHERE tipo_periodo = 'MENSAL' ORDER BY inicio",
+            fetch=True
+        )
+        self.assertEqual([row['inicio'][:7] for row in stored],
+                         ['2024-01', '2024-02', '2024-03', '2024-04', '2024-05'])
+
+        # Gravações do rollup entram nas estatísticas por consulta
+        timed = [row['consulta'] for row in self.db.diagnostics()['consultas']]
+        self.assertTrue(any('relatorio_periodos' in key for key in timed), timed)
+
+        with mock.patch.object(reports, '_store_rollups') as store:
+            self.assertEqual(self.monthly()[0]['total'], 2)
+        store.assert_not_called()
+
+    def test_changes_invalidate_rollup(self):
+        """Testa alterações retroativas em diligências e correspondentes"""
+        self.monthly()
+
+        self.db.insert_diligencia(nova_diligencia(data_solicitacao='2024-02-02', valor_receber=10.0))
+        self.db.update_diligencia(self.ids[2], nova_diligencia(
+            data_solicitacao='2024-03-05', status='Cumprida', valor_receber=35.0
+        ))
+        self.db.execute_query('UPDATE correspondentes SET valor_cobrado = 60.0')
+
+        periods = self.monthly()
+        self.assertEqual(periods[1]['total'], 1)
+        self.assertEqual(periods[2]['por_status'], {'Cumprida': 1})
+        self.assertEqual(periods[2]['faturamento'], 35.0)
+        self.assertEqual(periods[0]['margem'], 190.0)
+
+        self.db.delete_diligencia(self.ids[0])
+        self.assertEqual(self.monthly()[0]['total'], 1)
+
+    def test_kinds_agree(self):
+        """Testa se diário, semanal, mensal e anual somam o mesmo total"""
+        for kind in REPORT_TYPES:
+            with self.subTest(kind=kind):
+                periods = period_report(self.db, kind, date(2024, 1, 1), date(2024, 12, 31),
+                                        today=TODAY)
+                self.assertEqual(sum(p['total'] for p in periods), 4)
+                self.assertAlmostEqual(sum(p['margem'] for p in periods), 310.0)
+
+
+@performance_test
+class TestReportBenchmark(unittest.TestCase):
+    """Relatório anual sobre anos de dados, lido do rollup"""
+
+    def test_annual_report_in_milliseconds(self):
+        """Testa se o relatório anual de 10 anos sai em poucos milissegundos"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = DatabaseManager(Path(tmp_dir) / 'anos.db')
+            try:
+                with db.transaction() as conn:
+                    conn.execute('''
+                        WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < 99999)
+                        INSERT INTO diligencias
+                            (data_solicitacao, solicitante, tipo_demanda, status, valor_receber)
+                        SELECT date('2014-01-01', '+' || (i % 3650) || ' days'), 'Teste',
+                               'Audiência', 'Cumprida', i % 500
+                        FROM n
+                    ''')
+
+                args = (db, 'ANUAL', date(2014, 1, 1), date(2023, 12, 31))
+                first = period_report(*args, today=TODAY)
+
+                times = []
+                for _ in range(5):
+                    start = time.perf_counter()
+                    again = period_report(*args, today=TODAY)
+                    times.append(time.perf_counter() - start)
+
+                self.assertEqual(again, first)
+                self.assertEqual(sum(p['total'] for p in again), 100000)
+                self.assertLess(min(times), 0.01, f"{min(times) * 1000:.2f} ms")
+            finally:
+                db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
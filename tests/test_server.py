@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes do servidor HTTP/JSON local e do cliente das estações
+"""
+
+import sys
+import os
+import asyncio
+import http.client
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from datetime import date
+from pathlib import Path
+from unittest import mock
+
+# Adicionar src ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from client import RemoteDatabase, RemoteError
+from config import SERVER_MAX_HEADERS
+from database import DatabaseManager, listing_key
+from server import ApiServer
+from helpers import nova_diligencia, performance_test
+
+
+class ServerTestCase(unittest.TestCase):
+    """Base que sobe um servidor (porta livre) sobre um banco temporário"""
+
+    token = None
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(Path(self.tmp_dir.name) / 'servidor.db')
+        self.server = ApiServer(self.db, '127.0.0.1', 0, token=self.token)
+
+        ready = threading.Event()
+        self.thread = threading.Thread(target=asyncio.run, args=(self.server.serve(ready),))
+        self.thread.start()
+        self.assertTrue(ready.wait(5))
+
+        self.url = f'http://127.0.0.1:{self.server.port}'
+        self.remote = RemoteDatabase(self.url, token=self.token)
+
+    def tearDown(self):
+        self.remote.close()
+        self.server.stop()
+        self.thread.join(5)
+        self.db.close()
+        self.tmp_dir.cleanup()
+
+    def raw_request(self, method, path, body=None, headers=None):
+        """Requisição sem o cliente: retorna (status, corpo)"""
+        conn = http.client.HTTPConnection('127.0.0.1', self.server.port, timeout=5)
+        try:
+            conn.request(method, path, body=body, headers=headers or {})
+            response = conn.getresponse()
+            return response.status, response.read()
+        finally:
+            conn.close()
+
+
+class TestRemoteDatabase(ServerTestCase):
+    """O cliente deve se comportar como o DatabaseManager"""
+
+    def test_crud(self):
+        """Testa inserção, leitura, alteração e exclusão pela API"""
+        diligencia_id = self.remote.insert_diligencia(nova_diligencia(solicitante='Ana'))
+        diligencia = self.remote.get_diligencia(diligencia_id)
+        self.assertEqual((diligencia.solicitante, diligencia.valor_receber), ('Ana', 100.0))
+        self.assertEqual(diligencia._asdict(), self.db.get_diligencia(diligencia_id)._asdict())
+
+        self.remote.update_diligencia(diligencia_id, nova_diligencia(solicitante='Bia'))
+        self.assertEqual(self.db.get_diligencia(diligencia_id).solicitante, 'Bia')
+
+        self.remote.delete_diligencia(diligencia_id)
+        self.assertIsNone(self.remote.get_diligencia(diligencia_id))
+        self.assertEqual(self.remote.count_diligencias(), 0)
+
+    def test_pages_and_filters(self):
+        """Testa paginação por chave, filtros e pesquisa"""
+        for day in range(1, 26):
+            self.db.insert_diligencia(nova_diligencia(
+                data_solicitacao=f'2024-01-{day:02d}',
+                status='Cumprida' if day % 5 == 0 else 'Pendente',
+            ))
+
+        page = self.remote.get_diligencias_page(limit=10)
+        self.assertEqual([row.id for row in page],
+                         [row.id for row in self.db.get_diligencias_page(limit=10)])
+        after = self.remote.get_diligencias_page(limit=10, after=listing_key(page[-1]))
+        self.assertEqual(after[0].data_solicitacao, '2024-01-15')
+
+        cumpridas = self.remote.get_diligencias_page(filters={'status': 'Cumprida'})
+        self.assertEqual(len(cumpridas), 5)
+        self.assertEqual(len(self.remote.search('teste', limit=100)), 25)
+
+        chunks = list(self.remote.iter_diligencias(chunk_size=10))
+        self.assertEqual([len(chunk) for chunk in chunks], [10, 10, 5])
+
+    def test_changes(self):
+        """Testa a sincronização incremental pelo watermark"""
+        watermark = self.remote.get_diligencias_changes()['watermark']
+        diligencia_id = self.remote.insert_diligencia(nova_diligencia())
+        changes = self.remote.get_diligencias_changes(watermark)
+        self.assertEqual([row.id for row in changes['changed']], [diligencia_id])
+
+        self.remote.delete_diligencia(diligencia_id)
+        changes = self.remote.get_diligencias_changes(changes['watermark'])
+        self.assertEqual(changes['deleted'], [diligencia_id])
+
+    def test_correspondentes_and_margins(self):
+        """Testa correspondentes e a rentabilidade por diligência"""
+        diligencia_id = self.remote.insert_diligencia(nova_diligencia())
+        correspondente_id = self.remote.insert_correspondente({
+            'nome_contratado': 'Carlos', 'valor_cobrado': 30.0, 'diligencia_id': diligencia_id,
+        })
+        self.assertEqual(self.remote.get_correspondente(correspondente_id).nome_contratado, 'Carlos')
+        page = self.remote.get_correspondentes_page(diligencia_id=diligencia_id)
+        self.assertEqual([row.id for row in page], [correspondente_id])
+
+        margin = self.remote.get_margins_page()[0]
+        self.assertEqual((margin.custos, margin.margem), (30.0, 70.0))
+
+        self.remote.delete_correspondente(correspondente_id)
+        self.assertIsNone(self.remote.get_correspondente(correspondente_id))
+
+    def test_statistics_and_report(self):
+        """Testa estatísticas e relatório por período"""
+        self.remote.insert_diligencia(nova_diligencia(data_solicitacao='2024-02-10'))
+        self.assertEqual(self.remote.get_statistics()['diligencias']['total'], 1)
+        self.remote.rebuild_statistics()
+
+        periods = self.remote.period_report('MENSAL', date(2024, 1, 1), date(2024, 3, 31),
+                                            today=date(2024, 6, 1))
+        self.assertEqual([p['inicio'] for p in periods],
+                         [date(2024, 1, 1), date(2024, 2, 1), date(2024, 3, 1)])
+        self.assertEqual([p['total'] for p in periods], [0, 1, 0])
+
+    def test_backup(self):
+        """Testa o backup feito pelo servidor"""
+        backups_dir = Path(self.tmp_dir.name) / 'backups'
+        backups_dir.mkdir()
+        results = []
+        with mock.patch.multiple('config', BACKUPS_DIR=backups_dir, BACKUP_STEP_DELAY=0):
+            self.remote.backup_async(callback=results.append).join(10)
+        self.assertEqual(results, [True])
+        self.assertEqual(len(list(backups_dir.glob('diligencias_backup_*.db'))), 1)
+
+    def test_errors(self):
+        """Testa os status de erro: 400, 404, 405 e 409"""
+        with self.assertRaises(RemoteError) as raised:
+            self.remote.get_diligencias_page(sort='inexistente')
+        self.assertEqual(raised.exception.status, 400)
+        with self.assertRaises(RemoteError) as raised:
+            self.remote.period_report('QUINZENAL', date(2024, 1, 1), date(2024, 2, 1))
+        self.assertEqual(raised.exception.status, 400)
+        with self.assertRaises(RemoteError) as raised:
+            self.remote.insert_diligencia({'solicitante': 'Sem data'})
+        self.assertEqual(raised.exception.status, 409)
+
+        self.assertEqual(self.raw_request('GET', '/inexistente')[0], 404)
+        self.assertEqual(self.raw_request('PATCH', '/diligencias')[0], 405)
+        self.assertEqual(self.raw_request('POST', '/diligencias', body=b'{')[0], 400)
+
+    def test_invalid_params(self):
+        """Testa a recusa (400) de chaves e filtros malformados"""
+        for path in ('/diligencias?after=[1]', '/diligencias?after={"a":1}',
+                     '/diligencias?filters={"pago":[1,2]}', '/diligencias?filters=[1]',
+                     '/diligencias/alteracoes?watermark=[1,2,3]', '/margens?after=[[1],2]'):
+            with self.subTest(path=path):
+                self.assertEqual(self.raw_request('GET', path)[0], 400)
+
+    def test_limit_clamped(self):
+        """Testa se o limite fica entre 1 e SERVER_MAX_LIMIT (LIMIT -1 seria sem limite)"""
+        for _ in range(5):
+            self.db.insert_diligencia(nova_diligencia())
+        with mock.patch('server.SERVER_MAX_LIMIT', 3):
+            self.assertEqual(len(self.remote.get_diligencias_page(limit=-1)), 1)
+            self.assertEqual(len(self.remote.get_diligencias_page(limit=100)), 3)
+            self.assertEqual(len(self.remote.search('teste', limit=-1)), 1)
+
+    def test_malformed_requests(self):
+        """Testa a resposta 400/431 a requisições malformadas"""
+        def send(data):
+            with socket.create_connection(('127.0.0.1', self.server.port), timeout=5) as sock:
+                sock.sendall(data)
+                return sock.recv(4096).split(b' ')[1]
+
+        self.assertEqual(send(b'GET\r\n\r\n'), b'400')
+        self.assertEqual(send(b'GET /saude HTTP/1.1\r\nContent-Length: x\r\n\r\n'), b'400')
+        self.assertEqual(send(b'GET /saude HTTP/1.1\r\nContent-Length: -5\r\n\r\n'), b'400')
+        many = b''.join(b'X-A: 1\r\n' for _ in range(SERVER_MAX_HEADERS + 1))
+        self.assertEqual(send(b'GET /saude HTTP/1.1\r\n' + many + b'\r\n'), b'431')
+
+    def test_no_retry_after_write_sent(self):
+        """Testa se uma escrita enviada não é repetida quando a resposta se perde"""
+        self.remote.count_diligencias()  # conexão aberta, a ser reaproveitada
+        original = http.client.HTTPConnection.getresponse
+        calls = []
+
+        def drop_first(conn):
+            calls.append(conn)
+            if len(calls) == 1:
+                raise http.client.RemoteDisconnected('fechada')
+            return original(conn)
+
+        with mock.patch.object(http.client.HTTPConnection, 'getresponse', drop_first):
+            with self.assertRaises(http.client.RemoteDisconnected):
+                self.remote.insert_diligencia(nova_diligencia())
+        # O servidor grava sem que a resposta seja lida: espera a gravação
+        deadline = time.monotonic() + 5
+        while self.db.count_diligencias() == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.db.count_diligencias(), 1)  # gravada uma única vez
+
+        self.remote.count_diligencias()
+        calls.clear()
+        with mock.patch.object(http.client.HTTPConnection, 'getresponse', drop_first):
+            self.assertEqual(self.remote.count_diligencias(), 1)  # leitura: repetida
+        self.assertEqual(len(calls), 2)
+
+    def test_diagnostics(self):
+        """Testa o diagnóstico do servidor e o zeramento"""
+        self.remote.count_diligencias()
+        report = self.remote.diagnostics()
+        self.assertEqual(report['banco']['arquivo'], str(self.db.db_path))
+        self.assertTrue(report['consultas'])
+
+        self.remote.reset_diagnostics()
+        self.assertEqual(self.remote.diagnostics()['consultas'], [])
+
+    def test_reconnect(self):
+        """Testa se o cliente refaz a conexão fechada pelo servidor"""
+        with mock.patch('server.SERVER_IDLE_TIMEOUT', 0.1):
+            self.remote.count_diligencias()
+            time.sleep(0.3)
+            self.assertEqual(self.remote.count_diligencias(), 0)
+            time.sleep(0.3)
+            # Escrita não é repetida: a conexão fechada é trocada antes do envio
+            self.remote.insert_diligencia(nova_diligencia())
+        self.assertEqual(self.db.count_diligencias(), 1)
+
+    def run_parallel(self, requests=400, workers=4):
+        """Páginas pedidas em paralelo por conexões persistentes: retorna o tempo"""
+        for _ in range(50):
+            self.db.insert_diligencia(nova_diligencia())
+        errors = []
+
+        def run():
+            try:
+                for _ in range(requests // workers):
+                    self.assertEqual(len(self.remote.get_diligencias_page(limit=20)), 20)
+            except Exception as e:  # pragma: no cover - falha reportada abaixo
+                errors.append(e)
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=run) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(errors, [])
+        return elapsed
+
+    def test_parallel_requests(self):
+        """Testa requisições em paralelo de várias threads do cliente"""
+        self.run_parallel(requests=80)
+
+    @performance_test
+    def test_throughput(self):
+        """Testa a vazão das requisições em paralelo (> 200 req/s)"""
+        elapsed = self.run_parallel()
+        self.assertGreater(400 / elapsed, 200, f"{400 / elapsed:.0f} req/s")
+
+
+class TestToken(ServerTestCase):
+    """Com token configurado, requisições sem ele são recusadas"""
+
+    token = 'segredo'
+
+    def test_token(self):
+        self.assertEqual(self.remote.count_diligencias(), 0)
+        self.assertEqual(self.raw_request('GET', '/diligencias/total')[0], 401)
+        status, _ = self.raw_request('GET', '/diligencias/total',
+                                     headers={'Authorization': 'Bearer errado'})
+        self.assertEqual(status, 401)
+
+    def test_network_requires_token(self):
+        """Testa a recusa de atender a rede sem token"""
+        with self.assertRaises(ValueError):
+            ApiServer(self.db, '0.0.0.0', 0, token=None)
+        ApiServer(self.db, '0.0.0.0', 0, token='segredo')
+        ApiServer(self.db, 'localhost', 0, token=None)
+
+    def test_invalid_url(self):
+        """Testa a recusa de URLs de servidor inválidas"""
+        with self.assertRaises(ValueError):
+            RemoteDatabase('servidor:8765')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes de tempo de inicialização (orçamento de cold start)
+"""
+
+import sys
+import os
+import subprocess
+import tempfile
+import unittest
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+# Adicionar src ao path
+sys.path.insert(0, SRC_DIR)
+
+from config import STARTUP_BUDGET_MS
+from helpers import performance_test
+
+# Bibliotecas que só a exportação e os gráficos devem carregar
+HEAVY_MODULES = ('pandas', 'matplotlib', 'openpyxl', 'numpy', 'PIL')
+
+
+def run_python(code, *options):
+    """Executa código num interpretador novo, com HOME temporário
+
+    config.py cria os diretórios de dados na pasta do usuário ao ser
+    importado; o HOME temporário mantém o teste isolado.
+    """
+    with tempfile.TemporaryDirectory() as home:
+        env = dict(os.environ, HOME=home, APPDATA=home)
+        prelude = f"import sys; sys.path.insert(0, {SRC_DIR!r})\n"
+        return subprocess.run(
+            [sys.executable, *options, '-c', prelude + code],
+            capture_output=True, text=True, env=env, timeout=60
+        )
+
+
+def parse_importtime(stderr):
+    """Converte a saída de -X importtime em {módulo: cumulativo em ms}"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit():
+            modules[name.strip()] = int(cumulative) / 1000
+    return modules
+
+
+class TestStartup(unittest.TestCase):
+    """Orçamento de inicialização da aplicação"""
+
+    def test_heavy_modules_deferred(self):
+        """Testa se a inicialização não importa bibliotecas pesadas"""
+        result = run_python('import main, sistema_diligencias', '-X', 'importtime')
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+
+        loaded = {name.split('.')[0] for name in parse_importtime(result.stderr)}
+        for module in HEAVY_MODULES:
+            with self.subTest(module=module):
+                self.assertNotIn(module, loaded)
+
+    @performance_test
+    def test_import_budget(self):
+        """Testa se os módulos da aplicação importam dentro do orçamento"""
+        result = run_python('import main, sistema_diligencias', '-X', 'importtime')
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+
+        modules = parse_importtime(result.stderr)
+        elapsed = modules['main'] + modules['sistema_diligencias']
+        self.assertLess(elapsed, STARTUP_BUDGET_MS,
+                        f"Imports levaram {elapsed:.0f} ms")
+
+    @performance_test
+    @unittest.skipUnless(os.environ.get('DISPLAY') or sys.platform == 'win32',
+                         "Requer um display gráfico")
+    def test_first_frame_budget(self):
+        """Testa o tempo do início do processo até o primeiro frame"""
+        code = '''
+import time
+start = time.perf_counter()
+from sistema_diligencias import SistemaDiligencias
+app = SistemaDiligencias()
+app.root.update()
+print((time.perf_counter() - start) * 1000)
+app.db.close()
+app.root.destroy()
+'''
+        result = run_python(code)
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+
+        elapsed = float(result.stdout.strip().splitlines()[-1])
+        self.assertLess(elapsed, STARTUP_BUDGET_MS,
+                        f"Primeiro frame em {elapsed:.0f} ms")
+
+
+if __name__ == "__main__":
+    unittest.main()
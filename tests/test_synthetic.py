@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes do gerador de dados sintéticos e do benchmark da camada de dados
+"""
+
+import sys
+import os
+import json
+import subprocess
+import tempfile
+import unittest
+from collections import Counter
+from pathlib import Path
+
+# Adicionar src ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from database import DatabaseManager, DILIGENCIA_COLUMNS
+from synthetic import cnj_is_valid, populate, synthetic_diligencias
+
+BENCHMARK = Path(__file__).resolve().parent.parent / 'scripts' / 'benchmark.py'
+
+
+class TestSyntheticData(unittest.TestCase):
+    """Dados determinísticos e com distribuições realistas"""
+
+    def test_deterministic(self):
+        """Testa se a mesma semente gera os mesmos dados (e outra, outros)"""
+        first = list(synthetic_diligencias(500, seed=7))
+        self.assertEqual(first, list(synthetic_diligencias(500, seed=7)))
+        self.assertNotEqual(first, list(synthetic_diligencias(500, seed=8)))
+        self.assertTrue(all(len(row) == len(DILIGENCIA_COLUMNS) for row in first))
+
+    def test_distributions(self):
+        """Testa números CNJ válidos, status e solicitantes concentrados"""
+        rows = list(synthetic_diligencias(5000))
+        column = {name: i for i, name in enumerate(DILIGENCIA_COLUMNS)}
+
+        self.assertTrue(all(cnj_is_valid(row[column['numero_processo']]) for row in rows))
+        self.assertFalse(cnj_is_valid('0000001-00.2024.8.26.0100'))
+
+        status = Counter(row[column['status']] for row in rows)
+        self.assertGreater(status['Cumprida'], status['Pendente'])
+        self.assertGreater(status['Pendente'], status['Cancelada'])
+
+        clients = Counter(row[column['solicitante']] for row in rows).most_common()
+        top = sum(count for _, count in clients[:20])
+        self.assertGreater(top / len(rows), 0.3)
+
+        dates = [row[column['data_solicitacao']] for row in rows]
+        self.assertEqual(dates, sorted(dates))
+
+    def test_populate(self):
+        """Testa a carga num banco, com correspondentes ligados às diligências"""
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DatabaseManager(Path(tmp) / 'sintetico.db')
+            try:
+                diligencias, correspondentes = populate(db, 2000)
+                self.assertEqual(diligencias, 2000)
+                self.assertGreater(correspondentes, 600)
+
+                stats = db.get_statistics()
+                self.assertEqual(stats['diligencias']['total'], 2000)
+                self.assertEqual(stats['correspondentes']['total'], correspondentes)
+                self.assertGreater(stats['diligencias']['recebido'], 0)
+                # O resumo incremental (triggers) bate com o recálculo completo
+                self.assertTrue(db.rebuild_statistics())
+                rebuilt = db.get_statistics()
+                for table, values in stats.items():
+                    for name, value in values.items():
+                        self.assertAlmostEqual(rebuilt[table][name], value, places=4)
+            finally:
+                db.close()
+
+    def test_populate_in_chunks(self):
+        """Testa a carga em vários blocos, com correspondentes de cada bloco"""
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DatabaseManager(Path(tmp) / 'blocos.db')
+            try:
+                diligencias, correspondentes = populate(db, 2500, chunk_size=1000)
+                self.assertEqual(diligencias, 2500)
+                self.assertEqual(db.count_diligencias(), 2500)
+                orphans = db.execute_query(
+                    'SELECT COUNT(*) AS n FROM correspondentes c '
+                    'LEFT JOIN diligencias d ON d.id = c.diligencia_id WHERE d.id IS NULL',
+                    fetch=True
+                )
+                self.assertEqual(orphans[0]['n'], 0)
+                self.assertEqual(db.get_statistics()['correspondentes']['total'], correspondentes)
+            finally:
+                db.close()
+
+
+class TestBenchmark(unittest.TestCase):
+    """O benchmark deve rodar de ponta a ponta e emitir JSON"""
+
+    def test_json_output(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = Path(tmp) / 'resultado.json'
+            env = dict(os.environ, HOME=tmp, APPDATA=tmp)
+            result = subprocess.run(
+                [sys.executable, str(BENCHMARK), '--linhas', '300', '--repeticoes', '2',
+                 '--saida', str(output)],
+                capture_output=True, text=True, env=env, timeout=120
+            )
+            self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+
+            document = json.loads(output.read_text(encoding='utf-8'))
+            names = {r['benchmark'] for r in document['resultados']}
+            self.assertLessEqual({'insercao_lote', 'listagem_primeira_pagina', 'registro_sem_cache',
+                                  'estatisticas', 'exportacao_csv', 'backup'}, names)
+            for row in document['resultados']:
+                self.assertEqual(row['linhas'], 300)
+                self.assertGreaterEqual(row['p95_ms'], row['p50_ms'])
+
+            compared = subprocess.run(
+                [sys.executable, str(BENCHMARK), '--linhas', '300', '--repeticoes', '2',
+                 '--comparar', str(output)],
+                capture_output=True, text=True, env=env, timeout=120
+            )
+            self.assertEqual(compared.returncode, 0, compared.stderr[-2000:])
+            self.assertIn('Comparação', compared.stderr)
+            json.loads(compared.stdout)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes dos formatadores em lote (com microbenchmark contra os formatadores
+por linha) e do log assíncrono
+"""
+
+import sys
+import os
+import gzip
+import io
+import locale
+import logging
+import logging.handlers
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Adicionar src ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from config import PAGE_SIZE
+from utils import format_date, format_dates, format_currency, format_currencies, parse_currency
+from utils import parse_log_levels, setup_logging, shutdown_logging, atomic_write
+from helpers import best_time, performance_test
+
+DATES = ['2024-01-05', '2023-12-31', '2024-1-5', '05/01/2024', '', None]
+AMOUNTS = [0, 100, 1234.5, 1234567.891, -2500.25, '350.10', 'abc', None]
+
+
+class TestBatchFormatting(unittest.TestCase):
+    """Os formatadores em lote devem igualar os formatadores por linha"""
+
+    def test_dates_match(self):
+        """Testa format_dates contra format_date"""
+        self.assertEqual(format_dates(DATES), [format_date(value) for value in DATES])
+
+    def test_currencies_match(self):
+        """Testa format_currencies contra format_currency"""
+        self.assertEqual(format_currencies(AMOUNTS),
+                         [format_currency(value) for value in AMOUNTS])
+        self.assertEqual(format_currencies([1234567.891]), ['R$ 1.234.567,89'])
+
+    def test_parse_currency(self):
+        """Testa a leitura de valores digitados nos dois formatos"""
+        for text, expected in (('1.5', 1.5), ('150,00', 150.0), ('1.234,56', 1234.56),
+                               ('R$ 1.234,56', 1234.56), ('1234.56', 1234.56), (12, 12.0)):
+            with self.subTest(text=text):
+                self.assertEqual(parse_currency(text), expected)
+        with self.assertRaises(ValueError):
+            parse_currency('abc')
+
+    def test_locale_independent(self):
+        """Testa se o resultado não depende do locale do processo"""
+        expected = format_currencies([1234.5])
+        previous = locale.setlocale(locale.LC_ALL)
+        try:
+            locale.setlocale(locale.LC_ALL, 'C')
+            self.assertEqual(format_currencies([4321.5]), ['R$ 4.321,50'])
+            self.assertEqual(format_currencies([1234.5]), expected)
+        finally:
+            locale.setlocale(locale.LC_ALL, previous)
+
+
+@performance_test
+class TestFormattingBenchmark(unittest.TestCase):
+    """Microbenchmark: formatar uma página da grade"""
+
+    def setUp(self):
+        # Página típica: poucas datas e valores distintos, muito repetidos
+        self.dates = [f'2024-{1 + i % 12:02d}-{1 + i % 28:02d}' for i in range(PAGE_SIZE)]
+        self.amounts = [float(50 * (1 + i % 40)) for i in range(PAGE_SIZE)]
+
+    def per_row(self):
+        [format_date(value) for value in self.dates]
+        [format_currency(value) for value in self.amounts]
+
+    def batch(self):
+        format_dates(self.dates)
+        format_currencies(self.amounts)
+
+    def test_faster_than_per_row(self):
+        """Testa se o lote é mais rápido que as funções por linha"""
+        per_row = best_time(self.per_row, 20)
+        batch = best_time(self.batch, 20)
+        self.assertLess(batch, per_row,
+                        f"lote {batch * 1000:.3f} ms, por linha {per_row * 1000:.3f} ms")
+
+    def test_page_budget(self):
+        """Testa se formatar uma página leva tempo desprezível (< 1 ms)"""
+        elapsed = best_time(self.batch, 20)
+        self.assertLess(elapsed, 0.001, f"{elapsed * 1000:.3f} ms por página")
+
+
+class TestAtomicWrite(unittest.TestCase):
+    """Gravação atômica: o nome final só aparece com o arquivo completo"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.target = Path(self.tmp_dir.name) / 'saida.txt'
+
+    def test_complete_write(self):
+        """Testa se o arquivo completo recebe o nome final, sem sobras"""
+        self.target.write_text('antigo', encoding='utf-8')
+        with atomic_write(self.target) as partial_path:
+            Path(partial_path).write_text('novo', encoding='utf-8')
+            self.assertEqual(self.target.read_text(encoding='utf-8'), 'antigo')
+        self.assertEqual(self.target.read_text(encoding='utf-8'), 'novo')
+        self.assertEqual(os.listdir(self.tmp_dir.name), ['saida.txt'])
+
+    def test_failed_write(self):
+        """Testa se uma falha no meio não cria o arquivo nem deixa o .part"""
+        with self.assertRaises(RuntimeError):
+            with atomic_write(self.target) as partial_path:
+                Path(partial_path).write_text('metade', encoding='utf-8')
+                raise RuntimeError("falha")
+        self.assertEqual(os.listdir(self.tmp_dir.name), [])
+
+
+class TestLogging(unittest.TestCase):
+    """Log por fila: rotação, compressão e níveis por módulo"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.logs_dir = Path(self.tmp_dir.name)
+        patcher = mock.patch.multiple(
+            'config', LOGS_DIR=self.logs_dir, LOG_MAX_SIZE=2000, LOG_BACKUP_COUNT=2,
+            LOG_COMPRESS=True, LOG_LEVELS_ENV='teste.detalhe=DEBUG,teste.ruim=MUITO'
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        root_level = logging.getLogger().level
+        self.addCleanup(logging.getLogger().setLevel, root_level)
+        self.addCleanup(logging.getLogger('teste.detalhe').setLevel, logging.NOTSET)
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.addCleanup(shutdown_logging)
+
+        self.console = io.StringIO()
+        setup_logging(console=self.console, console_level=logging.WARNING)
+
+    def test_rotation_and_compression(self):
+        """Testa a rotação por tamanho, com os arquivos antigos em .gz"""
+        logger = logging.getLogger('teste')
+        for i in range(100):
+            logger.info(f"mensagem {i:03d} " + 'x' * 40)
+        shutdown_logging()
+
+        names = sorted(path.name for path in self.logs_dir.iterdir())
+        self.assertEqual(names, ['diligencias.log', 'diligencias.log.1.gz', 'diligencias.log.2.gz'])
+        with gzip.open(self.logs_dir / 'diligencias.log.1.gz', 'rt', encoding='utf-8') as file:
+            self.assertIn('teste - INFO - mensagem', file.read())
+        self.assertIn('mensagem 099', (self.logs_dir / 'diligencias.log').read_text(encoding='utf-8'))
+
+        # Console só com avisos e erros
+        self.assertNotIn('mensagem', self.console.getvalue())
+
+    def test_module_levels(self):
+        """Testa os níveis por módulo e o aviso dos inválidos"""
+        logging.getLogger('teste.detalhe').debug("detalhe visível")
+        logging.getLogger('teste.outro').debug("detalhe oculto")
+        shutdown_logging()
+
+        text = (self.logs_dir / 'diligencias.log').read_text(encoding='utf-8')
+        self.assertIn('detalhe visível', text)
+        self.assertNotIn('detalhe oculto', text)
+        self.assertIn('teste.ruim=MUITO', text)
+        self.assertEqual(parse_log_levels('DEBUG, server=warning,x='),
+                         {'': 'DEBUG', 'server': 'WARNING'})
+
+    def test_caller_not_blocked(self):
+        """Testa se um disco parado não segura quem registra"""
+        emit = logging.handlers.RotatingFileHandler.emit
+        release = threading.Event()
+        written = []
+
+        def stuck_emit(handler, record):
+            release.wait(5)
+            emit(handler, record)
+            written.append(record)
+
+        with mock.patch.object(logging.handlers.RotatingFileHandler, 'emit', stuck_emit):
+            logger = logging.getLogger('teste')
+            for i in range(20):
+                logger.info(f"lento {i}")
+            # Chamadas síncronas só voltariam depois de gravar no disco
+            self.assertEqual(written, [])
+            release.set()
+            shutdown_logging()
+
+        text = (self.logs_dir / 'diligencias.log').read_text(encoding='utf-8')
+        self.assertEqual(text.count('lento'), 20)
+
+if __name__ == "__main__":
+    unittest.main()
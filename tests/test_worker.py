@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes do worker de banco de dados da interface
+"""
+
+import sys
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+# Adicionar src ao path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from database import DatabaseManager
+from worker import DatabaseWorker
+
+
+class FakeRoot:
+    """Substituto de tk.Tk que registra os after() agendados"""
+
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, func):
+        self.scheduled.append((ms, func))
+
+
+class TestDatabaseWorker(unittest.TestCase):
+    """Testes da entrega de resultados pela thread da interface"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db = DatabaseManager(Path(self.tmp_dir.name) / 'teste.db')
+        self.worker = DatabaseWorker(self.db, max_workers=2)
+
+    def tearDown(self):
+        self.worker.shutdown()
+        self.db.close()
+        self.tmp_dir.cleanup()
+
+    def drain(self, timeout=5):
+        """Chama poll() até não haver operações em andamento"""
+        deadline = time.monotonic() + timeout
+        while self.worker.in_flight and time.monotonic() < deadline:
+            self.worker.poll()
+            time.sleep(0.005)
+        self.assertEqual(self.worker.in_flight, 0)
+
+    def test_callbacks_run_on_polling_thread(self):
+        """Testa se os callbacks rodam na thread que chama poll()"""
+        threads = []
+        results = []
+
+        def on_success(result):
+            threads.append(threading.current_thread())
+            results.append(result)
+
+        self.worker.submit(self.db.count_diligencias, on_success=on_success)
+        self.drain()
+
+        self.assertEqual(results, [0])
+        self.assertEqual(threads, [threading.current_thread()])
+
+    def test_callbacks_wait_for_poll(self):
+        """Testa se nada é entregue antes de poll()"""
+        results = []
+        future = self.worker.submit(lambda: 42, on_success=results.append)
+        future.result(timeout=5)
+        self.assertEqual(results, [])
+        self.drain()
+        self.assertEqual(results, [42])
+
+    def test_errors_delivered(self):
+        """Testa se exceções chegam ao on_error"""
+        errors = []
+        self.worker.submit(
+            self.db.execute_query, 'SELECT * FROM tabela_inexistente', fetch=True,
+            on_error=errors.append
+        )
+        self.drain()
+        self.assertEqual(len(errors), 1)
+
+    def test_activity_indicator(self):
+        """Testa se o contador de operações em andamento é notificado"""
+        activity = []
+        root = FakeRoot()
+        self.worker.attach(root, on_activity=activity.append)
+        release = threading.Event()
+
+        self.worker.submit(release.wait, 5)
+        self.worker.submit(release.wait, 5)
+        self.assertEqual(activity, [1, 2])
+
+        release.set()
+        self.drain()
+        self.assertEqual(activity[-1], 0)
+
+        # attach agenda a entrega periódica no loop do Tk
+        ms, poll_loop = root.scheduled[0]
+        poll_loop()
+        self.assertEqual(len(root.scheduled), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()